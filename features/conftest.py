@@ -36,6 +36,15 @@ def stub_dependencies(monkeypatch):
         "meilisearch_python_sdk.models.settings": types.ModuleType(
             "meilisearch_python_sdk.models.settings"
         ),
+        "meilisearch_python_sdk.models.search": types.ModuleType(
+            "meilisearch_python_sdk.models.search"
+        ),
+        "meilisearch_python_sdk.errors": types.ModuleType(
+            "meilisearch_python_sdk.errors"
+        ),
+        "meilisearch_python_sdk._http_requests": types.ModuleType(
+            "meilisearch_python_sdk._http_requests"
+        ),
         "meilisearch": types.ModuleType("meilisearch"),
         "meilisearch.models": types.ModuleType("meilisearch.models"),
         "meilisearch.models.embedders": types.ModuleType(
@@ -135,6 +144,36 @@ def stub_dependencies(monkeypatch):
 
     meili_emb_mod.MeilisearchSettings = MeilisearchSettings
 
+    meili_search_mod = modules["meilisearch_python_sdk.models.search"]
+
+    class SearchParams:
+        def __init__(self, index_uid: str, query: str | None = None, **kwargs):
+            self.index_uid = index_uid
+            self.query = query
+            self.filter = kwargs.get("filter")
+
+    class Federation:
+        def __init__(self, limit: int = 20, offset: int = 0):
+            self.limit = limit
+            self.offset = offset
+
+    meili_search_mod.SearchParams = SearchParams
+    meili_search_mod.Federation = Federation
+
+    class MeilisearchError(Exception):
+        pass
+
+    modules["meilisearch_python_sdk.errors"].MeilisearchError = MeilisearchError
+
+    class AsyncHttpRequests:
+        def __init__(self, http_client, json_handler):
+            self.http_client = http_client
+            self.json_handler = json_handler
+
+    modules["meilisearch_python_sdk._http_requests"].AsyncHttpRequests = (
+        AsyncHttpRequests
+    )
+
     lc_doc_mod = modules["langchain_core.documents"]
 
     class DummyDocument:
@@ -191,6 +230,9 @@ def stub_dependencies(monkeypatch):
     modules["meilisearch_python_sdk.models"].settings = modules[
         "meilisearch_python_sdk.models.settings"
     ]
+    modules["meilisearch_python_sdk.models"].search = modules[
+        "meilisearch_python_sdk.models.search"
+    ]
 
     for name, module in modules.items():
         sys.modules.setdefault(name, module)
@@ -4,7 +4,6 @@ import asyncio
 import copy
 import json
 import os
-import shutil
 from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from multiprocessing import Process
 from pathlib import Path
@@ -14,11 +13,21 @@ from apscheduler.schedulers.background import BackgroundScheduler
 import mimetypes
 
 from features.f1 import scheduler
-from features.f2 import duplicate_finder, metadata_store, migrations, path_links
+from features.f2 import (
+    blob_store,
+    doc_cache,
+    duplicate_finder,
+    duplicate_groups,
+    meili_http,
+    metadata_store,
+    migrations,
+    path_index,
+    path_links,
+)
 from features.f2 import search_index
 from features.f3 import archive
 from features.f4 import modules as modules_f4
-from features.f5 import chunking
+from features.f5 import chunking, near_duplicates
 from shared.logging_config import files_logger
 
 INDEX_DIRECTORY = Path(os.environ.get("INDEX_DIRECTORY", "/files"))
@@ -28,6 +37,8 @@ MAX_HASH_WORKERS = int(os.environ.get("MAX_HASH_WORKERS", CPU_COUNT // 2))
 MAX_FILE_WORKERS = int(os.environ.get("MAX_FILE_WORKERS", CPU_COUNT // 2))
 
 RESERVED_FILES_DIRS = [metadata_store.metadata_directory()]
+# index fields compared before re-sending a document migrated in memory
+MIGRATION_INDEX_FIELDS = ("version", "has_archive_paths", "offline")
 
 
 def _safe_mkdir(path: Path) -> None:
@@ -116,17 +127,19 @@ def index_metadata() -> tuple[
     ]
 
     def read_doc_json(doc_json_path: Path) -> dict[str, Any] | None:
-        if not doc_json_path.exists():
-            shutil.rmtree(doc_json_path.parent)
+        # incomplete directories are left for ``fsck --repair``
+        try:
+            with doc_json_path.open("r") as file:
+                return cast(dict[str, Any], json.load(file))
+        except FileNotFoundError:
             return None
-        with doc_json_path.open("r") as file:
-            return cast(dict[str, Any], json.load(file))
 
     def handle_doc(doc: dict[str, Any] | None) -> None:
         if not doc:
             return
         if migrations.migrate_doc(doc):
-            metadata_store.write_doc_json(doc)
+            # migrated in memory only; migrations.migrate_in_background
+            # persists the rewrite without holding up the sync
             migrated_docs_by_hash[doc["id"]] = doc
         hash_val = doc["id"]
         if hash_val in metadata_docs_by_hash:
@@ -313,12 +326,17 @@ def update_metadata(
         files_hashes_by_relpath.keys()
     )
 
+    unlinked_parents: set[Path] = set()
+    released_blobs: set[str] = set()
+
     def handle_deleted_relpath(relpath: str) -> None:
         metadata_doc = metadata_docs_by_hash[metadata_hashes_by_relpath[relpath]]
         by_id_path = metadata_store.by_id_directory() / metadata_doc["id"]
         if metadata_doc["id"] not in files_docs_by_hash and by_id_path.exists():
-            shutil.rmtree(by_id_path)
-        path_links.unlink_path(relpath)
+            if blob_store.MODULE_BLOB_STORE:
+                released_blobs.update(blob_store.referenced_digests(by_id_path))
+            metadata_store.remove_doc(metadata_doc["id"])
+        unlinked_parents.add(path_links.unlink_path(relpath, prune=False))
 
     def handle_upserted_doc(doc: dict[str, Any]) -> None:
         write_doc_json(doc)
@@ -337,6 +355,16 @@ def update_metadata(
                     for relpath in deleted_relpaths
                 ):
                     completed.result()
+        path_links.prune_empty_directories(unlinked_parents)
+        if released_blobs:
+            removed, freed = blob_store.collect_garbage(released_blobs)
+            report = blob_store.report()
+            files_logger.info(
+                " * removed %d unreferenced blobs (%d bytes), blobs save %d bytes",
+                removed,
+                freed,
+                report["saved_bytes"],
+            )
 
     if upserted_docs_by_hash:
         files_logger.info(" * upsert %d metadata documents", len(upserted_docs_by_hash))
@@ -351,22 +379,48 @@ def update_metadata(
                 ):
                     completed.result()
 
+    if duplicate_groups.is_built():
+        duplicate_groups.update(upserted_docs_by_hash.values())
+        duplicate_groups.remove(
+            set(metadata_docs_by_hash.keys()) - set(files_docs_by_hash.keys())
+        )
+    else:
+        files_logger.info(" * build duplicate group index")
+        duplicate_groups.rebuild(files_docs_by_hash.values())
+
+    if path_index.is_built():
+        path_index.update(upserted_docs_by_hash.values())
+        path_index.remove(
+            set(metadata_docs_by_hash.keys()) - set(files_docs_by_hash.keys())
+        )
+    else:
+        files_logger.info(" * build path index")
+        path_index.rebuild(files_docs_by_hash.values())
+
     return upserted_docs_by_hash, files_docs_by_hash
 
 
 async def update_meilisearch(
     upserted_docs_by_hash: dict[str, dict[str, Any]],
     files_docs_by_hash: Mapping[str, Mapping[str, Any]],
+    previous_docs_by_hash: Mapping[str, Mapping[str, Any]] | None = None,
 ) -> None:
-    files_logger.info(" * get all meilisearch documents")
-    all_meili_docs = await search_index.get_all_documents()
-    meili_hashes = {doc["id"] for doc in all_meili_docs}
-
-    files_logger.info(" * check for redundant meilisearch documents")
-    deleted_hashes = meili_hashes - set(files_docs_by_hash.keys())
+    """Reconcile the file index with ``files_docs_by_hash``.
+
+    Documents already in the index that have a ``previous_docs_by_hash``
+    entry are sent as change sets rather than whole documents.
+    """
+    files_logger.info(" * scan meilisearch document ids")
+    deleted_hashes: set[str] = set()
+    present_hashes: set[str] = set()
+    async for hash_val in search_index.iter_document_ids():
+        if hash_val in files_docs_by_hash:
+            present_hashes.add(hash_val)
+        else:
+            deleted_hashes.add(hash_val)
 
     files_logger.info(" * check for missing meilisearch documents")
-    missing_meili_hashes = set(files_docs_by_hash.keys()) - meili_hashes
+    missing_meili_hashes = set(files_docs_by_hash.keys()) - present_hashes
     upserted_docs_by_hash.update(
         {
             hash_val: cast(dict[str, Any], files_docs_by_hash[hash_val])
@@ -374,17 +428,31 @@ async def update_meilisearch(
         }
     )
 
+    # deleted and upserted ids are disjoint, so both phases are enqueued
+    # before waiting on exactly the tasks they created
+    task_uids: list[int] = []
     if deleted_hashes:
         files_logger.info(" * delete %d meilisearch documents", len(deleted_hashes))
-        await search_index.delete_docs_by_id(list(deleted_hashes))
-        await search_index.delete_chunk_docs_by_file_ids(list(deleted_hashes))
-        await search_index.wait_for_meili_idle()
+        task_uids += await search_index.delete_docs_by_id(list(deleted_hashes))
+        task_uids += await search_index.delete_chunk_docs_by_file_ids(
+            list(deleted_hashes)
+        )
+        await asyncio.to_thread(near_duplicates.remove, deleted_hashes)
     if upserted_docs_by_hash:
         files_logger.info(
             " * upsert %d meilisearch documents", len(upserted_docs_by_hash)
         )
-        await search_index.add_or_update_documents(list(upserted_docs_by_hash.values()))
-        await search_index.wait_for_meili_idle()
+        previous = previous_docs_by_hash or {}
+        changes = []
+        for hash_val, doc in upserted_docs_by_hash.items():
+            if hash_val in present_hashes and hash_val in previous:
+                change = search_index.changed_fields(previous[hash_val], doc)
+                if len(change) > 1:
+                    changes.append(change)
+            else:
+                changes.append(doc)
+        task_uids += await search_index.add_or_update_documents(changes)
+    await search_index.wait_for_tasks(task_uids)
     total_docs_in_meili = await search_index.get_document_count()
     files_logger.info(" * counted %d documents in meilisearch", total_docs_in_meili)
 
@@ -401,6 +469,7 @@ async def update_meilisearch(
 
 
 async def sync_documents() -> None:
+    requests_before = meili_http.snapshot()
     try:
         files_logger.info("---------------------------------------------------")
         files_logger.info("start file sync")
@@ -431,12 +500,39 @@ async def sync_documents() -> None:
 
         archive.update_drive_markers(files_docs_by_hash)
 
-        upserted_docs_by_hash.update(migrated_docs_by_hash)
+        # documents migrated in memory stay unmigrated on disk until the
+        # background migrator reaches them; send each only while the index
+        # holds an older version or other archive flags
+        indexed = await search_index.get_indexed_fields(
+            migrated_docs_by_hash, list(MIGRATION_INDEX_FIELDS)
+        )
+        stale_docs_by_hash = {
+            hash_val: doc
+            for hash_val, doc in migrated_docs_by_hash.items()
+            if hash_val not in indexed
+            or any(
+                indexed[hash_val].get(field) != doc.get(field)
+                for field in MIGRATION_INDEX_FIELDS
+            )
+        }
+        upserted_docs_by_hash.update(stale_docs_by_hash)
 
         files_logger.info("commit changes to meilisearch")
-        await update_meilisearch(upserted_docs_by_hash, files_docs_by_hash)
+        # stale documents may differ from the index anywhere and are sent whole
+        await update_meilisearch(
+            upserted_docs_by_hash,
+            files_docs_by_hash,
+            {
+                hash_val: doc
+                for hash_val, doc in metadata_docs_by_hash.items()
+                if hash_val not in stale_docs_by_hash
+            },
+        )
         await chunking.sync_content_files(files_docs_by_hash)
-        files_logger.info("completed file sync")
+        files_logger.info(
+            "completed file sync (meili %s)",
+            meili_http.format_stats(meili_http.stats_since(requests_before)),
+        )
     except Exception:  # pragma: no cover - unexpected errors
         files_logger.exception("sync failed")
         raise
@@ -455,6 +551,8 @@ def run_in_process(func: Callable[..., Coroutine[Any, Any, Any]], *args: Any) ->
     process = Process(target=run_async_in_loop, args=(func,) + args)
     process.start()
     process.join()
+    # the child may have rewritten metadata behind this process's cache
+    doc_cache.clear()
 
 
 async def init_meili_and_sync() -> None:
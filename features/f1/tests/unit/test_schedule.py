@@ -81,6 +81,9 @@ def test_scheduler_attaches_a_crontrigger_job_for_periodic_indexing(
     monkeypatch.setattr(
         hi.modules_f4, "service_module_queues", dummy_service_module_queues
     )
+    monkeypatch.setattr(
+        hi.index_rebuild, "rebuild_in_background", dummy_service_module_queues
+    )
 
     async def dummy_async():
         return None
@@ -1,10 +1,11 @@
 import asyncio
 
 
-def test_update_meilisearch_adds_and_deletes_documents(monkeypatch):
+def test_update_meilisearch_adds_and_deletes_documents(monkeypatch, tmp_path):
     import importlib
     from features.f1 import sync
 
+    monkeypatch.setenv("METADATA_DIRECTORY", str(tmp_path))
     importlib.reload(sync)
 
     upsert = {"doc1": {"id": "doc1"}}
@@ -12,23 +13,27 @@ def test_update_meilisearch_adds_and_deletes_documents(monkeypatch):
 
     recorded = {"deleted": [], "deleted_chunks": []}
 
-    async def fake_get_all_documents():
-        return []
+    async def fake_iter_document_ids():
+        for doc_id in ["doc1", "gone"]:
+            yield doc_id
 
     async def fake_delete(ids):
         recorded["deleted"] = ids
+        return [1]
 
     async def fake_delete_chunks(ids):
         recorded["deleted_chunks"] = ids
+        return [2]
 
     async def fake_add(docs):
         recorded["added"] = docs
+        return [3]
 
     async def fake_count():
         recorded["count"] = True
         return 1
 
-    monkeypatch.setattr(sync.search_index, "get_all_documents", fake_get_all_documents)
+    monkeypatch.setattr(sync.search_index, "iter_document_ids", fake_iter_document_ids)
     monkeypatch.setattr(sync.search_index, "delete_docs_by_id", fake_delete)
     monkeypatch.setattr(
         sync.search_index, "delete_chunk_docs_by_file_ids", fake_delete_chunks
@@ -36,14 +41,62 @@ def test_update_meilisearch_adds_and_deletes_documents(monkeypatch):
     monkeypatch.setattr(sync.search_index, "add_or_update_documents", fake_add)
     monkeypatch.setattr(sync.search_index, "get_document_count", fake_count)
 
-    async def dummy_wait():
-        recorded["waited"] = True
+    async def dummy_wait(task_uids):
+        recorded["waited"] = task_uids
 
-    monkeypatch.setattr(sync.search_index, "wait_for_meili_idle", dummy_wait)
+    monkeypatch.setattr(sync.search_index, "wait_for_tasks", dummy_wait)
 
     asyncio.run(sync.update_meilisearch(upsert, files))
 
     assert recorded["added"] == [{"id": "doc1"}]
-    assert recorded["deleted"] == []
-    assert recorded["deleted_chunks"] == []
+    assert recorded["deleted"] == ["gone"]
+    assert recorded["deleted_chunks"] == ["gone"]
     assert recorded["count"]
+    assert recorded["waited"] == [1, 2, 3]
+
+
+def test_update_meilisearch_sends_change_sets(monkeypatch, tmp_path):
+    import importlib
+
+    from features.f1 import sync
+
+    monkeypatch.setenv("METADATA_DIRECTORY", str(tmp_path))
+    importlib.reload(sync)
+
+    async def fake_iter_document_ids():
+        for doc_id in ["a", "b"]:
+            yield doc_id
+
+    added = []
+
+    async def fake_add(docs):
+        added.extend(docs)
+        return []
+
+    async def fake_count():
+        return 2
+
+    async def fake_wait(task_uids):
+        pass
+
+    monkeypatch.setattr(sync.search_index, "iter_document_ids", fake_iter_document_ids)
+    monkeypatch.setattr(sync.search_index, "add_or_update_documents", fake_add)
+    monkeypatch.setattr(sync.search_index, "get_document_count", fake_count)
+    monkeypatch.setattr(sync.search_index, "wait_for_tasks", fake_wait)
+
+    previous = {
+        "a": {"id": "a", "paths": {"x": 1.0}, "size": 3, "m.text": "long"},
+        "b": {"id": "b", "paths": {"y": 1.0}},
+    }
+    files = {
+        "a": {"id": "a", "paths": {"x": 1.0, "z": 2.0}, "size": 3, "m.text": "long"},
+        "b": {"id": "b", "paths": {"y": 1.0}},
+        "c": {"id": "c", "paths": {"c": 1.0}},
+    }
+    upserted = {"a": files["a"], "b": files["b"]}
+    asyncio.run(sync.update_meilisearch(upserted, files, previous))
+
+    assert added == [
+        {"id": "a", "paths": {"x": 1.0, "z": 2.0}},
+        {"id": "c", "paths": {"c": 1.0}},
+    ]
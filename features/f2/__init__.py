@@ -6,9 +6,19 @@ import importlib
 import types
 
 __all__ = [
+    "backup",
+    "blob_store",
+    "compression",
+    "doc_cache",
     "metadata_store",
     "path_links",
     "duplicate_finder",
+    "duplicate_groups",
+    "fsck",
+    "index_rebuild",
+    "local_db",
+    "path_index",
+    "meili_http",
     "migrations",
     "search_index",
 ]
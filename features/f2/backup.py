@@ -0,0 +1,335 @@
+"""Streaming export and import of the metadata store.
+
+An archive is an uncompressed tar holding ``manifest.json`` followed by
+gzip-compressed JSONL shards. Each line carries one document together with
+the small module output files under its ``by-id`` directory; larger files
+are streamed into their own tar members and referenced by name. Path links
+are rebuilt from the documents' ``paths``, and module directories that
+shared blobs are deduped again on import. Because shards are separate tar
+members, import seeks straight to each one and restores them in parallel.
+
+Ids, file names and paths read from an archive must stay inside ``by-id``
+and ``by-path``; a record that would escape them fails the import.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import gzip
+import io
+import json
+import os
+import tarfile
+import time
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path, PurePosixPath
+from typing import Any
+
+from features.f2 import blob_store, metadata_store, migrations, path_links
+from shared.logging_config import files_logger
+
+__all__ = [
+    "consume_import_marker",
+    "export_metadata",
+    "import_metadata",
+    "write_import_marker",
+]
+
+ARCHIVE_FORMAT = 2
+# formats this version can import; format 1 inlines every file
+READABLE_FORMATS = {1, 2}
+EXPORT_SHARD_SIZE = int(os.environ.get("EXPORT_SHARD_SIZE", "1000"))
+# files at least this large become tar members instead of inline base64
+EXPORT_INLINE_MAX_BYTES = int(os.environ.get("EXPORT_INLINE_MAX_BYTES", "65536"))
+BACKUP_WORKERS = int(os.environ.get("BACKUP_WORKERS", str(os.cpu_count() or 1)))
+MANIFEST_NAME = "manifest.json"
+IMPORT_MARKER_NAME = "imported.json"
+
+
+def import_marker_path() -> Path:
+    return metadata_store.metadata_directory() / IMPORT_MARKER_NAME
+
+
+def write_import_marker(documents: int) -> None:
+    """Record that the store and search index were restored together."""
+    with import_marker_path().open("w") as f:
+        json.dump({"documents": documents, "imported_at": time.time()}, f)
+
+
+def consume_import_marker() -> bool:
+    """Return ``True`` once after an import so startup can skip its sync."""
+    path = import_marker_path()
+    if not path.exists():
+        return False
+    path.unlink(missing_ok=True)
+    return True
+
+
+# --- export -----------------------------------------------------------------
+
+
+def _member_name(file_id: str, relname: str) -> str:
+    return f"files/{file_id}/{relname}"
+
+
+def _doc_record(doc_dir: Path, large: list[tuple[str, Path]]) -> dict[str, Any] | None:
+    """Return the record of ``doc_dir``; its large files go into ``large``."""
+    try:
+        with (doc_dir / "document.json").open("r") as f:
+            doc = json.load(f)
+    except (OSError, ValueError):
+        return None
+    files: dict[str, str] = {}
+    members: dict[str, str] = {}
+    blob_dirs: list[str] = []
+    for root, dirs, names in os.walk(doc_dir):
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        if blob_store.MANIFEST_FILENAME in names:
+            blob_dirs.append(Path(root).relative_to(doc_dir).as_posix())
+        for name in names:
+            path = Path(root) / name
+            if name.startswith(".") or path == doc_dir / "document.json":
+                continue
+            relname = path.relative_to(doc_dir).as_posix()
+            if path.stat().st_size >= EXPORT_INLINE_MAX_BYTES:
+                members[relname] = _member_name(doc["id"], relname)
+                large.append((members[relname], path))
+            else:
+                files[relname] = base64.b64encode(path.read_bytes()).decode("ascii")
+    return {
+        "id": doc["id"],
+        "document": doc,
+        "files": files,
+        "members": members,
+        "blob_dirs": blob_dirs,
+    }
+
+
+def _build_shard(doc_dirs: list[Path]) -> tuple[bytes, int, list[tuple[str, Path]]]:
+    buffer = io.BytesIO()
+    count = 0
+    large: list[tuple[str, Path]] = []
+    with gzip.GzipFile(fileobj=buffer, mode="wb", compresslevel=6, mtime=0) as gz:
+        for doc_dir in doc_dirs:
+            record = _doc_record(doc_dir, large)
+            if record is None:
+                continue
+            gz.write(json.dumps(record).encode())
+            gz.write(b"\n")
+            count += 1
+    return buffer.getvalue(), count, large
+
+
+def _shards(shard_size: int) -> Iterator[list[Path]]:
+    batch: list[Path] = []
+    for entry in os.scandir(metadata_store.by_id_directory()):
+        if not entry.is_dir():
+            continue
+        batch.append(Path(entry.path))
+        if len(batch) >= shard_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _add_member(tar: tarfile.TarFile, name: str, data: bytes) -> None:
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mtime = int(time.time())
+    tar.addfile(info, io.BytesIO(data))
+
+
+def _add_file_member(tar: tarfile.TarFile, name: str, path: Path) -> None:
+    # streamed from disk; ``tar.add`` would store blob-store hard links as
+    # link members without data
+    with path.open("rb") as f:
+        info = tarfile.TarInfo(name)
+        info.size = os.fstat(f.fileno()).st_size
+        info.mtime = int(time.time())
+        tar.addfile(info, f)
+
+
+def export_metadata(
+    archive_path: Path,
+    shard_size: int = EXPORT_SHARD_SIZE,
+    workers: int = BACKUP_WORKERS,
+) -> int:
+    """Stream the metadata store into ``archive_path``; return doc count."""
+    archive_path = Path(archive_path)
+    tmp_path = archive_path.with_name(archive_path.name + ".partial")
+    shard_names: list[str] = []
+    total = 0
+    start = time.monotonic()
+    with tarfile.open(tmp_path, "w") as tar, ThreadPoolExecutor(
+        max_workers=max(workers, 1)
+    ) as executor:
+        shard_iter = _shards(shard_size)
+        pending = [
+            executor.submit(_build_shard, shard)
+            for _, shard in zip(range(max(workers, 1) * 2), shard_iter)
+        ]
+        while pending:
+            data, count, large = pending.pop(0).result()
+            next_shard = next(shard_iter, None)
+            if next_shard is not None:
+                pending.append(executor.submit(_build_shard, next_shard))
+            for member_name, path in large:
+                _add_file_member(tar, member_name, path)
+            if not count:
+                continue
+            name = f"shards/{len(shard_names):06d}.jsonl.gz"
+            _add_member(tar, name, data)
+            shard_names.append(name)
+            total += count
+            files_logger.info("export: %d documents written", total)
+        manifest = {
+            "format": ARCHIVE_FORMAT,
+            "version": migrations.CURRENT_VERSION,
+            "documents": total,
+            "shards": shard_names,
+        }
+        _add_member(tar, MANIFEST_NAME, json.dumps(manifest).encode())
+    os.replace(tmp_path, archive_path)
+    files_logger.info(
+        "export: %d documents in %d shards to %s in %.1fs",
+        total,
+        len(shard_names),
+        archive_path,
+        time.monotonic() - start,
+    )
+    return total
+
+
+# --- import -----------------------------------------------------------------
+
+
+def _read_member(archive_path: Path, member: tarfile.TarInfo) -> bytes:
+    with archive_path.open("rb") as f:
+        f.seek(member.offset_data)
+        return f.read(member.size)
+
+
+def _safe_relpath(relpath: str) -> str:
+    """Return ``relpath`` if it stays below the directory it is joined to."""
+    parts = PurePosixPath(relpath).parts
+    if (
+        not parts
+        or PurePosixPath(relpath).is_absolute()
+        or "\\" in relpath
+        or any(part in ("", ".", "..") for part in parts)
+    ):
+        raise ValueError(f"unsafe path in archive: {relpath!r}")
+    return relpath
+
+
+def _copy_member(archive_path: Path, member: tarfile.TarInfo, target: Path) -> None:
+    with archive_path.open("rb") as src, target.open("wb") as dst:
+        src.seek(member.offset_data)
+        remaining = member.size
+        while remaining:
+            chunk = src.read(min(remaining, 1 << 20))
+            if not chunk:
+                raise ValueError(f"truncated archive member {member.name!r}")
+            dst.write(chunk)
+            remaining -= len(chunk)
+
+
+def _restore_record(
+    record: dict[str, Any],
+    archive_path: Path,
+    members: dict[str, tarfile.TarInfo],
+) -> dict[str, Any]:
+    doc = record["document"]
+    file_id = _safe_relpath(str(record["id"]))
+    if "/" in file_id or doc.get("id") != file_id:
+        raise ValueError(f"unsafe id in archive: {file_id!r}")
+    for relpath in doc.get("paths", {}):
+        _safe_relpath(relpath)
+    doc_dir = metadata_store.by_id_directory() / file_id
+    for relname, encoded in record.get("files", {}).items():
+        target = doc_dir / _safe_relpath(relname)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_bytes(base64.b64decode(encoded))
+    for relname, member_name in record.get("members", {}).items():
+        target = doc_dir / _safe_relpath(relname)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        _copy_member(archive_path, members[member_name], target)
+    metadata_store.write_doc_json(doc)
+    if blob_store.MODULE_BLOB_STORE:
+        for blob_dir in record.get("blob_dirs", []):
+            # relink artifacts this document shared before the export
+            target = doc_dir if blob_dir == "." else doc_dir / _safe_relpath(blob_dir)
+            if target.is_dir():
+                blob_store.dedupe_directory(target)
+    for relpath in doc.get("paths", {}):
+        path_links.link_path(relpath, file_id)
+    return dict(doc)
+
+
+def _restore_shard(
+    archive_path: Path,
+    member: tarfile.TarInfo,
+    members: dict[str, tarfile.TarInfo],
+) -> list[str]:
+    data = gzip.decompress(_read_member(archive_path, member))
+    return [
+        _restore_record(json.loads(line), archive_path, members)["id"]
+        for line in data.splitlines()
+        if line.strip()
+    ]
+
+
+async def import_metadata(
+    archive_path: Path,
+    *,
+    update_search_index: bool = True,
+    workers: int = BACKUP_WORKERS,
+) -> int:
+    """Restore ``archive_path`` into the metadata store; return doc count.
+
+    With ``update_search_index`` the restored documents and their chunks are
+    also uploaded to Meilisearch and an import marker is written so the next
+    start skips its bootstrap sync.
+    """
+    archive_path = Path(archive_path)
+    with tarfile.open(archive_path, "r:") as tar:
+        members = {m.name: m for m in tar.getmembers()}
+    manifest = json.loads(_read_member(archive_path, members[MANIFEST_NAME]))
+    if manifest.get("format") not in READABLE_FORMATS:
+        raise ValueError(f"unsupported archive format {manifest.get('format')!r}")
+    metadata_store.ensure_directories()
+    path_links.ensure_directories()
+
+    start = time.monotonic()
+    semaphore = asyncio.Semaphore(max(workers, 1))
+
+    async def restore(name: str) -> list[str]:
+        async with semaphore:
+            return await asyncio.to_thread(
+                _restore_shard, archive_path, members[name], members
+            )
+
+    restored = 0
+    for ids in asyncio.as_completed([restore(n) for n in manifest["shards"]]):
+        restored += len(await ids)
+        files_logger.info(
+            "import: %d/%d documents restored", restored, manifest["documents"]
+        )
+    files_logger.info(
+        "import: restored %d documents in %.1fs", restored, time.monotonic() - start
+    )
+
+    if update_search_index:
+        await _upload_restored()
+        write_import_marker(restored)
+    return restored
+
+
+async def _upload_restored() -> None:
+    from features.f2 import index_rebuild, search_index
+
+    await search_index.init_meili()
+    await index_rebuild.restore_indexes()
@@ -0,0 +1,224 @@
+"""Content-addressed storage for identical module artifacts.
+
+Module output files are hard linked to ``metadata/blobs/<xx>/<sha256>`` so
+identical artifacts produced for different file IDs share one inode. Each
+module directory records its references in ``.blobs.json``; the link count of
+a blob is its reference count and a blob with a single link is garbage.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Any
+
+from features.f2 import metadata_store
+
+__all__ = [
+    "MODULE_BLOB_STORE",
+    "blobs_directory",
+    "collect_garbage",
+    "dedupe_directory",
+    "referenced_digests",
+    "released_digests",
+    "report",
+    "unshare_directory",
+]
+
+MODULE_BLOB_STORE = str(os.environ.get("MODULE_BLOB_STORE", "False")) == "True"
+MODULE_BLOB_MIN_BYTES = int(os.environ.get("MODULE_BLOB_MIN_BYTES", "4096"))
+MANIFEST_FILENAME = ".blobs.json"
+# digests a module rerun gave up, kept until the done queue collects them
+RELEASED_FILENAME = ".blobs.released.json"
+# appended to in place or unique per file ID, so never worth sharing
+EXCLUDED_PREFIXES = ("document.json", "log.txt", "chunks.json", ".")
+
+
+def blobs_directory() -> Path:
+    return Path(
+        os.environ.get(
+            "BLOBS_DIRECTORY", str(metadata_store.metadata_directory() / "blobs")
+        )
+    )
+
+
+def _blob_path(digest: str) -> Path:
+    return blobs_directory() / digest[:2] / digest
+
+
+def _digest(path: Path) -> str:
+    hasher = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def _candidates(dir_path: Path) -> Iterable[Path]:
+    for root, dirs, files in os.walk(dir_path):
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        for name in files:
+            if name.startswith(EXCLUDED_PREFIXES):
+                continue
+            yield Path(root) / name
+
+
+def _replace_with_link(source: Path, target: Path) -> None:
+    fd, tmp = tempfile.mkstemp(dir=str(target.parent), prefix=f".{target.name}.")
+    os.close(fd)
+    os.unlink(tmp)
+    os.link(source, tmp)
+    os.replace(tmp, target)
+
+
+def dedupe_directory(dir_path: Path) -> int:
+    """Link artifacts under ``dir_path`` into the blob store.
+
+    Returns the number of bytes saved by this call.
+    """
+    saved = 0
+    manifest: dict[str, str] = {}
+    for path in _candidates(dir_path):
+        try:
+            stat = path.lstat()
+        except FileNotFoundError:
+            continue
+        if not path.is_file() or path.is_symlink():
+            continue
+        if stat.st_size < MODULE_BLOB_MIN_BYTES:
+            continue
+        digest = _digest(path)
+        blob = _blob_path(digest)
+        relname = path.relative_to(dir_path).as_posix()
+        manifest[relname] = digest
+        try:
+            blob_stat = blob.stat()
+        except FileNotFoundError:
+            blob.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                os.link(path, blob)
+            except FileExistsError:
+                blob_stat = blob.stat()
+            else:
+                continue
+        if (blob_stat.st_dev, blob_stat.st_ino) == (stat.st_dev, stat.st_ino):
+            continue
+        _replace_with_link(blob, path)
+        saved += stat.st_size
+    manifest_path = dir_path / MANIFEST_FILENAME
+    if manifest:
+        with manifest_path.open("w") as f:
+            json.dump(manifest, f)
+    else:
+        manifest_path.unlink(missing_ok=True)
+    return saved
+
+
+def _read_manifest_digests(path: Path) -> set[str]:
+    try:
+        with path.open("r") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return set()
+    return set(data.values() if isinstance(data, dict) else data)
+
+
+def unshare_directory(dir_path: Path) -> set[str]:
+    """Give every linked artifact under ``dir_path`` a private copy.
+
+    Modules may rewrite their artifacts in place, which would otherwise
+    change the shared blob for every file ID that references it. The
+    manifest's digests are returned and kept in ``RELEASED_FILENAME`` until
+    :func:`released_digests` hands them to :func:`collect_garbage`.
+    """
+    for path in _candidates(dir_path):
+        try:
+            if path.is_symlink() or path.stat().st_nlink < 2:
+                continue
+        except FileNotFoundError:
+            continue
+        fd, tmp = tempfile.mkstemp(dir=str(path.parent), prefix=f".{path.name}.")
+        os.close(fd)
+        shutil.copy2(path, tmp)
+        os.replace(tmp, path)
+    manifest_path = dir_path / MANIFEST_FILENAME
+    released_path = dir_path / RELEASED_FILENAME
+    digests = _read_manifest_digests(manifest_path)
+    if digests:
+        # a rerun whose output was never collected released blobs as well
+        digests |= _read_manifest_digests(released_path)
+        with released_path.open("w") as f:
+            json.dump(sorted(digests), f)
+    manifest_path.unlink(missing_ok=True)
+    return digests
+
+
+def released_digests(dir_path: Path) -> set[str]:
+    """Return and forget the digests released by reruns under ``dir_path``."""
+    released_path = dir_path / RELEASED_FILENAME
+    digests = _read_manifest_digests(released_path)
+    released_path.unlink(missing_ok=True)
+    return digests
+
+
+def referenced_digests(dir_path: Path) -> set[str]:
+    """Return digests referenced by manifests anywhere under ``dir_path``."""
+    digests: set[str] = set()
+    for manifest in dir_path.rglob(MANIFEST_FILENAME):
+        try:
+            with manifest.open("r") as f:
+                digests.update(json.load(f).values())
+        except (OSError, ValueError):
+            continue
+    return digests
+
+
+def collect_garbage(digests: Iterable[str] | None = None) -> tuple[int, int]:
+    """Remove unreferenced blobs; return ``(blobs removed, bytes freed)``.
+
+    Only ``digests`` are checked when given, otherwise the whole store is
+    scanned.
+    """
+    if digests is None:
+        root = blobs_directory()
+        paths: Iterable[Path] = root.glob("*/*") if root.exists() else []
+    else:
+        paths = [_blob_path(d) for d in digests]
+    removed = freed = 0
+    for blob in paths:
+        try:
+            stat = blob.stat()
+        except FileNotFoundError:
+            continue
+        if stat.st_nlink == 1:
+            blob.unlink(missing_ok=True)
+            removed += 1
+            freed += stat.st_size
+    return removed, freed
+
+
+def report() -> dict[str, Any]:
+    """Return blob counts, stored bytes and bytes saved by sharing."""
+    blobs = references = stored = saved = 0
+    root = blobs_directory()
+    for blob in root.glob("*/*") if root.exists() else []:
+        try:
+            stat = blob.stat()
+        except FileNotFoundError:
+            continue
+        refs = stat.st_nlink - 1
+        blobs += 1
+        references += refs
+        stored += stat.st_size
+        saved += stat.st_size * max(refs - 1, 0)
+    return {
+        "blobs": blobs,
+        "references": references,
+        "stored_bytes": stored,
+        "saved_bytes": saved,
+    }
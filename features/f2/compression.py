@@ -0,0 +1,130 @@
+"""Transparent compression for large metadata files.
+
+Files are written as ``<name>`` (plain), ``<name>.gz`` or ``<name>.zst``
+depending on ``METADATA_COMPRESSION``. Readers accept any of the three so
+stores written before or after enabling compression keep working.
+"""
+
+from __future__ import annotations
+
+import gzip
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Any
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - zstandard optional
+    zstandard = None
+
+__all__ = [
+    "METADATA_COMPRESSION",
+    "exists",
+    "find",
+    "read_bytes",
+    "read_json",
+    "unlink",
+    "variants",
+    "write_bytes",
+    "write_json",
+]
+
+# "", "gzip" or "zstd"; zstd falls back to gzip if ``zstandard`` is missing
+METADATA_COMPRESSION = os.environ.get("METADATA_COMPRESSION", "").lower()
+METADATA_COMPRESSION_LEVEL = int(os.environ.get("METADATA_COMPRESSION_LEVEL", "3"))
+# smaller payloads are stored plain; compressing them saves nothing on disk
+METADATA_COMPRESSION_MIN_BYTES = int(
+    os.environ.get("METADATA_COMPRESSION_MIN_BYTES", "4096")
+)
+
+GZIP_SUFFIX = ".gz"
+ZSTD_SUFFIX = ".zst"
+
+
+def _suffix() -> str:
+    if METADATA_COMPRESSION == "zstd" and zstandard is not None:
+        return ZSTD_SUFFIX
+    if METADATA_COMPRESSION in ("gzip", "zstd"):
+        return GZIP_SUFFIX
+    return ""
+
+
+def _with_suffix(path: Path, suffix: str) -> Path:
+    return path.with_name(path.name + suffix) if suffix else path
+
+
+def variants(path: str | Path) -> list[Path]:
+    """Return every on-disk name ``path`` may be stored under."""
+    path = Path(path)
+    return [_with_suffix(path, s) for s in ("", GZIP_SUFFIX, ZSTD_SUFFIX)]
+
+
+def find(path: str | Path) -> Path | None:
+    """Return the existing variant of ``path`` or ``None``."""
+    for candidate in variants(path):
+        if candidate.exists():
+            return candidate
+    return None
+
+
+def exists(path: str | Path) -> bool:
+    return find(path) is not None
+
+
+def unlink(path: str | Path) -> None:
+    """Remove ``path`` in all of its variants."""
+    for candidate in variants(path):
+        candidate.unlink(missing_ok=True)
+
+
+def read_bytes(path: str | Path) -> bytes:
+    """Return the decompressed contents of ``path``."""
+    found = find(path)
+    if found is None:
+        raise FileNotFoundError(str(path))
+    data = found.read_bytes()
+    if found.name.endswith(GZIP_SUFFIX):
+        return gzip.decompress(data)
+    if found.name.endswith(ZSTD_SUFFIX):
+        if zstandard is None:
+            raise RuntimeError(f"zstandard is required to read {found}")
+        return bytes(zstandard.ZstdDecompressor().decompressobj().decompress(data))
+    return data
+
+
+def write_bytes(path: str | Path, data: bytes) -> Path:
+    """Atomically write ``data`` to ``path`` and return the file written.
+
+    The file is replaced rather than truncated in place, so hard links to the
+    previous contents are never modified.
+    """
+    path = Path(path)
+    suffix = _suffix() if len(data) >= METADATA_COMPRESSION_MIN_BYTES else ""
+    if suffix == GZIP_SUFFIX:
+        data = gzip.compress(data, compresslevel=METADATA_COMPRESSION_LEVEL, mtime=0)
+    elif suffix == ZSTD_SUFFIX:
+        data = zstandard.ZstdCompressor(level=METADATA_COMPRESSION_LEVEL).compress(data)
+    target = _with_suffix(path, suffix)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=str(target.parent), prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp, target)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+    for candidate in variants(path):
+        if candidate != target:
+            candidate.unlink(missing_ok=True)
+    return target
+
+
+def read_json(path: str | Path) -> Any:
+    return json.loads(read_bytes(path))
+
+
+def write_json(path: str | Path, data: Any, **kwargs: Any) -> Path:
+    return write_bytes(path, json.dumps(data, **kwargs).encode())
@@ -0,0 +1,108 @@
+"""Process-wide read-through cache for metadata documents and path links."""
+
+from __future__ import annotations
+
+import copy
+import os
+import threading
+from collections import OrderedDict
+from collections.abc import Hashable
+from typing import Any, Generic, TypeVar
+
+__all__ = [
+    "LRUCache",
+    "clear",
+    "docs_by_id",
+    "get_doc",
+    "ids_by_path",
+    "put_doc",
+    "stats",
+]
+
+DOC_CACHE_SIZE = int(os.environ.get("DOC_CACHE_SIZE", "10000"))
+PATH_CACHE_SIZE = int(os.environ.get("PATH_CACHE_SIZE", "100000"))
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+_MISSING = object()
+
+
+class LRUCache(Generic[K, V]):
+    """Thread-safe LRU mapping with hit and miss counters."""
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data: OrderedDict[K, V] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: K) -> V | None:
+        with self._lock:
+            value = self._data.get(key, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value  # type: ignore[return-value]
+
+    def put(self, key: K, value: V) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key: K) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+docs_by_id: LRUCache[str, dict[str, Any]] = LRUCache(DOC_CACHE_SIZE)
+ids_by_path: LRUCache[str, str] = LRUCache(PATH_CACHE_SIZE)
+
+
+def get_doc(file_id: str) -> dict[str, Any] | None:
+    """Return a private copy of the cached document for ``file_id``."""
+    doc = docs_by_id.get(file_id)
+    return copy.deepcopy(doc) if doc is not None else None
+
+
+def put_doc(doc: dict[str, Any]) -> None:
+    """Cache a private copy of ``doc`` under its ``id``."""
+    docs_by_id.put(str(doc["id"]), copy.deepcopy(doc))
+
+
+def stats() -> dict[str, dict[str, Any]]:
+    """Return hit-rate counters for both caches."""
+    return {"docs_by_id": docs_by_id.stats(), "ids_by_path": ids_by_path.stats()}
+
+
+def clear() -> None:
+    """Drop every cached entry, e.g. after another process rewrote metadata."""
+    docs_by_id.clear()
+    ids_by_path.clear()
@@ -0,0 +1,141 @@
+"""Persistent index of duplicate groups ordered by wasted bytes.
+
+A group is one document with more than one path. Sync and the file API keep
+the index current by passing the documents they upsert or remove, so the
+largest sources of redundant bytes can be listed without scanning
+Meilisearch.
+"""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+from collections.abc import Iterable, Mapping
+from typing import Any
+
+from features.f2 import local_db
+
+__all__ = [
+    "is_built",
+    "list_groups",
+    "mark_reclaimed",
+    "rebuild",
+    "remove",
+    "summary",
+    "update",
+]
+
+DB_NAME = "duplicate_groups"
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS duplicate_groups (
+    id TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    copies INTEGER NOT NULL,
+    wasted INTEGER NOT NULL,
+    paths TEXT NOT NULL,
+    reclaimed INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS duplicate_groups_by_wasted
+    ON duplicate_groups (wasted DESC, id);
+CREATE TABLE IF NOT EXISTS duplicate_groups_state (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def _row(doc: Mapping[str, Any]) -> tuple[str, int, int, int, str] | None:
+    paths = sorted(doc.get("paths", {}))
+    if len(paths) < 2:
+        return None
+    size = int(doc.get("size", 0))
+    return doc["id"], size, len(paths), size * (len(paths) - 1), json.dumps(paths)
+
+
+def _upsert(conn: sqlite3.Connection, docs: Iterable[Mapping[str, Any]]) -> None:
+    rows = []
+    singles = []
+    for doc in docs:
+        row = _row(doc)
+        if row is None:
+            singles.append((doc["id"],))
+        else:
+            rows.append(row)
+    conn.executemany("DELETE FROM duplicate_groups WHERE id = ?", singles)
+    # space reclaimed by linking copies stays valid while the paths do
+    conn.executemany(
+        "INSERT INTO duplicate_groups (id, size, copies, wasted, paths) "
+        "VALUES (?, ?, ?, ?, ?) ON CONFLICT(id) DO UPDATE SET "
+        "size = excluded.size, copies = excluded.copies, "
+        "reclaimed = CASE WHEN paths = excluded.paths THEN reclaimed ELSE 0 END, "
+        "wasted = MAX(excluded.wasted - CASE WHEN paths = excluded.paths "
+        "THEN reclaimed ELSE 0 END, 0), "
+        "paths = excluded.paths",
+        rows,
+    )
+
+
+def is_built() -> bool:
+    """Return ``True`` once :func:`rebuild` has populated the index."""
+    with local_db.connect(DB_NAME, SCHEMA) as conn:
+        row = conn.execute(
+            "SELECT value FROM duplicate_groups_state WHERE key = 'built'"
+        ).fetchone()
+    return row is not None
+
+
+def rebuild(docs: Iterable[Mapping[str, Any]]) -> None:
+    """Replace the index with groups from ``docs``."""
+    with local_db.connect(DB_NAME, SCHEMA) as conn:
+        conn.execute("DELETE FROM duplicate_groups")
+        _upsert(conn, docs)
+        conn.execute(
+            "INSERT OR REPLACE INTO duplicate_groups_state VALUES ('built', '1')"
+        )
+
+
+def update(docs: Iterable[Mapping[str, Any]]) -> None:
+    """Record the current ``paths`` of ``docs``."""
+    with local_db.connect(DB_NAME, SCHEMA) as conn:
+        _upsert(conn, docs)
+
+
+def remove(file_ids: Iterable[str]) -> None:
+    """Drop groups for deleted ``file_ids``."""
+    with local_db.connect(DB_NAME, SCHEMA) as conn:
+        conn.executemany(
+            "DELETE FROM duplicate_groups WHERE id = ?", [(i,) for i in file_ids]
+        )
+
+
+def mark_reclaimed(file_id: str, reclaimed: int) -> None:
+    """Record that ``reclaimed`` bytes of a group now share storage."""
+    with local_db.connect(DB_NAME, SCHEMA) as conn:
+        conn.execute(
+            "UPDATE duplicate_groups SET reclaimed = ?, "
+            "wasted = MAX(size * (copies - 1) - ?, 0) WHERE id = ?",
+            (reclaimed, reclaimed, file_id),
+        )
+
+
+def list_groups(
+    limit: int = 100, offset: int = 0, min_wasted: int = 0
+) -> list[dict[str, Any]]:
+    """Return groups with the most wasted bytes first."""
+    with local_db.connect(DB_NAME, SCHEMA) as conn:
+        rows = conn.execute(
+            "SELECT * FROM duplicate_groups WHERE wasted >= ? "
+            "ORDER BY wasted DESC, id LIMIT ? OFFSET ?",
+            (min_wasted, limit, offset),
+        ).fetchall()
+    return [{**dict(row), "paths": json.loads(row["paths"])} for row in rows]
+
+
+def summary() -> dict[str, int]:
+    """Return the number of groups, redundant copies and wasted bytes."""
+    with local_db.connect(DB_NAME, SCHEMA) as conn:
+        groups, copies, wasted = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(copies - 1), 0), "
+            "COALESCE(SUM(wasted), 0) FROM duplicate_groups"
+        ).fetchone()
+    return {"groups": groups, "redundant_copies": copies, "wasted_bytes": wasted}
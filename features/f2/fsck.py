@@ -0,0 +1,250 @@
+"""Consistency checks for the metadata store, path links and search index.
+
+``check_store`` scans ``by-id`` and ``by-path`` in parallel and returns the
+issues found, keyed by check name. ``repair_store`` and ``repair_index`` fix
+them in bulk so sync never has to clean up behind crashes or manual edits.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import shutil
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, cast
+
+from features.f2 import blob_store, metadata_store, migrations, path_links
+from shared.logging_config import files_logger
+
+__all__ = [
+    "CHECKS",
+    "check_index",
+    "check_store",
+    "repair_index",
+    "repair_store",
+    "run_fsck",
+]
+
+FSCK_WORKERS = int(os.environ.get("FSCK_WORKERS", str(os.cpu_count() or 1)))
+
+CHECKS = (
+    # by-id directory without document.json
+    "missing_document",
+    # document.json that cannot be parsed; reported, never removed
+    "unreadable_document",
+    # by-id/<id>/<module> for a module that is no longer configured
+    "orphan_module_dir",
+    # by-path link to an id without a document
+    "dangling_link",
+    # by-path link whose relpath is not in the target document's paths
+    "stale_link",
+    # document path without a correct by-path link
+    "missing_link",
+    # id in Meilisearch but not in the store
+    "index_only",
+    # id in the store but not in Meilisearch
+    "store_only",
+)
+
+Issues = dict[str, list[str]]
+
+
+def _empty_issues() -> Issues:
+    return {name: [] for name in CHECKS}
+
+
+def _scan_doc_dir(
+    entry_path: str, module_names: frozenset[str] | None
+) -> tuple[str, dict[str, Any] | None, str | None, list[str]]:
+    doc_dir = Path(entry_path)
+    orphans: list[str] = []
+    if module_names is not None:
+        orphans = [
+            f"{doc_dir.name}/{child.name}"
+            for child in doc_dir.iterdir()
+            if child.is_dir()
+            and not child.name.startswith(".")
+            and child.name not in module_names
+        ]
+    try:
+        with (doc_dir / "document.json").open("r") as f:
+            doc = cast(dict[str, Any], json.load(f))
+    except FileNotFoundError:
+        return doc_dir.name, None, "missing_document", orphans
+    except (OSError, ValueError):
+        return doc_dir.name, None, "unreadable_document", orphans
+    migrations.migrate_doc(doc)
+    return doc_dir.name, doc, None, orphans
+
+
+def _scan_links(top: str) -> list[tuple[str, str]]:
+    root = path_links.by_path_directory()
+    links: list[tuple[str, str]] = []
+    for dirpath, dirnames, filenames in os.walk(top):
+        for name in dirnames + filenames:
+            path = os.path.join(dirpath, name)
+            if os.path.islink(path):
+                relpath = os.path.relpath(path, root)
+                links.append((relpath, os.path.basename(os.readlink(path))))
+    return links
+
+
+def check_store(
+    module_names: Iterable[str] | None = None,
+    workers: int = FSCK_WORKERS,
+) -> tuple[dict[str, dict[str, Any]], Issues]:
+    """Scan the store; return ``(documents by id, issues)``.
+
+    Module directories are only checked when ``module_names`` names at least
+    one module. No configured modules usually means ``MODULES`` is unset or
+    failed to parse, and every module directory would look orphaned.
+    """
+    issues = _empty_issues()
+    docs_by_id: dict[str, dict[str, Any]] = {}
+    names: frozenset[str] | None = frozenset(module_names or ())
+    if not names:
+        if module_names is not None:
+            files_logger.warning("fsck: no modules loaded; skip module dir check")
+        names = None
+    by_id = metadata_store.by_id_directory()
+    by_path = path_links.by_path_directory()
+    doc_dirs = (
+        [e.path for e in os.scandir(by_id) if e.is_dir()] if by_id.exists() else []
+    )
+
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        for file_id, doc, problem, orphans in executor.map(
+            lambda p: _scan_doc_dir(p, names), doc_dirs, chunksize=256
+        ):
+            if problem:
+                issues[problem].append(file_id)
+            elif doc is not None:
+                docs_by_id[file_id] = doc
+            issues["orphan_module_dir"].extend(orphans)
+
+        links: list[tuple[str, str]] = []
+        if by_path.exists():
+            tops = []
+            for entry in os.scandir(by_path):
+                if entry.is_symlink():
+                    links.append((entry.name, os.path.basename(os.readlink(entry))))
+                elif entry.is_dir():
+                    tops.append(entry.path)
+            for found in executor.map(_scan_links, tops):
+                links.extend(found)
+
+    linked: dict[str, str] = {}
+    for relpath, file_id in links:
+        doc = docs_by_id.get(file_id)
+        if doc is None:
+            issues["dangling_link"].append(relpath)
+        elif relpath not in doc.get("paths", {}):
+            issues["stale_link"].append(relpath)
+        else:
+            linked[relpath] = file_id
+    for file_id, doc in docs_by_id.items():
+        for relpath in doc.get("paths", {}):
+            if linked.get(relpath) != file_id:
+                issues["missing_link"].append(relpath)
+
+    for name in CHECKS:
+        issues[name].sort()
+    return docs_by_id, issues
+
+
+def repair_store(docs_by_id: dict[str, dict[str, Any]], issues: Issues) -> None:
+    """Fix store and link issues found by :func:`check_store`."""
+    by_id = metadata_store.by_id_directory()
+    released: set[str] = set()
+    for file_id in issues["missing_document"]:
+        released |= blob_store.referenced_digests(by_id / file_id)
+        metadata_store.remove_doc(file_id)
+    for relname in issues["orphan_module_dir"]:
+        released |= blob_store.referenced_digests(by_id / relname)
+        shutil.rmtree(by_id / relname, ignore_errors=True)
+
+    parents = [
+        path_links.unlink_path(relpath, prune=False)
+        for relpath in issues["dangling_link"] + issues["stale_link"]
+    ]
+    path_links.prune_empty_directories(parents)
+    owners = {
+        relpath: file_id
+        for file_id, doc in docs_by_id.items()
+        for relpath in doc.get("paths", {})
+    }
+    for relpath in issues["missing_link"]:
+        path_links.link_path(relpath, owners[relpath])
+
+    if released:
+        removed, freed = blob_store.collect_garbage(released)
+        files_logger.info("fsck: removed %d blobs, freed %d bytes", removed, freed)
+
+
+async def check_index(docs_by_id: dict[str, dict[str, Any]], issues: Issues) -> None:
+    """Compare Meilisearch ids with the store and record differences."""
+    from features.f2 import search_index
+
+    index_ids = {doc_id async for doc_id in search_index.iter_document_ids()}
+    issues["index_only"] = sorted(index_ids - docs_by_id.keys())
+    issues["store_only"] = sorted(docs_by_id.keys() - index_ids)
+
+
+async def repair_index(docs_by_id: dict[str, dict[str, Any]], issues: Issues) -> None:
+    """Upsert ``store_only`` documents and delete ``index_only`` ones."""
+    from features.f2 import search_index
+
+    task_uids: list[int] = []
+    if issues["index_only"]:
+        task_uids += await search_index.delete_docs_by_id(issues["index_only"])
+        task_uids += await search_index.delete_chunk_docs_by_file_ids(
+            issues["index_only"]
+        )
+    if issues["store_only"]:
+        docs = []
+        for file_id in issues["store_only"]:
+            doc = {
+                k: v
+                for k, v in docs_by_id[file_id].items()
+                if not k.endswith(".content")
+            }
+            docs.append(doc)
+        task_uids += await search_index.add_or_update_documents(docs)
+    await search_index.wait_for_tasks(task_uids)
+
+
+async def run_fsck(
+    *,
+    repair: bool = False,
+    module_names: Iterable[str] | None = None,
+    include_index: bool = True,
+) -> Issues:
+    """Check the store and optionally Meilisearch; repair if requested."""
+    docs_by_id, issues = check_store(module_names)
+    if include_index:
+        from features.f2 import search_index
+
+        await search_index.init_meili()
+        await check_index(docs_by_id, issues)
+    for name in CHECKS:
+        if issues[name]:
+            files_logger.warning(
+                "fsck: %d %s, e.g. %s",
+                len(issues[name]),
+                name,
+                ", ".join(issues[name][:5]),
+            )
+    if not any(issues.values()):
+        files_logger.info("fsck: %d documents, no issues", len(docs_by_id))
+    if repair:
+        repair_store(docs_by_id, issues)
+        if include_index:
+            await repair_index(docs_by_id, issues)
+        if blob_store.MODULE_BLOB_STORE:
+            removed, freed = blob_store.collect_garbage()
+            files_logger.info(
+                "fsck: blob sweep removed %d blobs, freed %d bytes", removed, freed
+            )
+    return issues
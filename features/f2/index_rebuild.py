@@ -0,0 +1,365 @@
+"""Fill shadow indexes from the metadata store and swap them into place.
+
+``search_index.start_rebuild`` creates ``<uid>__next`` and from then on every
+write is mirrored into it. This module streams the metadata store into the
+shadow in id order, checkpointing progress in the rebuild state, and swaps
+the shadow in once the scan has caught up.
+
+``reshard`` fills the layout of a pending change of ``MEILISEARCH_SHARDS``
+the same way and then switches reads over to it.
+
+``restore_indexes`` is the recovery path for a lost Meilisearch volume: it
+refills both indexes from stored documents and ``chunks.json`` files in
+parallel, without rechunking, scanning the files tree or queueing modules.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import fcntl
+import os
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any
+
+import httpx
+from meilisearch_python_sdk.errors import MeilisearchError
+
+from shared.logging_config import files_logger
+
+from . import compression, metadata_store, search_index
+
+__all__ = [
+    "rebuild_in_background",
+    "rebuild_index",
+    "reshard",
+    "restore_indexes",
+    "restore_lease",
+]
+
+INDEX_REBUILD_BATCH_SIZE = int(os.environ.get("INDEX_REBUILD_BATCH_SIZE", "500"))
+INDEX_REBUILD_POLL_SECONDS = float(os.environ.get("INDEX_REBUILD_POLL_SECONDS", "60"))
+# failures the next poll may get past; anything else propagates
+RETRYABLE_ERRORS = (
+    MeilisearchError,
+    search_index.MeilisearchTaskError,
+    httpx.HTTPError,
+    OSError,
+    ValueError,
+)
+# store batches read and uploaded at once by ``restore_indexes``
+INDEX_RESTORE_CONCURRENCY = int(
+    os.environ.get("INDEX_RESTORE_CONCURRENCY", str(os.cpu_count() or 4))
+)
+
+
+def _progress(done: int, total: int, started: float) -> str:
+    rate = done / max(time.monotonic() - started, 1e-9)
+    eta = (total - done) / rate if rate else 0.0
+    return f"{done}/{total} documents ({rate:.0f}/s, eta {eta:.0f}s)"
+
+
+def _stored_ids(after: str = "") -> list[str]:
+    by_id = metadata_store.by_id_directory()
+    if not by_id.exists():
+        return []
+    return sorted(
+        entry.name
+        for entry in os.scandir(by_id)
+        if entry.is_dir() and entry.name > after
+    )
+
+
+def _read_docs(file_ids: list[str]) -> list[dict[str, Any]]:
+    docs = []
+    for file_id in file_ids:
+        doc = metadata_store.read_doc_json(file_id)
+        if doc is not None:
+            docs.append(doc)
+    return docs
+
+
+def _rechunk(doc: dict[str, Any]) -> list[dict[str, Any]]:
+    """Rebuild every module's chunks of ``doc`` with the current settings."""
+    from features.f5 import chunk_utils, chunking, near_duplicates
+
+    chunks: list[dict[str, Any]] = []
+    doc_dir = metadata_store.by_id_directory() / doc["id"]
+    for module_dir in sorted(Path(doc_dir).iterdir()):
+        content_path = module_dir / chunk_utils.CONTENT_FILENAME
+        if not module_dir.is_dir() or not compression.exists(content_path):
+            continue
+        module_chunks = chunking.build_chunk_docs_from_content(
+            compression.read_json(content_path),
+            doc["id"],
+            module_dir.name,
+            file_mtime=doc.get("mtime"),
+        )
+        chunk_utils.write_chunk_docs(module_dir, module_chunks)
+        near_duplicates.update(doc["id"], module_dir.name, module_chunks)
+        chunks.extend(module_chunks)
+    return chunks
+
+
+def _stored_chunks(doc: dict[str, Any]) -> list[dict[str, Any]]:
+    """Return every module's stored chunks of ``doc`` as they are."""
+    from features.f5 import chunk_utils
+
+    chunks: list[dict[str, Any]] = []
+    for module_dir in sorted((metadata_store.by_id_directory() / doc["id"]).iterdir()):
+        if module_dir.is_dir() and compression.exists(
+            module_dir / chunk_utils.CHUNK_FILENAME
+        ):
+            chunks.extend(chunk_utils.read_chunk_docs(module_dir))
+    return chunks
+
+
+def _shadow_docs(
+    uid: str, docs: list[dict[str, Any]], rechunk: bool = True
+) -> list[Any]:
+    if uid == search_index.MEILISEARCH_CHUNK_INDEX_NAME:
+        read = _rechunk if rechunk else _stored_chunks
+        return [chunk for doc in docs for chunk in read(doc)]
+    count = search_index.serving_shard_count()
+    return [
+        search_index.to_index_document(doc)
+        for doc in docs
+        if search_index.shard_uid(doc["id"], count) == uid
+    ]
+
+
+def _by_shard(docs: list[Any], count: int) -> dict[str, list[Any]]:
+    shards: dict[str, list[Any]] = {}
+    for doc in docs:
+        shards.setdefault(search_index.shard_uid(doc["id"], count), []).append(doc)
+    return shards
+
+
+@contextmanager
+def restore_lease() -> Iterator[bool]:
+    """Yield whether this process may fill the shadows of a restore.
+
+    ``restore_indexes`` holds the lease for its whole run, and the background
+    rebuild only finishes restore shadows while it can take it, so the two
+    never fill or swap the same shadow. The lease is an ``flock``; the kernel
+    releases it when its holder dies.
+    """
+    path = metadata_store.metadata_directory() / "index_restore.lock"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+        else:
+            yield True
+    finally:
+        os.close(fd)
+
+
+async def rebuild_index(uid: str, batch_size: int = INDEX_REBUILD_BATCH_SIZE) -> None:
+    """Stream every stored document into the shadow of ``uid`` and swap it in.
+
+    Resumes after the last checkpointed id, so a restart does not start over.
+    A shadow started by :func:`restore_indexes` is left alone while the
+    restore runs. Once it has died, the shadow is finished from stored
+    chunks, like the restore itself, instead of being rechunked.
+    """
+    state = search_index.load_rebuild_state().get(uid)
+    if state is None:
+        return
+    if state.get("owner", "rebuild") != "restore":
+        await _fill_shadow(uid, state, batch_size, rechunk=True)
+        return
+    with restore_lease() as held:
+        if held:
+            await _fill_shadow(uid, state, batch_size, rechunk=False)
+
+
+async def _fill_shadow(
+    uid: str, state: dict[str, Any], batch_size: int, rechunk: bool
+) -> None:
+    owner = state.get("owner", "rebuild")
+    shadow = search_index.shadow_uid(uid)
+    file_ids = _stored_ids(state["last_id"])
+    started = time.monotonic()
+    for i in range(0, len(file_ids), batch_size):
+        batch = file_ids[i : i + batch_size]
+        docs = await asyncio.to_thread(_read_docs, batch)
+        shadow_docs = await asyncio.to_thread(_shadow_docs, uid, docs, rechunk)
+        # waiting per batch keeps embedding from falling behind the scan
+        await search_index.wait_for_tasks(
+            await search_index.add_or_update_documents_in(shadow, shadow_docs)
+        )
+        current = search_index.load_rebuild_state()
+        if current.get(uid, {}).get("owner", "rebuild") != owner:
+            return
+        state = current[uid]
+        state["last_id"] = batch[-1]
+        state["scanned"] += len(batch)
+        search_index.save_rebuild_state(current)
+        files_logger.info(
+            "rebuild '%s': %s",
+            shadow,
+            _progress(i + len(batch), len(file_ids), started),
+        )
+    await search_index.swap_rebuild(uid, owner)
+
+
+async def reshard(batch_size: int = INDEX_REBUILD_BATCH_SIZE) -> None:
+    """Stream every stored document into the shards of a pending reshard.
+
+    Resumes after the last checkpointed id and switches reads over to the
+    new layout once the scan has caught up.
+    """
+    state = search_index.load_index_schema_state().get("reshard")
+    if state is None:
+        return
+    count = state["to"]
+    file_ids = _stored_ids(state["last_id"])
+    started = time.monotonic()
+    for i in range(0, len(file_ids), batch_size):
+        batch = file_ids[i : i + batch_size]
+        docs = await asyncio.to_thread(_read_docs, batch)
+        shards = _by_shard([search_index.to_index_document(d) for d in docs], count)
+        task_uids: list[int] = []
+        for uid, shard_docs in shards.items():
+            task_uids += await search_index.add_or_update_documents_in(uid, shard_docs)
+        await search_index.wait_for_tasks(task_uids)
+        if not search_index.save_reshard_progress(count, batch[-1], len(batch)):
+            return
+        files_logger.info(
+            "reshard to %d: %s",
+            count,
+            _progress(i + len(batch), len(file_ids), started),
+        )
+    await search_index.finish_reshard(count)
+
+
+async def rebuild_in_background(
+    poll_seconds: float = INDEX_REBUILD_POLL_SECONDS,
+) -> None:
+    """Finish rebuilds started by any process while search keeps serving."""
+    while True:
+        for uid in search_index.load_rebuild_state():
+            try:
+                await rebuild_index(uid)
+            except RETRYABLE_ERRORS:
+                files_logger.exception("rebuild of '%s' failed", uid)
+        try:
+            await reshard()
+        except RETRYABLE_ERRORS:
+            files_logger.exception("reshard failed")
+        await asyncio.sleep(poll_seconds)
+
+
+def _read_stored(
+    file_ids: list[str], with_chunks: bool = True
+) -> tuple[list[Any], list[dict[str, Any]]]:
+    """Return the index documents and stored chunks of ``file_ids``."""
+    docs: list[Any] = []
+    chunks: list[dict[str, Any]] = []
+    for doc in _read_docs(file_ids):
+        docs.append(search_index.to_index_document(doc))
+        if with_chunks:
+            chunks.extend(_stored_chunks(doc))
+    return docs, chunks
+
+
+async def restore_indexes(
+    batch_size: int = INDEX_REBUILD_BATCH_SIZE,
+    concurrency: int = INDEX_RESTORE_CONCURRENCY,
+) -> dict[str, int]:
+    """Refill the file and chunk indexes from the metadata store.
+
+    Raises ``RuntimeError`` while another process holds the
+    :func:`restore_lease`, i.e. another restore is running or the service is
+    finishing the shadows of an interrupted one. See :func:`_restore_indexes`.
+    """
+    with restore_lease() as held:
+        if not held:
+            raise RuntimeError(
+                "another process is filling the restore shadows; "
+                "retry once it has finished"
+            )
+        return await _restore_indexes(batch_size, concurrency)
+
+
+async def _restore_indexes(batch_size: int, concurrency: int) -> dict[str, int]:
+    """Refill the file and chunk indexes from the metadata store.
+
+    Both indexes are rebuilt into shadows that are swapped in together once
+    every upload is indexed, so search keeps serving until then. Batches are
+    read in threads and uploaded without waiting on each other. Indexes that
+    a background rebuild is already filling are left to it, since their
+    stored form may be outdated (e.g. chunks after a settings change).
+    Returns the number of documents and chunks sent.
+    """
+    count = search_index.serving_shard_count()
+    rebuilding = search_index.load_rebuild_state()
+    uids: list[str] = []
+    for uid in [
+        *search_index.shard_uids(count),
+        search_index.MEILISEARCH_CHUNK_INDEX_NAME,
+    ]:
+        if rebuilding.get(uid, {}).get("owner", "restore") != "restore":
+            files_logger.info("restore: '%s' is being rebuilt, skipping", uid)
+            continue
+        await search_index.start_rebuild(uid, owner="restore")
+        uids.append(uid)
+    restore_chunks = search_index.MEILISEARCH_CHUNK_INDEX_NAME in uids
+    chunks_shadow = search_index.shadow_uid(search_index.MEILISEARCH_CHUNK_INDEX_NAME)
+    file_ids = _stored_ids()
+    sent = {"documents": 0, "chunks": 0}
+    scanned = 0
+    task_uids: list[int] = []
+    semaphore = asyncio.Semaphore(concurrency)
+    started = time.monotonic()
+
+    async def restore_batch(batch: list[str]) -> None:
+        nonlocal scanned
+        async with semaphore:
+            docs, chunks = await asyncio.to_thread(_read_stored, batch, restore_chunks)
+            for uid, shard_docs in _by_shard(docs, count).items():
+                if uid not in uids:
+                    continue
+                task_uids.extend(
+                    await search_index.add_or_update_documents_in(
+                        search_index.shadow_uid(uid), shard_docs
+                    )
+                )
+                sent["documents"] += len(shard_docs)
+            if chunks:
+                task_uids.extend(
+                    await search_index.add_or_update_documents_in(chunks_shadow, chunks)
+                )
+        scanned += len(batch)
+        sent["chunks"] += len(chunks)
+        files_logger.info(
+            "restore: %s, %d chunks",
+            _progress(scanned, len(file_ids), started),
+            sent["chunks"],
+        )
+
+    await asyncio.gather(
+        *(
+            restore_batch(file_ids[i : i + batch_size])
+            for i in range(0, len(file_ids), batch_size)
+        )
+    )
+    files_logger.info("restore: waiting for %d meili tasks", len(task_uids))
+    await search_index.wait_for_tasks(task_uids)
+    state = search_index.load_rebuild_state()
+    for uid in uids:
+        if uid in state:
+            await search_index.swap_rebuild(uid, "restore")
+    files_logger.info(
+        "restore: %d documents and %d chunks in %.0fs",
+        sent["documents"],
+        sent["chunks"],
+        time.monotonic() - started,
+    )
+    return sent
@@ -0,0 +1,44 @@
+"""SQLite databases kept next to the metadata store.
+
+Each derived index (duplicate groups, path listings, ...) lives in its own
+``metadata/<name>.sqlite3`` file so it can be dropped and rebuilt on its own.
+Connections are short-lived and opened per call, which keeps them safe to use
+from sync's worker threads.
+"""
+
+from __future__ import annotations
+
+import sqlite3
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+from features.f2 import metadata_store
+
+__all__ = ["connect", "database_path"]
+
+
+def database_path(name: str) -> Path:
+    return metadata_store.metadata_directory() / f"{name}.sqlite3"
+
+
+@contextmanager
+def connect(name: str, schema: str) -> Iterator[sqlite3.Connection]:
+    """Yield a connection to ``name`` with ``schema`` applied.
+
+    The surrounding block runs in one transaction that commits on success
+    and rolls back on error.
+    """
+    path = database_path(name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    try:
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        # every statement is ``IF NOT EXISTS``, so this is cheap once created
+        conn.executescript(schema)
+        with conn:
+            yield conn
+    finally:
+        conn.close()
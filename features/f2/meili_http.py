@@ -0,0 +1,235 @@
+"""Pooled HTTP transport for the Meilisearch client.
+
+One ``httpx.AsyncClient`` per process keeps connections alive between calls.
+Its transport retries requests that Meilisearch did not accept, with
+exponential backoff and full jitter, and counts requests, bytes and latency
+per endpoint so the cost of a sync or a module job can be logged.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import random
+import re
+import time
+from collections.abc import Mapping
+from typing import Any
+
+import httpx
+
+from shared.logging_config import files_logger
+
+__all__ = [
+    "format_stats",
+    "install",
+    "make_http_client",
+    "snapshot",
+    "stats_since",
+]
+
+MEILISEARCH_TIMEOUT_SECONDS = float(os.environ.get("MEILISEARCH_TIMEOUT_SECONDS", "30"))
+MEILISEARCH_MAX_CONNECTIONS = int(os.environ.get("MEILISEARCH_MAX_CONNECTIONS", "16"))
+MEILISEARCH_MAX_KEEPALIVE = int(os.environ.get("MEILISEARCH_MAX_KEEPALIVE", "8"))
+MEILISEARCH_KEEPALIVE_SECONDS = float(
+    os.environ.get("MEILISEARCH_KEEPALIVE_SECONDS", "60")
+)
+MEILISEARCH_RETRIES = int(os.environ.get("MEILISEARCH_RETRIES", "5"))
+MEILISEARCH_RETRY_BACKOFF_SECONDS = float(
+    os.environ.get("MEILISEARCH_RETRY_BACKOFF_SECONDS", "0.2")
+)
+MEILISEARCH_RETRY_MAX_SECONDS = float(
+    os.environ.get("MEILISEARCH_RETRY_MAX_SECONDS", "10")
+)
+
+# statuses meaning the request was not processed and is safe to resend
+RETRY_ANY_METHOD = {429, 503}
+RETRY_IDEMPOTENT = {502, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+# per endpoint: requests, retries, errors, sent/received bytes, seconds
+_stats: dict[str, dict[str, float]] = {}
+
+_PATH_PARAMS = [
+    (re.compile(r"^/indexes/[^/]+"), "/indexes/{uid}"),
+    (re.compile(r"^(/indexes/\{uid\}/documents)/[^/]+$"), r"\1/{id}"),
+    (re.compile(r"^/tasks/\d+"), "/tasks/{uid}"),
+]
+
+
+def endpoint(method: str, path: str) -> str:
+    """Return ``method`` and ``path`` with index uids and ids templated."""
+    for pattern, replacement in _PATH_PARAMS:
+        path = pattern.sub(replacement, path)
+    return f"{method} {path}"
+
+
+def _record(name: str, **values: float) -> None:
+    entry = _stats.setdefault(
+        name,
+        {
+            "requests": 0,
+            "retries": 0,
+            "errors": 0,
+            "sent_bytes": 0,
+            "received_bytes": 0,
+            "seconds": 0.0,
+        },
+    )
+    for key, value in values.items():
+        entry[key] += value
+
+
+def snapshot() -> dict[str, dict[str, float]]:
+    """Return a copy of the counters of this process."""
+    return {name: dict(values) for name, values in _stats.items()}
+
+
+def stats_since(before: Mapping[str, Mapping[str, float]]) -> dict[str, Any]:
+    """Return the counters accumulated since ``before`` was taken."""
+    delta: dict[str, Any] = {}
+    for name, values in _stats.items():
+        old = before.get(name, {})
+        diff = {key: value - old.get(key, 0) for key, value in values.items()}
+        if diff["requests"]:
+            delta[name] = diff
+    return delta
+
+
+def format_stats(stats: Mapping[str, Mapping[str, float]]) -> str:
+    total = sum(int(v["requests"]) for v in stats.values())
+    parts = [
+        f"{name} x{int(v['requests'])} "
+        f"{int(v['sent_bytes'])}B/{int(v['received_bytes'])}B "
+        f"{v['seconds']:.2f}s"
+        for name, v in sorted(stats.items(), key=lambda kv: -kv[1]["requests"])
+    ]
+    return f"{total} requests" + (f": {'; '.join(parts)}" if parts else "")
+
+
+def _backoff(attempt: int) -> float:
+    cap = min(
+        MEILISEARCH_RETRY_MAX_SECONDS, MEILISEARCH_RETRY_BACKOFF_SECONDS * 2**attempt
+    )
+    return random.uniform(0, cap)
+
+
+class RetryTransport(httpx.AsyncBaseTransport):  # type: ignore[misc]
+    """Count every request and resend those Meilisearch did not accept."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport) -> None:
+        self._transport = transport
+
+    def _should_retry(self, request: httpx.Request, status: int) -> bool:
+        if status in RETRY_ANY_METHOD:
+            return True
+        return status in RETRY_IDEMPOTENT and request.method in IDEMPOTENT_METHODS
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        name = endpoint(request.method, request.url.path)
+        sent = int(request.headers.get("content-length", 0))
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            try:
+                response = await self._transport.handle_async_request(request)
+                await response.aread()
+            except (httpx.TransportError, httpx.TimeoutException) as exc:
+                _record(
+                    name,
+                    requests=1,
+                    errors=1,
+                    sent_bytes=sent,
+                    seconds=time.monotonic() - started,
+                )
+                unsent = isinstance(
+                    exc, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+                )
+                if attempt >= MEILISEARCH_RETRIES or not (
+                    unsent or request.method in IDEMPOTENT_METHODS
+                ):
+                    raise
+            else:
+                _record(
+                    name,
+                    requests=1,
+                    sent_bytes=sent,
+                    received_bytes=len(response.content),
+                    seconds=time.monotonic() - started,
+                )
+                if attempt >= MEILISEARCH_RETRIES or not self._should_retry(
+                    request, response.status_code
+                ):
+                    return response
+                await response.aclose()
+            _record(name, retries=1)
+            delay = _backoff(attempt)
+            attempt += 1
+            files_logger.debug("meili retry %s in %.2fs", name, delay)
+            await asyncio.sleep(delay)
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+def make_http_client(
+    base_url: str, headers: Mapping[str, str] | None = None
+) -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=MEILISEARCH_MAX_CONNECTIONS,
+        max_keepalive_connections=MEILISEARCH_MAX_KEEPALIVE,
+        keepalive_expiry=MEILISEARCH_KEEPALIVE_SECONDS,
+    )
+    return httpx.AsyncClient(
+        base_url=base_url,
+        headers=dict(headers or {}),
+        timeout=MEILISEARCH_TIMEOUT_SECONDS,
+        transport=RetryTransport(httpx.AsyncHTTPTransport(limits=limits)),
+    )
+
+
+_closing: set[asyncio.Task[None]] = set()
+
+
+def _close_replaced(http_client: httpx.AsyncClient) -> None:
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        asyncio.run(http_client.aclose())
+        return
+    task = loop.create_task(http_client.aclose())
+    _closing.add(task)
+    task.add_done_callback(_closing.discard)
+
+
+def install(sdk_client: Any, base_url: str) -> None:
+    """Route ``sdk_client`` through a pooled, retrying, counting client.
+
+    The SDK builds its own ``httpx.AsyncClient`` and has no transport hook,
+    so its client and the request helper bound to it are replaced and the
+    SDK's client is closed. This relies on the private layout of
+    ``meilisearch-python-sdk`` 4.x; a release that changes it raises here
+    instead of silently bypassing the pool.
+    """
+    old = getattr(sdk_client, "http_client", None)
+    if not isinstance(old, httpx.AsyncClient):
+        files_logger.warning("meili client has no httpx client; pooling disabled")
+        return
+    from meilisearch_python_sdk._http_requests import AsyncHttpRequests
+
+    requests = getattr(sdk_client, "_http_requests", None)
+    if (
+        not isinstance(requests, AsyncHttpRequests)
+        or requests.http_client is not old
+        or not hasattr(sdk_client, "json_handler")
+    ):
+        raise RuntimeError(
+            "meilisearch_python_sdk.AsyncClient no longer keeps its httpx client "
+            "in http_client/_http_requests; update meili_http.install"
+        )
+    http_client = make_http_client(base_url, old.headers)
+    sdk_client.http_client = http_client
+    sdk_client._http_requests = AsyncHttpRequests(
+        http_client, json_handler=sdk_client.json_handler
+    )
+    _close_replaced(old)
@@ -2,10 +2,16 @@
 
 from __future__ import annotations
 
+import fcntl
 import json
 import os
+import shutil
+from collections.abc import Iterator
+from contextlib import contextmanager
 from pathlib import Path
-from typing import MutableMapping, Any
+from typing import MutableMapping, Any, cast
+
+from features.f2 import doc_cache
 
 
 def _add_paths_list(doc: MutableMapping[str, Any]) -> None:
@@ -30,10 +36,56 @@ def ensure_directories() -> None:
         path.mkdir(parents=True, exist_ok=True)
 
 
+@contextmanager
+def doc_lock(file_id: str) -> Iterator[None]:
+    """Hold an exclusive lock on the stored document of ``file_id``.
+
+    The lock is a ``flock`` on the document's directory, so it is shared by
+    every process and creates no lock files.
+    """
+    fd = os.open(by_id_directory() / file_id, os.O_RDONLY)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)
+
+
 def write_doc_json(doc: MutableMapping[str, Any]) -> None:
     """Write ``doc`` as JSON under ``BY_ID_DIRECTORY``."""
     ensure_directories()
     target_dir = by_id_directory() / str(doc["id"])
     target_dir.mkdir(parents=True, exist_ok=True)
-    with (target_dir / "document.json").open("w") as f:
-        json.dump(doc, f, indent=4, separators=(", ", ": "))
+    with doc_lock(str(doc["id"])):
+        with (target_dir / "document.json").open("w") as f:
+            json.dump(doc, f, indent=4, separators=(", ", ": "))
+        doc_cache.put_doc(dict(doc))
+
+
+def read_doc_json(file_id: str) -> dict[str, Any] | None:
+    """Return the stored document for ``file_id`` or ``None`` if missing.
+
+    Reads go through :mod:`features.f2.doc_cache` so repeated lookups of the
+    same document do not reopen and reparse ``document.json``. Pending schema
+    migrations are applied in memory; persisting them is left to
+    ``migrations.migrate_in_background``.
+    """
+    from features.f2 import migrations
+
+    doc = doc_cache.get_doc(file_id)
+    if doc is not None:
+        return doc
+    try:
+        with (by_id_directory() / file_id / "document.json").open("r") as f:
+            doc = cast(dict[str, Any], json.load(f))
+    except FileNotFoundError:
+        return None
+    migrations.migrate_doc(doc)
+    doc_cache.put_doc(doc)
+    return doc
+
+
+def remove_doc(file_id: str) -> None:
+    """Delete all metadata stored for ``file_id``."""
+    doc_cache.docs_by_id.pop(file_id)
+    shutil.rmtree(by_id_directory() / file_id, ignore_errors=True)
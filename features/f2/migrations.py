@@ -1,8 +1,14 @@
 from __future__ import annotations
 
-from typing import MutableMapping, Any
+import asyncio
+import json
+import os
+from pathlib import Path
+from typing import MutableMapping, Any, cast
 
-from . import metadata_store
+from shared.logging_config import files_logger
+
+from . import doc_cache, metadata_store
 
 # List of migration functions to upgrade stored metadata documents.
 MIGRATIONS = [metadata_store._add_paths_list]
@@ -10,6 +16,9 @@ MIGRATIONS = [metadata_store._add_paths_list]
 # Schema version corresponding to the last migration in ``MIGRATIONS``.
 CURRENT_VERSION = len(MIGRATIONS)
 
+MIGRATION_BATCH_SIZE = int(os.environ.get("MIGRATION_BATCH_SIZE", "500"))
+MIGRATION_SLEEP_SECONDS = float(os.environ.get("MIGRATION_SLEEP_SECONDS", "1"))
+
 
 def migrate_doc(doc: MutableMapping[str, Any]) -> bool:
     """Apply pending migrations to ``doc`` in-place."""
@@ -20,3 +29,120 @@ def migrate_doc(doc: MutableMapping[str, Any]) -> bool:
         migrated = True
         version = doc.get("version", version + 1)
     return migrated
+
+
+# --- background migrator ----------------------------------------------------
+#
+# Documents are migrated in memory whenever they are read. Persisting those
+# rewrites is left to ``migrate_in_background`` which walks ``by-id`` in id
+# order, in throttled batches, and checkpoints its position so a restart
+# resumes where it stopped.
+
+
+def migration_state_path() -> Path:
+    return metadata_store.metadata_directory() / "migration_state.json"
+
+
+def load_migration_state() -> dict[str, Any]:
+    """Return the saved migrator checkpoint for ``CURRENT_VERSION``."""
+    path = migration_state_path()
+    state: dict[str, Any] = {}
+    if path.exists():
+        try:
+            with path.open("r") as f:
+                state = cast(dict[str, Any], json.load(f))
+        except (OSError, ValueError):
+            state = {}
+    if state.get("version") != CURRENT_VERSION:
+        state = {
+            "version": CURRENT_VERSION,
+            "last_id": "",
+            "scanned": 0,
+            "migrated": 0,
+            "complete": False,
+        }
+    return state
+
+
+def save_migration_state(state: MutableMapping[str, Any]) -> None:
+    path = migration_state_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with tmp.open("w") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+def migrate_stored_doc(file_id: str) -> bool:
+    """Persist pending migrations for ``file_id``; return ``True`` if rewritten.
+
+    The read, migration and swap happen under the document's lock, so a
+    concurrent ``write_doc_json`` lands either before the read or after the
+    swap and is never overwritten by the older migrated copy.
+    """
+    doc_path = metadata_store.by_id_directory() / file_id / "document.json"
+    try:
+        with metadata_store.doc_lock(file_id):
+            try:
+                with doc_path.open("r") as f:
+                    doc = json.load(f)
+            except (OSError, ValueError):
+                return False
+            if not migrate_doc(doc):
+                return False
+            # readers take no lock, so swap in a complete file
+            tmp = doc_path.with_name(f".document.json.{os.getpid()}.migrating")
+            with tmp.open("w") as f:
+                json.dump(doc, f, indent=4, separators=(", ", ": "))
+            os.replace(tmp, doc_path)
+            doc_cache.put_doc(doc)
+            return True
+    except FileNotFoundError:
+        # the document was deleted
+        return False
+
+
+def migrate_batch(file_ids: list[str]) -> int:
+    return sum(1 for file_id in file_ids if migrate_stored_doc(file_id))
+
+
+async def migrate_in_background(
+    batch_size: int = MIGRATION_BATCH_SIZE,
+    sleep_seconds: float = MIGRATION_SLEEP_SECONDS,
+) -> None:
+    """Persist migrated documents without blocking sync or indexing."""
+    state = load_migration_state()
+    if state.get("complete"):
+        return
+    by_id = metadata_store.by_id_directory()
+    if not by_id.exists():
+        return
+    file_ids = sorted(
+        entry.name
+        for entry in os.scandir(by_id)
+        if entry.is_dir() and entry.name > state["last_id"]
+    )
+    total = state["scanned"] + len(file_ids)
+    if file_ids:
+        files_logger.info(
+            "background migration to v%d: %d/%d documents scanned",
+            CURRENT_VERSION,
+            state["scanned"],
+            total,
+        )
+    for i in range(0, len(file_ids), batch_size):
+        batch = file_ids[i : i + batch_size]
+        state["migrated"] += await asyncio.to_thread(migrate_batch, batch)
+        state["scanned"] += len(batch)
+        state["last_id"] = batch[-1]
+        save_migration_state(state)
+        files_logger.info(
+            "background migration to v%d: %d/%d scanned, %d rewritten",
+            CURRENT_VERSION,
+            state["scanned"],
+            total,
+            state["migrated"],
+        )
+        await asyncio.sleep(sleep_seconds)
+    state["complete"] = True
+    save_migration_state(state)
@@ -0,0 +1,426 @@
+"""Sorted index of every relpath for directory listings and subtree totals.
+
+Rows are clustered by path, so a directory's subtree is one contiguous key
+range: ``Photos/2019/`` up to ``Photos/20190`` (``0`` is the character after
+``/``). Sync, the file API and finished module jobs keep the index current by
+passing the documents they upsert or remove, like
+:mod:`features.f2.duplicate_groups`.
+
+Every directory also carries rollups of its subtree: files, bytes, unique
+bytes, files per MIME type and files waiting for each module. Each change
+applies the difference between a document's old and new rows to the
+rollups of its ancestors, so reading them is a key lookup. Unique bytes
+count each id once per directory through a per-directory reference count.
+"""
+
+from __future__ import annotations
+
+import sqlite3
+from collections import defaultdict
+from collections.abc import Iterable, Mapping, Sequence
+from typing import Any
+
+from features.f2 import local_db
+
+__all__ = [
+    "is_built",
+    "list_directory",
+    "list_files",
+    "rebuild",
+    "remove",
+    "subdirectories",
+    "summary",
+    "update",
+]
+
+DB_NAME = "path_index"
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS paths (
+    path TEXT PRIMARY KEY,
+    id TEXT NOT NULL,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    next TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS paths_by_id ON paths (id);
+CREATE TABLE IF NOT EXISTS directories (
+    dir TEXT PRIMARY KEY,
+    parent TEXT,
+    files INTEGER NOT NULL,
+    bytes INTEGER NOT NULL,
+    unique_bytes INTEGER NOT NULL,
+    pending INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS directories_by_parent ON directories (parent);
+-- files per MIME type (kind 'type') or per pending module (kind 'next')
+CREATE TABLE IF NOT EXISTS directory_counts (
+    dir TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    files INTEGER NOT NULL,
+    PRIMARY KEY (dir, kind, name)
+) WITHOUT ROWID;
+-- paths of ``id`` under ``dir``; its bytes are unique there while refs > 0
+CREATE TABLE IF NOT EXISTS directory_ids (
+    dir TEXT NOT NULL,
+    id TEXT NOT NULL,
+    refs INTEGER NOT NULL,
+    PRIMARY KEY (dir, id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS path_index_state (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+# sorts after any relpath, bounding the range of the root directory
+_END = "\U0010ffff"
+
+
+def _prefix(directory: str) -> str:
+    directory = directory.strip("/")
+    return f"{directory}/" if directory else ""
+
+
+def _range(directory: str) -> tuple[str, str]:
+    prefix = _prefix(directory)
+    return prefix, f"{prefix[:-1]}0" if prefix else _END
+
+
+Row = tuple[str, str, float, int, str, str]
+ROLLUP_ORDERS = ("files", "bytes", "unique_bytes", "pending")
+
+
+def _rows(docs: Iterable[Mapping[str, Any]]) -> list[Row]:
+    return [
+        (
+            path,
+            doc["id"],
+            mtime,
+            int(doc.get("size", 0)),
+            doc.get("type", ""),
+            doc.get("next", ""),
+        )
+        for doc in docs
+        for path, mtime in doc.get("paths", {}).items()
+    ]
+
+
+def _ancestors(path: str) -> list[str]:
+    """Return ``""`` and every directory above ``path``, outermost first."""
+    parts = path.split("/")[:-1]
+    return [""] + ["/".join(parts[: i + 1]) for i in range(len(parts))]
+
+
+def _parent(directory: str) -> str | None:
+    if not directory:
+        return None
+    return directory.rsplit("/", 1)[0] if "/" in directory else ""
+
+
+def _apply_rollups(
+    conn: sqlite3.Connection, removed: Sequence[Row], added: Sequence[Row]
+) -> None:
+    """Add the rollup difference between ``removed`` and ``added`` rows."""
+    totals: dict[str, list[int]] = defaultdict(lambda: [0, 0, 0, 0])
+    counts: dict[tuple[str, str, str], int] = defaultdict(int)
+    refs: dict[tuple[str, str], list[int]] = {}
+    for sign, rows in ((-1, removed), (1, added)):
+        for path, file_id, _, size, mime, next_name in rows:
+            for directory in _ancestors(path):
+                total = totals[directory]
+                total[0] += sign
+                total[1] += sign * size
+                counts[(directory, "type", mime)] += sign
+                if next_name:
+                    total[3] += sign
+                    counts[(directory, "next", next_name)] += sign
+                refs.setdefault((directory, file_id), [0, size])[0] += sign
+    ref_rows = []
+    for (directory, file_id), (delta, size) in refs.items():
+        if not delta:
+            continue
+        row = conn.execute(
+            "SELECT refs FROM directory_ids WHERE dir = ? AND id = ?",
+            (directory, file_id),
+        ).fetchone()
+        old = row[0] if row else 0
+        new = old + delta
+        ref_rows.append((directory, file_id, new))
+        if old <= 0 < new:
+            totals[directory][2] += size
+        elif new <= 0 < old:
+            totals[directory][2] -= size
+    conn.executemany(
+        "INSERT INTO directory_ids (dir, id, refs) VALUES (?, ?, ?) "
+        "ON CONFLICT(dir, id) DO UPDATE SET refs = excluded.refs",
+        [r for r in ref_rows if r[2] > 0],
+    )
+    conn.executemany(
+        "DELETE FROM directory_ids WHERE dir = ? AND id = ?",
+        [r[:2] for r in ref_rows if r[2] <= 0],
+    )
+    changed = {d: t for d, t in totals.items() if any(t)}
+    conn.executemany(
+        "INSERT INTO directories "
+        "(dir, parent, files, bytes, unique_bytes, pending) "
+        "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(dir) DO UPDATE SET "
+        "files = files + excluded.files, bytes = bytes + excluded.bytes, "
+        "unique_bytes = unique_bytes + excluded.unique_bytes, "
+        "pending = pending + excluded.pending",
+        [(d, _parent(d), *t) for d, t in changed.items()],
+    )
+    conn.executemany(
+        "DELETE FROM directories WHERE dir = ? AND files <= 0",
+        [(d,) for d in changed],
+    )
+    changed_counts = [(*k, n) for k, n in counts.items() if n]
+    conn.executemany(
+        "INSERT INTO directory_counts (dir, kind, name, files) "
+        "VALUES (?, ?, ?, ?) ON CONFLICT(dir, kind, name) DO UPDATE SET "
+        "files = files + excluded.files",
+        changed_counts,
+    )
+    conn.executemany(
+        "DELETE FROM directory_counts "
+        "WHERE dir = ? AND kind = ? AND name = ? AND files <= 0",
+        [c[:3] for c in changed_counts],
+    )
+
+
+def _fetch(conn: sqlite3.Connection, sql: str, keys: Iterable[str]) -> list[Row]:
+    rows: list[Row] = []
+    for key in keys:
+        rows.extend(tuple(r) for r in conn.execute(sql, (key,)))
+    return rows
+
+
+_COLUMNS = "path, id, mtime, size, type, next"
+
+
+def _upsert(conn: sqlite3.Connection, docs: Iterable[Mapping[str, Any]]) -> None:
+    docs = list(docs)
+    added = _rows(docs)
+    # a path whose bytes changed moves from its old id to the new one
+    old = {
+        row[0]: row
+        for row in _fetch(
+            conn,
+            f"SELECT {_COLUMNS} FROM paths WHERE id = ?",
+            {d["id"] for d in docs},
+        )
+        + _fetch(
+            conn, f"SELECT {_COLUMNS} FROM paths WHERE path = ?", {r[0] for r in added}
+        )
+    }
+    removed = list(old.values())
+    conn.executemany("DELETE FROM paths WHERE path = ?", [(p,) for p in old])
+    conn.executemany(f"INSERT INTO paths ({_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?)", added)
+    _apply_rollups(conn, removed, added)
+
+
+def is_built() -> bool:
+    """Return ``True`` once :func:`rebuild` has populated the index."""
+    with local_db.connect(DB_NAME, SCHEMA) as conn:
+        row = conn.execute(
+            "SELECT value FROM path_index_state WHERE key = 'built'"
+        ).fetchone()
+    return row is not None
+
+
+# every (directory, path id) pair: the root, then one level deeper per step
+_ANCESTOR_REFS = """
+WITH RECURSIVE ancestors(dir, rest, id) AS (
+    SELECT '', path, id FROM paths
+    UNION ALL
+    SELECT
+        dir || (CASE WHEN dir = '' THEN '' ELSE '/' END)
+            || substr(rest, 1, instr(rest, '/') - 1),
+        substr(rest, instr(rest, '/') + 1),
+        id
+    FROM ancestors WHERE instr(rest, '/') > 0
+)
+INSERT INTO directory_ids (dir, id, refs)
+SELECT dir, id, count(*) FROM ancestors GROUP BY dir, id
+"""
+# the paths of one id share its document's size, type and next
+_IDS = """
+WITH ids AS (
+    SELECT id, max(size) AS size, max(type) AS type, max(next) AS next
+    FROM paths GROUP BY id
+)
+"""
+
+
+def _rebuild_rollups(conn: sqlite3.Connection) -> None:
+    """Compute every rollup from ``paths`` inside SQLite."""
+    conn.create_function("parent_dir", 1, _parent, deterministic=True)
+    conn.execute(_ANCESTOR_REFS)
+    conn.execute(
+        _IDS + "INSERT INTO directories "
+        "(dir, parent, files, bytes, unique_bytes, pending) "
+        "SELECT d.dir, parent_dir(d.dir), sum(d.refs), sum(d.refs * ids.size), "
+        "sum(ids.size), sum(CASE WHEN ids.next != '' THEN d.refs ELSE 0 END) "
+        "FROM directory_ids d JOIN ids USING (id) GROUP BY d.dir"
+    )
+    conn.execute(
+        _IDS + "INSERT INTO directory_counts (dir, kind, name, files) "
+        "SELECT d.dir, 'type', ids.type, sum(d.refs) "
+        "FROM directory_ids d JOIN ids USING (id) GROUP BY d.dir, ids.type"
+    )
+    conn.execute(
+        _IDS + "INSERT INTO directory_counts (dir, kind, name, files) "
+        "SELECT d.dir, 'next', ids.next, sum(d.refs) "
+        "FROM directory_ids d JOIN ids USING (id) WHERE ids.next != '' "
+        "GROUP BY d.dir, ids.next"
+    )
+
+
+def rebuild(docs: Iterable[Mapping[str, Any]]) -> None:
+    """Replace the index with the paths of ``docs``.
+
+    Rows are streamed into ``paths`` and the rollups are aggregated by
+    SQLite, so memory does not grow with the number of files or their depth.
+    """
+    with local_db.connect(DB_NAME, SCHEMA) as conn:
+        for table in ("paths", "directories", "directory_counts", "directory_ids"):
+            conn.execute(f"DELETE FROM {table}")
+        # a path listed twice keeps its last document
+        conn.executemany(
+            f"INSERT OR REPLACE INTO paths ({_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?)",
+            (row for doc in docs for row in _rows([doc])),
+        )
+        _rebuild_rollups(conn)
+        conn.execute("INSERT OR REPLACE INTO path_index_state VALUES ('built', '1')")
+
+
+def update(docs: Iterable[Mapping[str, Any]]) -> None:
+    """Record the current ``paths`` of ``docs``."""
+    with local_db.connect(DB_NAME, SCHEMA) as conn:
+        _upsert(conn, docs)
+
+
+def remove(file_ids: Iterable[str]) -> None:
+    """Drop the paths of deleted ``file_ids``."""
+    with local_db.connect(DB_NAME, SCHEMA) as conn:
+        removed = _fetch(conn, f"SELECT {_COLUMNS} FROM paths WHERE id = ?", file_ids)
+        conn.executemany("DELETE FROM paths WHERE path = ?", [(r[0],) for r in removed])
+        _apply_rollups(conn, removed, [])
+
+
+def _file(row: sqlite3.Row, name: str) -> dict[str, Any]:
+    return {"kind": "file", "name": name, **dict(row)}
+
+
+def list_directory(
+    directory: str = "", limit: int = 1000, after: str = ""
+) -> dict[str, Any]:
+    """Return the files and subdirectories directly inside ``directory``.
+
+    Entries come in path order, a subdirectory ``x`` sorting as ``x/``. Each
+    subdirectory costs one index seek past its subtree, never a scan of it.
+    ``next`` is the ``after`` value for the following page, or ``None``.
+    """
+    prefix, upper = _range(directory)
+    if after.endswith("/"):
+        op, low = ">=", f"{prefix}{after[:-1]}0"
+    elif after:
+        op, low = ">", f"{prefix}{after}"
+    else:
+        op, low = ">=", prefix
+    entries: list[dict[str, Any]] = []
+    with local_db.connect(DB_NAME, SCHEMA) as conn:
+        while len(entries) < limit:
+            wanted = limit - len(entries)
+            rows = conn.execute(
+                f"SELECT * FROM paths WHERE path {op} ? AND path < ? "
+                "ORDER BY path LIMIT ?",
+                (low, upper, wanted),
+            ).fetchall()
+            jumped = False
+            for row in rows:
+                name, sep, _ = row["path"][len(prefix) :].partition("/")
+                if sep:
+                    entries.append(
+                        {"kind": "directory", "name": name, "path": prefix + name}
+                    )
+                    op, low = ">=", f"{prefix}{name}0"
+                    jumped = True
+                    break
+                entries.append(_file(row, name))
+                op, low = ">", row["path"]
+            if not jumped and len(rows) < wanted:
+                break
+        for entry in entries:
+            if entry["kind"] == "directory":
+                entry.update(_rollup(conn, entry["path"]))
+        more = (
+            len(entries) == limit
+            and conn.execute(
+                f"SELECT 1 FROM paths WHERE path {op} ? AND path < ? LIMIT 1",
+                (low, upper),
+            ).fetchone()
+            is not None
+        )
+    cursor = None
+    if more:
+        last = entries[-1]
+        cursor = last["name"] + ("/" if last["kind"] == "directory" else "")
+    return {"results": entries, "next": cursor}
+
+
+def list_files(
+    directory: str = "", limit: int = 1000, after: str = ""
+) -> list[dict[str, Any]]:
+    """Return files anywhere under ``directory`` in path order after ``after``."""
+    prefix, upper = _range(directory)
+    with local_db.connect(DB_NAME, SCHEMA) as conn:
+        rows = conn.execute(
+            "SELECT * FROM paths WHERE path > ? AND path >= ? AND path < ? "
+            "ORDER BY path LIMIT ?",
+            (after, prefix, upper, limit),
+        ).fetchall()
+    return [_file(row, row["path"].rsplit("/", 1)[-1]) for row in rows]
+
+
+def _rollup(conn: sqlite3.Connection, directory: str) -> dict[str, int]:
+    row = conn.execute(
+        "SELECT files, bytes, unique_bytes, pending FROM directories WHERE dir = ?",
+        (directory,),
+    ).fetchone()
+    return dict(zip(ROLLUP_ORDERS, row if row else (0, 0, 0, 0)))
+
+
+def summary(directory: str = "") -> dict[str, Any]:
+    """Return the rollups of everything under ``directory``.
+
+    ``types`` counts files per MIME type and ``pending_modules`` counts files
+    per module they wait for.
+    """
+    directory = directory.strip("/")
+    with local_db.connect(DB_NAME, SCHEMA) as conn:
+        result: dict[str, Any] = _rollup(conn, directory)
+        result["types"] = {}
+        result["pending_modules"] = {}
+        for kind, name, files in conn.execute(
+            "SELECT kind, name, files FROM directory_counts WHERE dir = ?",
+            (directory,),
+        ):
+            result["types" if kind == "type" else "pending_modules"][name] = files
+    return result
+
+
+def subdirectories(
+    directory: str = "", order: str = "bytes", limit: int = 100
+) -> list[dict[str, Any]]:
+    """Return the rollups of the subdirectories of ``directory``, largest first."""
+    if order not in ROLLUP_ORDERS:
+        raise ValueError(f"order must be one of {', '.join(ROLLUP_ORDERS)}")
+    with local_db.connect(DB_NAME, SCHEMA) as conn:
+        rows = conn.execute(
+            "SELECT dir AS path, files, bytes, unique_bytes, pending "
+            f"FROM directories WHERE parent = ? ORDER BY {order} DESC, dir LIMIT ?",
+            (directory.strip("/"), limit),
+        ).fetchall()
+    return [dict(row) for row in rows]
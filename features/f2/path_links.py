@@ -3,9 +3,10 @@
 from __future__ import annotations
 
 import os
+from collections.abc import Iterable
 from pathlib import Path
 
-from features.f2 import metadata_store
+from features.f2 import doc_cache, metadata_store
 
 
 def by_path_directory() -> Path:
@@ -23,24 +24,83 @@ def ensure_directories() -> None:
     by_path_directory().mkdir(parents=True, exist_ok=True)
 
 
-def link_path(relpath: str, file_id: str) -> None:
-    """Create or update the symlink for ``relpath``."""
-    ensure_directories()
+def link_path(relpath: str, file_id: str) -> bool:
+    """Create or update the symlink for ``relpath``.
+
+    Returns ``False`` without touching the filesystem beyond a single
+    ``readlink`` when the link already points at ``file_id``.
+    """
     target = metadata_store.by_id_directory() / file_id
     link = by_path_directory() / relpath
-    link.parent.mkdir(parents=True, exist_ok=True)
+    relative_target = os.path.relpath(target, link.parent)
+    try:
+        if os.readlink(link) == relative_target:
+            doc_cache.ids_by_path.put(relpath, file_id)
+            return False
+    except FileNotFoundError:
+        link.parent.mkdir(parents=True, exist_ok=True)
+    except OSError:
+        # exists but is not a symlink
+        pass
     if link.is_symlink():
         link.unlink()
-    relative_target = os.path.relpath(target, link.parent)
     link.symlink_to(relative_target, target_is_directory=True)
+    doc_cache.ids_by_path.put(relpath, file_id)
+    return True
+
+
+def resolve_id(relpath: str) -> str | None:
+    """Return the file ID linked from ``relpath`` or ``None``."""
+    file_id = doc_cache.ids_by_path.get(relpath)
+    if file_id is not None:
+        return file_id
+    try:
+        file_id = Path(os.readlink(by_path_directory() / relpath)).name
+    except OSError:
+        return None
+    doc_cache.ids_by_path.put(relpath, file_id)
+    return file_id
 
 
-def unlink_path(relpath: str) -> None:
-    """Remove the symlink for ``relpath`` and clean up empty directories."""
+def unlink_path(relpath: str, *, prune: bool = True) -> Path:
+    """Remove the symlink for ``relpath`` and return its parent directory.
+
+    Empty parent directories are removed immediately unless ``prune`` is
+    ``False``, in which case callers should collect the returned parents and
+    pass them to :func:`prune_empty_directories` once.
+    """
     link = by_path_directory() / relpath
+    doc_cache.ids_by_path.pop(relpath)
     if link.is_symlink():
         link.unlink()
-    parent = link.parent
-    if parent != by_path_directory() and parent.exists():
-        if not any(parent.iterdir()):
-            parent.rmdir()
+    if prune:
+        prune_empty_directories([link.parent])
+    return link.parent
+
+
+def prune_empty_directories(directories: Iterable[Path]) -> int:
+    """Remove empty ``directories`` and their empty ancestors in one pass.
+
+    Directories are visited deepest first so a parent is only attempted after
+    all of its collected children. Returns the number of directories removed.
+    """
+    root = by_path_directory()
+    pending = {d for d in directories if d != root and root in d.parents}
+    removed = 0
+    attempted: set[Path] = set()
+    while pending:
+        deepest = max(len(d.parts) for d in pending)
+        level = [d for d in pending if len(d.parts) == deepest]
+        pending.difference_update(level)
+        for directory in level:
+            attempted.add(directory)
+            try:
+                directory.rmdir()
+            except OSError:
+                # not empty or already gone
+                continue
+            removed += 1
+            parent = directory.parent
+            if parent != root and parent not in attempted:
+                pending.add(parent)
+    return removed
@@ -1,78 +1,604 @@
 from __future__ import annotations
 
 import asyncio
+import copy
+import json
 import os
+import time
+import zlib
+from collections.abc import AsyncIterator, Iterable, Iterator, Mapping
 from itertools import chain
-from typing import Any, Iterable, Mapping, cast
+from pathlib import Path
+from typing import Any, cast
 
 from meilisearch_python_sdk import AsyncClient
 
-from features.f2 import metadata_store
+from features.f2 import meili_http, metadata_store
 from features.f5 import chunk_utils
 from shared.logging_config import files_logger
 
 MEILISEARCH_BATCH_SIZE = int(os.environ.get("MEILISEARCH_BATCH_SIZE", "10000"))
+# serialized bytes per upsert request; chunk text makes document sizes vary
+MEILISEARCH_BATCH_BYTES = int(
+    os.environ.get("MEILISEARCH_BATCH_BYTES", str(32 * 1024 * 1024))
+)
+MEILISEARCH_MAX_CONCURRENT_BATCHES = int(
+    os.environ.get("MEILISEARCH_MAX_CONCURRENT_BATCHES", "4")
+)
+MEILISEARCH_COMPRESS = str(os.environ.get("MEILISEARCH_COMPRESS", "False")) == "True"
+# ids per ``IN [...]`` filter; keeps delete-by-filter payloads small
+MEILISEARCH_FILTER_BATCH_SIZE = int(
+    os.environ.get("MEILISEARCH_FILTER_BATCH_SIZE", "1000")
+)
+# first and longest polling interval of ``wait_for_tasks``
+MEILISEARCH_TASK_POLL_SECONDS = float(
+    os.environ.get("MEILISEARCH_TASK_POLL_SECONDS", "0.05")
+)
+MEILISEARCH_TASK_MAX_POLL_SECONDS = float(
+    os.environ.get("MEILISEARCH_TASK_MAX_POLL_SECONDS", "2")
+)
+# write-behind buffer of file documents: flushed at this many ids or after
+# this many seconds, whichever comes first
+MEILISEARCH_BUFFER_MAX_DOCS = int(os.environ.get("MEILISEARCH_BUFFER_MAX_DOCS", "1000"))
+MEILISEARCH_BUFFER_MAX_SECONDS = float(
+    os.environ.get("MEILISEARCH_BUFFER_MAX_SECONDS", "2")
+)
+# "list" indexes ``paths`` as ``[{"path", "mtime"}]``; "object" keeps the
+# stored relpath -> mtime mapping, which adds one schema field per path
+MEILISEARCH_PATHS_SCHEMA = os.environ.get("MEILISEARCH_PATHS_SCHEMA", "list")
 MEILISEARCH_HOST = os.environ.get("MEILISEARCH_HOST", "http://meilisearch:7700")
 MEILISEARCH_INDEX_NAME = os.environ.get("MEILISEARCH_INDEX_NAME", "files")
 MEILISEARCH_CHUNK_INDEX_NAME = os.environ.get(
     "MEILISEARCH_CHUNK_INDEX_NAME", "file_chunks"
 )
+# file index shards; each document lives in the shard picked by its id
+MEILISEARCH_SHARDS = int(os.environ.get("MEILISEARCH_SHARDS", "1"))
 
 client: AsyncClient | None = None
 index: Any | None = None
 chunk_index: Any | None = None
+_client_pid: int | None = None
 
 
-async def init_meili() -> None:
-    """Initialise the Meilisearch indexes."""
-    global client, index, chunk_index
-    from features.f4 import modules as modules_f4
+def get_client() -> AsyncClient:
+    """Return this process's pooled client, creating it on first use.
 
-    client = AsyncClient(MEILISEARCH_HOST)
+    Sync runs in a forked child which must not share the parent's sockets,
+    so the client is keyed by pid.
+    """
+    global client, _client_pid
+    if client is None or _client_pid != os.getpid():
+        client = AsyncClient(MEILISEARCH_HOST)
+        meili_http.install(client, MEILISEARCH_HOST)
+        _client_pid = os.getpid()
+    return client
 
-    if chunk_utils.is_chunk_settings_changed:
-        for path in metadata_store.by_id_directory().rglob(chunk_utils.CHUNK_FILENAME):
-            try:
-                path.unlink(missing_ok=True)
-            except Exception:
-                pass
+
+def to_index_document(doc: Mapping[str, Any]) -> Mapping[str, Any]:
+    """Return ``doc`` shaped for the file index."""
+    paths = doc.get("paths")
+    if MEILISEARCH_PATHS_SCHEMA != "list" or not isinstance(paths, Mapping):
+        return doc
+    return {
+        **doc,
+        "paths": [{"path": p, "mtime": paths[p]} for p in sorted(paths)],
+    }
+
+
+def from_index_document(doc: Mapping[str, Any]) -> dict[str, Any]:
+    """Return a file index hit in the stored document shape."""
+    result = dict(doc)
+    paths = result.get("paths")
+    if isinstance(paths, list):
+        result["paths"] = {p["path"]: p["mtime"] for p in paths}
+    return result
+
+
+def index_schema_path() -> Path:
+    return metadata_store.metadata_directory() / "meili_schema.json"
+
+
+_index_schema_cache: tuple[tuple[str, int, int], dict[str, Any]] = (("", -1, -1), {})
+
+
+def load_index_schema_state() -> dict[str, Any]:
+    """Return the recorded index schema, re-read only when the file changes.
+
+    Every routed write consults the shard count, so the parsed file is kept
+    per path, inode and mtime.
+    """
+    global _index_schema_cache
+    path = index_schema_path()
+    try:
+        st = path.stat()
+        key = (str(path), st.st_ino, st.st_mtime_ns)
+        if key != _index_schema_cache[0]:
+            with path.open("r") as f:
+                _index_schema_cache = (key, cast(dict[str, Any], json.load(f)))
+    except (OSError, ValueError):
+        # indexes built before the schema mode existed used "object"
+        return {"paths_schema": "object"}
+    return copy.deepcopy(_index_schema_cache[1])
+
+
+def is_paths_schema_changed() -> bool:
+    state = load_index_schema_state()
+    return state.get("paths_schema") != MEILISEARCH_PATHS_SCHEMA
+
+
+# --- shards -------------------------------------------------------------------
+#
+# With more than one shard the file index is split into ``<name>_<i>_of_<n>``
+# indexes. ``meili_schema.json`` records the shard count being served; while
+# a reshard to another count runs, writes go to both layouts and
+# ``index_rebuild.reshard`` fills the new one from the store before reads
+# switch over.
+
+
+def shard_uids(count: int) -> list[str]:
+    """Return the file index uids of a layout with ``count`` shards."""
+    if count <= 1:
+        return [MEILISEARCH_INDEX_NAME]
+    return [f"{MEILISEARCH_INDEX_NAME}_{i}_of_{count}" for i in range(count)]
+
+
+def serving_shard_count() -> int:
+    return int(load_index_schema_state().get("shards", 1))
+
+
+def shard_uid(file_id: str, count: int | None = None) -> str:
+    """Return the uid of the shard holding ``file_id`` in layout ``count``."""
+    uids = shard_uids(serving_shard_count() if count is None else count)
+    # ids are content hashes already; crc32 spreads any other id as well
+    return uids[zlib.crc32(str(file_id).encode()) % len(uids)]
+
+
+def file_index_uids() -> list[str]:
+    """Return the uids of the file index shards that answer reads."""
+    return shard_uids(serving_shard_count())
+
+
+def _file_index(uid: str) -> Any:
+    if index is not None and getattr(index, "uid", uid) == uid:
+        return index
+    if not client:
+        raise RuntimeError("meili index did not init")
+    return client.index(uid)
+
+
+def _route(file_ids: Iterable[str]) -> dict[str, list[str]]:
+    """Group ``file_ids`` by the shard uids they are written to."""
+    state = load_index_schema_state()
+    counts = [int(state.get("shards", 1))]
+    if state.get("reshard"):
+        counts.append(int(state["reshard"]["to"]))
+    routed: dict[str, list[str]] = {}
+    file_ids = list(file_ids)
+    for count in counts:
+        for file_id in file_ids:
+            routed.setdefault(shard_uid(file_id, count), []).append(file_id)
+    return routed
+
+
+async def _delete_index(uid: str) -> None:
+    if not client:
+        raise RuntimeError("meili index did not init")
+    try:
+        await wait_for_tasks([(await client.index(uid).delete()).task_uid])
+    except MeilisearchTaskError:
+        pass
+
+
+async def start_reshard(count: int) -> None:
+    """Create and configure the ``count`` layout and start writing into it."""
+    if not client:
+        raise RuntimeError("meili index did not init")
+    state = load_index_schema_state()
+    previous = state.get("reshard")
+    if previous and previous["to"] == count:
+        return
+    serving = shard_uids(int(state.get("shards", 1)))
+    if previous:
+        for uid in set(shard_uids(previous["to"])) - set(serving):
+            await _delete_index(uid)
+    files_logger.info(
+        "meili reshard file index from %d to %d shards", len(serving), count
+    )
+    for uid in shard_uids(count):
+        await _delete_index(uid)
+        target = await client.create_index(uid, primary_key="id")
+        await wait_for_tasks(await configure_file_index(target))
+    state["reshard"] = {"to": count, "last_id": "", "scanned": 0}
+    _write_json(index_schema_path(), state)
+
+
+async def cancel_reshard() -> None:
+    """Drop the layout of an unfinished reshard."""
+    state = load_index_schema_state()
+    reshard = state.pop("reshard", None)
+    if not reshard:
+        return
+    _write_json(index_schema_path(), state)
+    serving = shard_uids(int(state.get("shards", 1)))
+    for uid in set(shard_uids(reshard["to"])) - set(serving):
+        await _delete_index(uid)
+
+
+def save_reshard_progress(count: int, last_id: str, scanned: int) -> bool:
+    """Checkpoint a reshard to ``count``; ``False`` if it was cancelled."""
+    state = load_index_schema_state()
+    reshard = state.get("reshard")
+    if not reshard or reshard["to"] != count:
+        return False
+    reshard["last_id"] = last_id
+    reshard["scanned"] += scanned
+    _write_json(index_schema_path(), state)
+    return True
+
+
+async def finish_reshard(count: int) -> None:
+    """Serve reads from the ``count`` layout and drop the previous one."""
+    global index
+    state = load_index_schema_state()
+    if state.get("reshard", {}).get("to") != count:
+        return
+    old = shard_uids(int(state.get("shards", 1)))
+    del state["reshard"]
+    state["shards"] = count
+    _write_json(index_schema_path(), state)
+    index = _file_index(shard_uids(count)[0])
+    for uid in set(old) - set(shard_uids(count)):
+        await _delete_index(uid)
+    files_logger.info("meili file index now has %d shards", count)
+
+
+async def get_index_size(uid: str | None = None) -> dict[str, int]:
+    """Return document, schema field and on-disk byte counts of index ``uid``.
+
+    Without ``uid`` the counts cover every serving file index shard.
+    """
+    if not client:
+        raise RuntimeError("meili index did not init")
+    documents = fields = 0
+    for shard in [uid] if uid else file_index_uids():
+        stats = await client.index(shard).get_stats()
+        documents += stats.number_of_documents
+        fields = max(fields, len(stats.field_distribution or {}))
+    all_stats = await client.get_all_stats()
+    return {
+        "documents": documents,
+        "fields": fields,
+        "database_bytes": all_stats.database_size,
+    }
+
+
+def _write_json(path: Path, data: Mapping[str, Any]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with tmp.open("w") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def save_paths_schema(
+    before: Mapping[str, int], after: Mapping[str, int], seconds: float
+) -> None:
+    """Record the indexed paths schema with a before/after comparison."""
+    previous = load_index_schema_state()
+    state = {
+        **previous,
+        "paths_schema": MEILISEARCH_PATHS_SCHEMA,
+        "migrated_from": previous.get("paths_schema"),
+        "before": dict(before),
+        "after": dict(after),
+        "reindex_seconds": round(seconds, 3),
+    }
+    _write_json(index_schema_path(), state)
+    files_logger.info(
+        "meili paths schema %s -> %s: %d -> %d fields, %d -> %d bytes, "
+        "%d documents reindexed in %.1fs",
+        state["migrated_from"],
+        MEILISEARCH_PATHS_SCHEMA,
+        before["fields"],
+        after["fields"],
+        before["database_bytes"],
+        after["database_bytes"],
+        after["documents"],
+        seconds,
+    )
+
+
+# --- shadow indexes -----------------------------------------------------------
+#
+# A rebuild fills ``<uid>__next`` while ``<uid>`` keeps serving. The rebuild
+# state file lists the indexes being rebuilt; every process re-reads it when
+# it changes and mirrors its writes into the shadow, and ``swap_rebuild``
+# exchanges both indexes with one atomic swap task.
+
+SHADOW_SUFFIX = "__next"
+_rebuild_state_cache: tuple[int, dict[str, Any]] = (-1, {})
+
+
+def shadow_uid(uid: str) -> str:
+    return f"{uid}{SHADOW_SUFFIX}"
+
+
+def rebuild_state_path() -> Path:
+    return metadata_store.metadata_directory() / "index_rebuild.json"
+
+
+def load_rebuild_state() -> dict[str, Any]:
+    """Return ``{index uid: progress}`` for every rebuild in progress."""
+    global _rebuild_state_cache
+    path = rebuild_state_path()
+    try:
+        mtime = path.stat().st_mtime_ns
+    except OSError:
+        return {}
+    if mtime != _rebuild_state_cache[0]:
         try:
-            await client.get_index(MEILISEARCH_CHUNK_INDEX_NAME)
-        except Exception as e:  # pragma: no cover - index may not exist
-            if getattr(e, "code", None) != "index_not_found":
-                files_logger.exception("check chunk index failed")
-                raise
-        else:
-            try:
-                task = await client.index(MEILISEARCH_CHUNK_INDEX_NAME).delete()
-                await client.wait_for_task(task.task_uid)
-            except Exception:
-                files_logger.exception("delete chunk index failed")
-                raise
+            with path.open("r") as f:
+                state = cast(dict[str, Any], json.load(f))
+        except (OSError, ValueError):
+            state = {}
+        _rebuild_state_cache = (mtime, state)
+    return copy.deepcopy(_rebuild_state_cache[1])
+
+
+def save_rebuild_state(state: Mapping[str, Any]) -> None:
+    _write_json(rebuild_state_path(), state)
+
+
+def _targets(uid: str, live: Any) -> list[Any]:
+    """Return ``live`` plus the shadow of ``uid`` while it is being rebuilt."""
+    if client and uid in load_rebuild_state():
+        return [live, client.index(shadow_uid(uid))]
+    return [live]
+
+
+async def start_rebuild(uid: str, owner: str = "rebuild") -> None:
+    """Create and configure the shadow of ``uid`` and start mirroring writes.
+
+    ``owner`` names what fills the shadow: ``"rebuild"`` entries are filled by
+    ``index_rebuild.rebuild_index``, ``"restore"`` ones by ``restore_indexes``.
+    """
+    if not client:
+        raise RuntimeError("meili index did not init")
+    state = load_rebuild_state()
+    if uid in state:
+        return
+    shadow = shadow_uid(uid)
+    try:
+        # a shadow left behind by an interrupted swap
+        await wait_for_tasks([(await client.index(shadow).delete()).task_uid])
+    except MeilisearchTaskError:
+        pass
+    files_logger.info("meili start rebuild of '%s' into '%s'", uid, shadow)
+    target = await client.create_index(shadow, primary_key="id")
+    if uid == MEILISEARCH_CHUNK_INDEX_NAME:
+        await wait_for_tasks(await configure_chunk_index(target))
+    else:
+        await wait_for_tasks(await configure_file_index(target))
+    state[uid] = {
+        "started": time.time(),
+        "last_id": "",
+        "scanned": 0,
+        "before": await get_index_size(uid),
+        "owner": owner,
+    }
+    save_rebuild_state(state)
+
+
+async def swap_rebuild(uid: str, owner: str = "rebuild") -> None:
+    """Atomically replace ``uid`` with its rebuilt shadow and drop the old one.
+
+    Nothing is swapped unless ``owner`` still owns the rebuild of ``uid``.
+    """
+    if not client:
+        raise RuntimeError("meili index did not init")
+    state = load_rebuild_state()
+    if uid not in state or state[uid].get("owner", "rebuild") != owner:
+        files_logger.warning(
+            "meili '%s' is not rebuilt by %s; not swapping", uid, owner
+        )
+        return
+    shadow = shadow_uid(uid)
+    await wait_for_tasks([(await client.swap_indexes([(uid, shadow)])).task_uid])
+    state = load_rebuild_state()
+    entry = state.pop(uid, {})
+    save_rebuild_state(state)
+    # after the swap the shadow uid holds the previous documents
+    await wait_for_tasks([(await client.index(shadow).delete()).task_uid])
+    files_logger.info("meili swapped rebuilt '%s' into place", uid)
+    if uid == MEILISEARCH_CHUNK_INDEX_NAME:
         chunk_utils.save_chunk_settings()
+    elif "before" in entry:
+        save_paths_schema(
+            entry["before"],
+            await get_index_size(uid),
+            time.time() - entry.get("started", time.time()),
+        )
+
+
+async def add_or_update_documents_in(
+    uid: str, docs: Iterable[Mapping[str, Any]]
+) -> list[int]:
+    """Enqueue upserts of already shaped ``docs`` into index ``uid`` only."""
+    if not client:
+        raise RuntimeError("meili index did not init")
+    return await _upload_documents(client.index(uid), docs)
+
+
+# attribute lists whose order Meilisearch treats as significant
+_ORDERED_SETTINGS = {"searchable_attributes"}
+
+
+def _settings_equal(key: str, current: Any, desired: list[str]) -> bool:
+    current_list = list(current or [])
+    if key in _ORDERED_SETTINGS:
+        return current_list == desired
+    return set(current_list) == set(desired)
+
+
+async def reconcile_settings(
+    target: Any, current: Any, desired: Mapping[str, list[str]]
+) -> list[int]:
+    """Send only the settings in ``desired`` that differ from ``current``.
+
+    ``current`` is the result of ``get_settings``. Each changed attribute
+    list is sent through its own ``update_<setting>`` call so unchanged ones
+    never enqueue a task; returns the uids of the tasks that were enqueued.
+    """
+    task_uids = []
+    for key, value in desired.items():
+        if _settings_equal(key, getattr(current, key, None), value):
+            continue
+        files_logger.info("meili update %s of %s", key, target.uid)
+        task = await getattr(target, f"update_{key}")(value)
+        task_uids.append(task.task_uid)
+    return task_uids
+
+
+CHUNK_EMBEDDER_NAME = "e5-small"
+CHUNK_DOCUMENT_TEMPLATE = "passage: {{doc.text}}"
+
+
+def _embedder_changed(current: Any) -> bool:
+    embedder = (getattr(current, "embedders", None) or {}).get(CHUNK_EMBEDDER_NAME)
+    return (
+        getattr(embedder, "model", None) != chunk_utils.EMBED_MODEL_NAME
+        or getattr(embedder, "document_template", None) != CHUNK_DOCUMENT_TEMPLATE
+    )
+
+
+def file_index_settings() -> dict[str, list[str]]:
+    """Return the attribute settings the file index should have."""
+    from features.f4 import modules as modules_f4
+
+    def from_modules(key: str) -> list[str]:
+        return list(chain(*[cfg.get(key, []) for cfg in modules_f4.module_configs]))
+
+    filterable = [
+        "id",
+        "mtime",
+        "paths",
+        "paths_list",
+        "size",
+        "next",
+        "type",
+        "copies",
+    ] + from_modules("filterable_attributes")
+    sortable = [
+        "mtime",
+        "size",
+        "next",
+        "type",
+        "copies",
+    ] + from_modules("sortable_attributes")
+    searchable = ["*"]
+    if MEILISEARCH_PATHS_SCHEMA != "list":
+        sortable.insert(1, "paths")
+    elif all("searchable_attributes" in cfg for cfg in modules_f4.module_configs):
+        # only text a user types at; a module that does not declare its
+        # fields keeps everything searchable rather than hiding its output
+        searchable = ["paths.path", "type"] + from_modules("searchable_attributes")
+    return {
+        "filterable_attributes": filterable,
+        "sortable_attributes": sortable,
+        "searchable_attributes": searchable,
+    }
+
+
+async def configure_file_index(target: Any) -> list[int]:
+    return await reconcile_settings(
+        target, await target.get_settings(), file_index_settings()
+    )
+
+
+async def configure_chunk_index(target: Any) -> list[int]:
+    current = await target.get_settings()
+    task_uids = []
+    if _embedder_changed(current):
+        from meilisearch_python_sdk.models.settings import (
+            Embedders,
+            HuggingFaceEmbedder,
+        )
+
+        files_logger.info("create embedder %s", chunk_utils.EMBED_MODEL_NAME)
+        task = await target.update_embedders(
+            Embedders(
+                embedders={
+                    CHUNK_EMBEDDER_NAME: HuggingFaceEmbedder(
+                        model=chunk_utils.EMBED_MODEL_NAME,
+                        document_template=CHUNK_DOCUMENT_TEMPLATE,
+                    )
+                }
+            )
+        )
+        task_uids.append(task.task_uid)
+    task_uids += await reconcile_settings(
+        target,
+        current,
+        {
+            "filterable_attributes": ["file_id", "module"],
+            "sortable_attributes": ["index"],
+        },
+    )
+    return task_uids
+
 
+async def _get_index(uid: str) -> Any | None:
+    """Return index ``uid``, or ``None`` if missing, waiting for Meilisearch."""
+    if not client:
+        raise RuntimeError("meili index did not init")
     for attempt in range(30):
         try:
-            index = await client.get_index(MEILISEARCH_INDEX_NAME)
-            break
+            return await client.get_index(uid)
         except Exception as e:
-            if getattr(e, "code", None) != "index_not_found" and attempt < 29:
-                files_logger.warning("meili unavailable, retrying in 1s")
-                await asyncio.sleep(1)
-                continue
             if getattr(e, "code", None) == "index_not_found":
-                try:
-                    files_logger.info("meili create index '%s'", MEILISEARCH_INDEX_NAME)
-                    index = await client.create_index(
-                        MEILISEARCH_INDEX_NAME, primary_key="id"
-                    )
-                except Exception:
-                    files_logger.exception("meili create index failed")
-                    raise
-            else:
+                return None
+            if attempt == 29:
                 files_logger.exception("meili init failed")
                 raise
+            files_logger.warning("meili unavailable, retrying in 1s")
+            await asyncio.sleep(1)
+    return None  # pragma: no cover
+
+
+async def _open_index(uid: str) -> tuple[str, Any, bool]:
+    """Return ``uid``, its index and whether it had to be created."""
+    if not client:
+        raise RuntimeError("meili index did not init")
+    existing = await _get_index(uid)
+    if existing is not None:
+        return uid, existing, False
+    try:
+        files_logger.info("meili create index '%s'", uid)
+        return uid, await client.create_index(uid, primary_key="id"), True
+    except Exception:
+        files_logger.exception("meili create index failed")
+        raise
+
+
+async def init_meili() -> None:
+    """Initialise the Meilisearch indexes.
 
+    Indexes that exist already are never dropped: a change of chunk settings
+    or of the paths schema starts a shadow rebuild and the live index keeps
+    its settings until the rebuilt one is swapped in.
+    """
+    global client, index, chunk_index
+
+    client = get_client()
+
+    state = load_index_schema_state()
+    # nothing indexed yet: start out with the configured shard count
+    fresh = "shards" not in state and await _get_index(MEILISEARCH_INDEX_NAME) is None
+    shard_count = MEILISEARCH_SHARDS if fresh else int(state.get("shards", 1))
+    shards = [await _open_index(uid) for uid in shard_uids(shard_count)]
+    index = shards[0][1]
+
+    chunk_index_created = False
     try:
         chunk_index = await client.get_index(MEILISEARCH_CHUNK_INDEX_NAME)
     except Exception as e:  # pragma: no cover - index may not exist
@@ -81,6 +607,7 @@ async def init_meili() -> None:
             chunk_index = await client.create_index(
                 MEILISEARCH_CHUNK_INDEX_NAME, primary_key="id"
             )
+            chunk_index_created = True
         else:
             files_logger.exception("meili chunk init failed")
             raise
@@ -89,205 +616,547 @@ async def init_meili() -> None:
     if chunk_index.uid != MEILISEARCH_CHUNK_INDEX_NAME:
         raise RuntimeError(f"Unexpected chunk index uid {chunk_index.uid}")
 
+    rebuilding = load_rebuild_state()
     try:
-        from meilisearch_python_sdk.models.settings import (
-            Embedders,
-            HuggingFaceEmbedder,
-            MeilisearchSettings,
-        )
-
-        files_logger.info("create embedder %s", chunk_utils.EMBED_MODEL_NAME)
-        task = await chunk_index.update_embedders(
-            Embedders(
-                embedders={
-                    "e5-small": HuggingFaceEmbedder(
-                        model=chunk_utils.EMBED_MODEL_NAME,
-                        document_template="passage: {{doc.text}}",
-                    )
-                }
-            )
-        )
-        await client.wait_for_task(task.task_uid)
-
-        files_logger.info("update chunk index settings")
-        settings_body = MeilisearchSettings(
-            filterable_attributes=["file_id", "module"],
-            sortable_attributes=["index"],
-        )
-        task = await chunk_index.update_settings(settings_body)
-        await client.wait_for_task(task.task_uid)
-        chunk_utils.save_chunk_settings()
+        if chunk_index_created:
+            if chunk_utils.get_is_chunk_settings_changed():
+                # chunk files were built for other settings; sync rebuilds them
+                for path in metadata_store.by_id_directory().rglob(
+                    f"{chunk_utils.CHUNK_FILENAME}*"
+                ):
+                    path.unlink(missing_ok=True)
+            await wait_for_tasks(await configure_chunk_index(chunk_index))
+            chunk_utils.save_chunk_settings()
+        elif MEILISEARCH_CHUNK_INDEX_NAME in rebuilding:
+            pass
+        elif chunk_utils.get_is_chunk_settings_changed():
+            await start_rebuild(MEILISEARCH_CHUNK_INDEX_NAME)
+        else:
+            await wait_for_tasks(await configure_chunk_index(chunk_index))
     except Exception:
         files_logger.exception("meili update chunk index settings failed")
         raise
 
-    filterable = [
-        "id",
-        "mtime",
-        "paths",
-        "paths_list",
-        "size",
-        "next",
-        "type",
-        "copies",
-    ] + list(
-        chain(
-            *[cfg.get("filterable_attributes", []) for cfg in modules_f4.module_configs]
-        )
-    )
-
     try:
         files_logger.debug("meili update index attrs")
-        assert index is not None
-        await index.update_filterable_attributes(filterable)
-        await index.update_sortable_attributes(
-            [
-                "mtime",
-                "paths",
-                "size",
-                "next",
-                "type",
-                "copies",
-            ]
-            + list(
-                chain(
-                    *[
-                        cfg.get("sortable_attributes", [])
-                        for cfg in modules_f4.module_configs
-                    ]
-                )
+        schema_changed = not fresh and is_paths_schema_changed()
+        for uid, shard, created in shards:
+            if created or fresh:
+                await wait_for_tasks(await configure_file_index(shard))
+            elif uid in rebuilding:
+                pass
+            elif schema_changed:
+                await start_rebuild(uid)
+            else:
+                await wait_for_tasks(await configure_file_index(shard))
+        if fresh or all(created for _, _, created in shards):
+            _write_json(
+                index_schema_path(),
+                {"paths_schema": MEILISEARCH_PATHS_SCHEMA, "shards": shard_count},
             )
-        )
-        await wait_for_meili_idle()
     except Exception:
         files_logger.exception("meili update index attrs failed")
         raise
 
+    if MEILISEARCH_SHARDS == shard_count:
+        await cancel_reshard()
+    else:
+        await start_reshard(MEILISEARCH_SHARDS)
+
 
 async def get_document_count() -> int:
     if not index:
         raise RuntimeError("meili index did not init")
-    stats = await index.get_stats()
-    return cast(int, stats.number_of_documents)
+    count = 0
+    for uid in file_index_uids():
+        stats = await _file_index(uid).get_stats()
+        count += stats.number_of_documents
+    return count
 
 
-async def add_or_update_documents(docs: Iterable[Mapping[str, Any]]) -> None:
+def _byte_batches(
+    docs: Iterable[Mapping[str, Any]],
+) -> Iterator[list[Mapping[str, Any]]]:
+    """Split ``docs`` into batches bounded by count and serialized size."""
+    batch: list[Mapping[str, Any]] = []
+    size = 2
+    for doc in docs:
+        doc_size = len(json.dumps(doc, ensure_ascii=False).encode()) + 1
+        if batch and (
+            len(batch) >= MEILISEARCH_BATCH_SIZE
+            or size + doc_size > MEILISEARCH_BATCH_BYTES
+        ):
+            yield batch
+            batch = []
+            size = 2
+        batch.append(doc)
+        size += doc_size
+    if batch:
+        yield batch
+
+
+async def _upload_documents(
+    target: Any, docs: Iterable[Mapping[str, Any]]
+) -> list[int]:
+    """Send size-bounded batches with a few requests in flight at once."""
+    semaphore = asyncio.Semaphore(MEILISEARCH_MAX_CONCURRENT_BATCHES)
+
+    async def send(batch: list[Mapping[str, Any]]) -> int:
+        async with semaphore:
+            task = await target.update_documents(batch, compress=MEILISEARCH_COMPRESS)
+        return cast(int, task.task_uid)
+
+    return list(await asyncio.gather(*(send(b) for b in _byte_batches(docs))))
+
+
+async def add_or_update_documents(docs: Iterable[Mapping[str, Any]]) -> list[int]:
+    """Enqueue upserts of ``docs``; return their task uids."""
     if not index:
         raise RuntimeError("meili index did not init")
-    docs_list = list(docs)
-    for i in range(0, len(docs_list), MEILISEARCH_BATCH_SIZE):
-        batch = docs_list[i : i + MEILISEARCH_BATCH_SIZE]
-        await index.update_documents(batch)
+    docs_list = [to_index_document(d) for d in docs]
+    for doc in docs_list:
+        _forget_buffered_fields(doc)
+    by_id = {doc["id"]: doc for doc in docs_list}
+    uploads = [
+        _upload_documents(target, [by_id[doc_id] for doc_id in doc_ids])
+        for uid, doc_ids in _route(by_id).items()
+        for target in _targets(uid, _file_index(uid))
+    ]
+    # shards index independently, so their uploads run side by side
+    return [uid for uids in await asyncio.gather(*uploads) for uid in uids]
 
 
-async def add_or_update_chunk_documents(docs: Iterable[Mapping[str, Any]]) -> None:
+async def add_or_update_chunk_documents(
+    docs: Iterable[Mapping[str, Any]],
+) -> list[int]:
+    """Enqueue upserts of chunk ``docs``; return their task uids."""
     if not chunk_index:
         raise RuntimeError("meili chunk index did not init")
     docs_list = list(docs)
-    for i in range(0, len(docs_list), MEILISEARCH_BATCH_SIZE):
-        batch = docs_list[i : i + MEILISEARCH_BATCH_SIZE]
-        await chunk_index.update_documents(batch)
+    task_uids = []
+    for target in _targets(MEILISEARCH_CHUNK_INDEX_NAME, chunk_index):
+        task_uids += await _upload_documents(target, docs_list)
+    return task_uids
 
 
-async def delete_docs_by_id(ids: list[str]) -> None:
+async def delete_docs_by_id(ids: list[str]) -> list[int]:
     if not index:
         raise RuntimeError("meili index did not init")
-    for i in range(0, len(ids), MEILISEARCH_BATCH_SIZE):
-        batch = ids[i : i + MEILISEARCH_BATCH_SIZE]
-        await index.delete_documents(ids=batch)
+    _forget_buffered_docs(ids)
+    task_uids = []
+    for uid, shard_ids in _route(ids).items():
+        for target in _targets(uid, _file_index(uid)):
+            for i in range(0, len(shard_ids), MEILISEARCH_BATCH_SIZE):
+                batch = shard_ids[i : i + MEILISEARCH_BATCH_SIZE]
+                task = await target.delete_documents(ids=batch)
+                task_uids.append(task.task_uid)
+    return task_uids
 
 
-async def delete_chunk_docs_by_id(ids: list[str]) -> None:
+async def delete_chunk_docs_by_id(ids: list[str]) -> list[int]:
     if not chunk_index:
         raise RuntimeError("meili chunk index did not init")
-    if not ids:
+    task_uids = []
+    for target in _targets(MEILISEARCH_CHUNK_INDEX_NAME, chunk_index):
+        for i in range(0, len(ids), MEILISEARCH_BATCH_SIZE):
+            batch = ids[i : i + MEILISEARCH_BATCH_SIZE]
+            task = await target.delete_documents(ids=batch)
+            task_uids.append(task.task_uid)
+    return task_uids
+
+
+# --- write-behind buffer ------------------------------------------------------
+#
+# Per-job document updates are coalesced by id (last write wins) and sent as
+# one upsert when the buffer fills or its timer fires. Reads in this process
+# overlay the buffer, so a buffered ``next`` is seen before it is indexed.
+# Flushed documents stay overlaid until their tasks have finished, so a read
+# between a flush and its indexing does not see the old values again.
+
+_buffer: dict[str, dict[str, Any]] = {}
+_buffer_timer: tuple[asyncio.AbstractEventLoop, asyncio.TimerHandle] | None = None
+_buffer_flushes: set[asyncio.Future[list[int]]] = set()
+_flushed: list[tuple[list[int], dict[str, dict[str, Any]]]] = []
+
+
+def _reset_buffer_in_child() -> None:
+    """Drop the parent's buffer in a forked child; the parent still flushes it."""
+    global _buffer, _buffer_timer, _buffer_flushes, _flushed
+    _buffer = {}
+    _buffer_timer = None
+    _buffer_flushes = set()
+    _flushed = []
+
+
+os.register_at_fork(after_in_child=_reset_buffer_in_child)
+
+
+def changed_fields(
+    previous: Mapping[str, Any] | None, current: Mapping[str, Any]
+) -> dict[str, Any]:
+    """Return ``id`` plus the fields of ``current`` that differ from ``previous``.
+
+    Meilisearch merges an upsert into the stored document, so sending this
+    change set is equivalent to sending ``current``. Fields that were removed
+    are sent as ``None``. Without ``previous`` the whole document is returned.
+    """
+    if previous is None:
+        return dict(current)
+    changes = {
+        key: value
+        for key, value in current.items()
+        if key == "id" or key not in previous or previous[key] != value
+    }
+    changes.update({key: None for key in previous if key not in current})
+    return changes
+
+
+def _forget_buffered_fields(doc: Mapping[str, Any]) -> None:
+    """Drop buffered and flushed fields that the direct write of ``doc`` supersedes."""
+    doc_id = str(doc["id"])
+    for pending in [_buffer, *(docs for _, docs in _flushed)]:
+        buffered = pending.get(doc_id)
+        if buffered is None:
+            continue
+        for key in doc:
+            if key != "id":
+                buffered.pop(key, None)
+        if buffered.keys() <= {"id"}:
+            del pending[doc_id]
+
+
+def _forget_buffered_docs(ids: Iterable[str]) -> None:
+    for doc_id in ids:
+        for pending in [_buffer, *(docs for _, docs in _flushed)]:
+            pending.pop(doc_id, None)
+
+
+async def buffer_documents(docs: Iterable[Mapping[str, Any]]) -> list[int]:
+    """Queue upserts of ``docs``; return task uids if this filled the buffer.
+
+    Documents may be partial; fields buffered for the same id are merged and
+    the last value of each field wins.
+    """
+    for doc in docs:
+        _buffer.setdefault(str(doc["id"]), {}).update(doc)
+    if len(_buffer) >= MEILISEARCH_BUFFER_MAX_DOCS:
+        return await flush_documents()
+    _schedule_flush()
+    return []
+
+
+def _schedule_flush() -> None:
+    global _buffer_timer
+    loop = asyncio.get_running_loop()
+    if _buffer_timer is not None and _buffer_timer[0] is loop:
         return
-    for i in range(0, len(ids), MEILISEARCH_BATCH_SIZE):
-        batch = ids[i : i + MEILISEARCH_BATCH_SIZE]
-        await chunk_index.delete_documents(ids=batch)
+    _buffer_timer = (
+        loop,
+        loop.call_later(MEILISEARCH_BUFFER_MAX_SECONDS, _start_timed_flush),
+    )
 
 
-async def delete_chunk_docs_by_file_ids(file_ids: Iterable[str]) -> None:
-    if not chunk_index:
-        raise RuntimeError("meili chunk index did not init")
-    docs = []
-    offset = 0
-    limit = MEILISEARCH_BATCH_SIZE
-    while True:
-        result = await chunk_index.get_documents(offset=offset, limit=limit)
-        docs.extend(result.results)
-        if len(result.results) < limit:
-            break
-        offset += limit
-    ids_to_delete = [d["id"] for d in docs if d.get("file_id") in file_ids]
-    await delete_chunk_docs_by_id(ids_to_delete)
+def _start_timed_flush() -> None:
+    global _buffer_timer
+    _buffer_timer = None
+    future = asyncio.ensure_future(flush_documents())
+    _buffer_flushes.add(future)
+    future.add_done_callback(_timed_flush_done)
+
+
+def _timed_flush_done(future: asyncio.Future[list[int]]) -> None:
+    _buffer_flushes.discard(future)
+    if not future.cancelled() and future.exception() is not None:
+        files_logger.error("meili buffered upsert failed: %s", future.exception())
+        _schedule_flush()
+
+
+async def flush_documents() -> list[int]:
+    """Send every buffered document now; return the enqueued task uids."""
+    global _buffer, _buffer_timer
+    if _buffer_timer is not None:
+        _buffer_timer[1].cancel()
+        _buffer_timer = None
+    if not _buffer:
+        return []
+    pending, _buffer = _buffer, {}
+    try:
+        task_uids = await add_or_update_documents(list(pending.values()))
+    except Exception:
+        for doc_id, doc in pending.items():
+            _buffer[doc_id] = {**doc, **_buffer.get(doc_id, {})}
+        raise
+    _flushed.append((task_uids, pending))
+    return task_uids
+
+
+async def flush_and_wait() -> None:
+    """Flush the buffer and wait until its documents are searchable."""
+    await wait_for_tasks(await flush_documents())
+
+
+async def _settle_flushes() -> None:
+    """Stop overlaying flushed documents once their tasks have finished."""
+    if not client:
+        return
+    while _flushed:
+        task_uids, docs = _flushed[0]
+        for uid in task_uids:
+            task = await client.get_task(uid)
+            if task.status not in ("succeeded", "failed", "canceled"):
+                return
+            if task.status != "succeeded":
+                files_logger.error(
+                    "meili buffered upsert task %s %s: %s", uid, task.status, task.error
+                )
+        if _flushed and _flushed[0][1] is docs:
+            _flushed.pop(0)
+
+
+async def _unindexed() -> dict[str, dict[str, Any]]:
+    """Merge the flushed and buffered changes that may not be indexed yet."""
+    await _settle_flushes()
+    changes: dict[str, dict[str, Any]] = {}
+    for pending in [*(docs for _, docs in _flushed), _buffer]:
+        for doc_id, doc in pending.items():
+            changes[doc_id] = {**changes.get(doc_id, {}), **doc}
+    return changes
 
 
-async def delete_chunk_docs_by_file_id_and_module(file_id: str, module: str) -> None:
+def _overlay(
+    docs: Iterable[Mapping[str, Any]], changes: Mapping[str, Mapping[str, Any]]
+) -> list[dict[str, Any]]:
+    return [
+        {**from_index_document(doc), **changes.get(str(doc["id"]), {})} for doc in docs
+    ]
+
+
+def _quote(value: Any) -> str:
+    return json.dumps(str(value))
+
+
+def _in_filter(attribute: str, values: Iterable[Any]) -> str:
+    return f"{attribute} IN [{', '.join(_quote(v) for v in values)}]"
+
+
+async def _delete_chunks_by_filters(filters: Iterable[str]) -> list[int]:
     if not chunk_index:
         raise RuntimeError("meili chunk index did not init")
-    docs = []
-    offset = 0
-    limit = MEILISEARCH_BATCH_SIZE
-    while True:
-        result = await chunk_index.get_documents(offset=offset, limit=limit)
-        docs.extend(result.results)
-        if len(result.results) < limit:
-            break
-        offset += limit
-    ids_to_delete = [
-        d["id"]
-        for d in docs
-        if d.get("file_id") == file_id and d.get("module") == module
-    ]
-    await delete_chunk_docs_by_id(ids_to_delete)
+    filters = list(filters)
+    task_uids = []
+    for target in _targets(MEILISEARCH_CHUNK_INDEX_NAME, chunk_index):
+        for filter_query in filters:
+            task = await target.delete_documents_by_filter(filter_query)
+            task_uids.append(task.task_uid)
+    return task_uids
+
+
+async def delete_chunk_docs_by_file_ids(file_ids: Iterable[str]) -> list[int]:
+    """Delete every chunk of ``file_ids`` server side by filter."""
+    ids = sorted(set(file_ids))
+    return await _delete_chunks_by_filters(
+        _in_filter("file_id", ids[i : i + MEILISEARCH_FILTER_BATCH_SIZE])
+        for i in range(0, len(ids), MEILISEARCH_FILTER_BATCH_SIZE)
+    )
+
+
+async def delete_chunk_docs_by_file_modules(
+    pairs: Iterable[tuple[str, str]],
+) -> list[int]:
+    """Delete chunks for each ``(file_id, module)`` pair with batched filters."""
+    unique = sorted(set(pairs), key=lambda p: (p[1], p[0]))
+    filters = []
+    for i in range(0, len(unique), MEILISEARCH_FILTER_BATCH_SIZE):
+        by_module: dict[str, list[str]] = {}
+        for file_id, module in unique[i : i + MEILISEARCH_FILTER_BATCH_SIZE]:
+            by_module.setdefault(module, []).append(file_id)
+        filters.append(
+            " OR ".join(
+                f"(module = {_quote(module)} AND {_in_filter('file_id', ids)})"
+                for module, ids in by_module.items()
+            )
+        )
+    return await _delete_chunks_by_filters(filters)
+
+
+async def delete_chunk_docs_by_file_id_and_module(
+    file_id: str, module: str
+) -> list[int]:
+    return await delete_chunk_docs_by_file_modules([(file_id, module)])
 
 
 async def get_document(doc_id: str) -> Mapping[str, Any]:
     if not index:
         raise RuntimeError("meili index did not init")
-    return cast(Mapping[str, Any], await index.get_document(doc_id))
+    shard = _file_index(shard_uid(doc_id))
+    return _overlay([await shard.get_document(doc_id)], await _unindexed())[0]
 
 
 async def get_all_documents() -> list[dict[str, Any]]:
     if not index:
         raise RuntimeError("meili index did not init")
-    docs = []
-    offset = 0
+    # settle before reading, so that tasks finishing mid-scan stay overlaid
+    changes = await _unindexed()
+    docs: list[dict[str, Any]] = []
     limit = MEILISEARCH_BATCH_SIZE
-    while True:
-        result = await index.get_documents(offset=offset, limit=limit)
-        docs.extend(result.results)
-        if len(result.results) < limit:
-            break
-        offset += limit
+    for uid in file_index_uids():
+        shard = _file_index(uid)
+        offset = 0
+        while True:
+            result = await shard.get_documents(offset=offset, limit=limit)
+            docs.extend(_overlay(result.results, changes))
+            if len(result.results) < limit:
+                break
+            offset += limit
     return docs
 
 
+async def iter_document_ids(
+    batch_size: int = MEILISEARCH_BATCH_SIZE,
+) -> AsyncIterator[str]:
+    """Yield every document id in the file index, ascending within each shard.
+
+    Only the ``id`` field is fetched. Each request covers an id range; a
+    range that fills a whole batch is split at the median id of that batch
+    and both halves are fetched again, so no request ever pages by offset.
+    """
+    if not index:
+        raise RuntimeError("meili index did not init")
+    for uid in file_index_uids():
+        async for doc_id in _iter_shard_ids(_file_index(uid), batch_size):
+            yield doc_id
+
+
+async def _iter_shard_ids(shard: Any, batch_size: int) -> AsyncIterator[str]:
+    ranges: list[tuple[str | None, str | None]] = [(None, None)]
+    while ranges:
+        low, high = ranges.pop()
+        clauses = []
+        if low is not None:
+            clauses.append(f"id >= {_quote(low)}")
+        if high is not None:
+            clauses.append(f"id < {_quote(high)}")
+        result = await shard.get_documents(
+            limit=batch_size, fields=["id"], filter=" AND ".join(clauses) or None
+        )
+        ids = sorted(str(doc["id"]) for doc in result.results)
+        if len(ids) < batch_size or batch_size < 2:
+            for doc_id in ids:
+                yield doc_id
+            continue
+        median = ids[len(ids) // 2]
+        ranges.append((median, high))
+        ranges.append((low, median))
+
+
+async def get_indexed_fields(
+    ids: Iterable[str], fields: list[str]
+) -> dict[str, dict[str, Any]]:
+    """Return ``fields`` of the documents of ``ids`` that are in the index."""
+    if not index:
+        raise RuntimeError("meili index did not init")
+    found: dict[str, dict[str, Any]] = {}
+    for uid, shard_ids in _route(ids).items():
+        if uid not in file_index_uids():
+            continue
+        shard = _file_index(uid)
+        # id filters stay small enough for one request per batch
+        for i in range(0, len(shard_ids), 1000):
+            batch = shard_ids[i : i + 1000]
+            result = await shard.get_documents(
+                limit=len(batch),
+                fields=["id", *fields],
+                filter=_in_filter("id", batch),
+            )
+            found.update({str(doc["id"]): doc for doc in result.results})
+    return found
+
+
 async def get_all_pending_jobs(name: str) -> list[dict[str, Any]]:
     if not index:
         raise RuntimeError("meili index is not initialized")
-    docs = []
-    offset = 0
+    changes = await _unindexed()
+    docs: list[dict[str, Any]] = []
     limit = MEILISEARCH_BATCH_SIZE
     filter_query = f"next = {name}"
-    while True:
-        response = await index.get_documents(
-            filter=filter_query, limit=limit, offset=offset
-        )
-        docs.extend(response.results)
-        if len(response.results) < limit:
-            break
-        offset += limit
+    for uid in file_index_uids():
+        shard = _file_index(uid)
+        offset = 0
+        while True:
+            response = await shard.get_documents(
+                filter=filter_query, limit=limit, offset=offset
+            )
+            docs.extend(_overlay(response.results, changes))
+            if len(response.results) < limit:
+                break
+            offset += limit
+    # buffered updates may have moved documents into or out of this queue
+    seen = {doc["id"] for doc in docs}
+    docs = [doc for doc in docs if doc.get("next") == name]
+    for doc_id, doc in changes.items():
+        if doc_id not in seen and doc.get("next") == name:
+            # buffered changes may be partial; complete them from the store
+            stored = metadata_store.read_doc_json(doc_id) or {}
+            docs.append({**stored, **doc})
     return docs
 
 
-async def wait_for_meili_idle() -> None:
+async def search(
+    query: str, filter: str | None = None, limit: int = 20, offset: int = 0
+) -> dict[str, Any]:
+    """Search every file index shard in one federated request.
+
+    Meilisearch merges the hits of all shards by ranking score and applies
+    ``limit`` and ``offset`` to the merged list.
+    """
+    if not client:
+        raise RuntimeError("meili index did not init")
+    from meilisearch_python_sdk.models.search import Federation, SearchParams
+
+    queries = [
+        SearchParams(index_uid=uid, query=query, filter=filter)
+        for uid in file_index_uids()
+    ]
+    result = await client.multi_search(
+        queries, federation=Federation(limit=limit, offset=offset)
+    )
+    return {
+        "hits": [from_index_document(hit) for hit in result.hits],
+        "estimated_total_hits": result.estimated_total_hits,
+        "processing_time_ms": result.processing_time_ms,
+    }
+
+
+class MeilisearchTaskError(RuntimeError):
+    """A Meilisearch task that was waited on failed or was canceled."""
+
+
+async def wait_for_tasks(
+    task_uids: Iterable[int], timeout: float | None = None
+) -> None:
+    """Wait until every task in ``task_uids`` has succeeded.
+
+    Each task is polled with exponential backoff. Raises
+    :class:`MeilisearchTaskError` for failed or canceled tasks and
+    ``TimeoutError`` once ``timeout`` seconds have passed.
+    """
+    pending = sorted(set(task_uids))
+    if not pending:
+        return
     if not client:
         raise RuntimeError("meili index did not init")
-    while True:
-        tasks = await client.get_tasks()
-        active = [t for t in tasks.results if t.status in ["enqueued", "processing"]]
-        if not active:
-            break
-        await asyncio.sleep(1)
+    deadline = None if timeout is None else time.monotonic() + timeout
+    for uid in pending:
+        delay = MEILISEARCH_TASK_POLL_SECONDS
+        while True:
+            task = await client.get_task(uid)
+            if task.status == "succeeded":
+                break
+            if task.status in ("failed", "canceled"):
+                raise MeilisearchTaskError(
+                    f"meili task {uid} ({task.type}) {task.status}: {task.error}"
+                )
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError(f"meili task {uid} still {task.status}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MEILISEARCH_TASK_MAX_POLL_SECONDS)
@@ -0,0 +1,119 @@
+import asyncio
+import json
+import os
+from pathlib import Path
+
+
+def _use_store(monkeypatch, root: Path) -> None:
+    from features.f2 import doc_cache
+
+    monkeypatch.setenv("METADATA_DIRECTORY", str(root))
+    monkeypatch.setenv("BY_ID_DIRECTORY", str(root / "by-id"))
+    monkeypatch.setenv("BY_PATH_DIRECTORY", str(root / "by-path"))
+    doc_cache.clear()
+
+
+def test_export_import_round_trip(monkeypatch, tmp_path: Path):
+    from features.f2 import backup, metadata_store, path_links
+
+    _use_store(monkeypatch, tmp_path / "old")
+    metadata_store.ensure_directories()
+    for i in range(5):
+        file_id = f"id{i}"
+        metadata_store.write_doc_json(
+            {"id": file_id, "paths": {f"dir/f{i}.txt": 1.0}, "version": 1}
+        )
+        module_dir = metadata_store.by_id_directory() / file_id / "read"
+        module_dir.mkdir()
+        (module_dir / "text.txt").write_bytes(b"\x00text" + bytes([i]))
+
+    archive = tmp_path / "backup.tar"
+    assert backup.export_metadata(archive, shard_size=2, workers=2) == 5
+
+    _use_store(monkeypatch, tmp_path / "new")
+    restored = asyncio.run(
+        backup.import_metadata(archive, update_search_index=False, workers=2)
+    )
+    assert restored == 5
+    by_id = metadata_store.by_id_directory()
+    for i in range(5):
+        file_id = f"id{i}"
+        with (by_id / file_id / "document.json").open() as f:
+            assert json.load(f)["id"] == file_id
+        assert (by_id / file_id / "read" / "text.txt").read_bytes() == (
+            b"\x00text" + bytes([i])
+        )
+        link = path_links.by_path_directory() / "dir" / f"f{i}.txt"
+        assert os.path.realpath(link) == os.path.realpath(by_id / file_id)
+    assert not backup.consume_import_marker()
+
+
+def test_import_marker_consumed_once(monkeypatch, tmp_path: Path):
+    from features.f2 import backup
+
+    _use_store(monkeypatch, tmp_path)
+    backup.write_import_marker(3)
+    assert backup.consume_import_marker()
+    assert not backup.consume_import_marker()
+
+
+def test_large_files_and_blob_sharing_survive_round_trip(monkeypatch, tmp_path: Path):
+    from features.f2 import backup, blob_store, metadata_store
+
+    monkeypatch.setattr(backup, "EXPORT_INLINE_MAX_BYTES", 8)
+    monkeypatch.setattr(blob_store, "MODULE_BLOB_STORE", True)
+    monkeypatch.setattr(blob_store, "MODULE_BLOB_MIN_BYTES", 4)
+    _use_store(monkeypatch, tmp_path / "old")
+    monkeypatch.setenv("BLOBS_DIRECTORY", str(tmp_path / "old" / "blobs"))
+    metadata_store.ensure_directories()
+    for file_id in ["a", "b"]:
+        metadata_store.write_doc_json({"id": file_id, "paths": {file_id: 1.0}})
+        module_dir = metadata_store.by_id_directory() / file_id / "read"
+        module_dir.mkdir()
+        (module_dir / "text.txt").write_bytes(b"shared transcript")
+        blob_store.dedupe_directory(module_dir)
+
+    archive = tmp_path / "backup.tar"
+    backup.export_metadata(archive, shard_size=1, workers=1)
+
+    _use_store(monkeypatch, tmp_path / "new")
+    monkeypatch.setenv("BLOBS_DIRECTORY", str(tmp_path / "new" / "blobs"))
+    asyncio.run(backup.import_metadata(archive, update_search_index=False))
+
+    by_id = metadata_store.by_id_directory()
+    a, b = (by_id / file_id / "read" / "text.txt" for file_id in ["a", "b"])
+    assert a.read_bytes() == b"shared transcript"
+    assert a.stat().st_ino == b.stat().st_ino
+    assert (by_id / "a" / "read" / blob_store.MANIFEST_FILENAME).exists()
+
+
+def test_import_rejects_paths_outside_the_store(monkeypatch, tmp_path: Path):
+    import gzip
+    import io
+    import tarfile
+
+    import pytest
+
+    from features.f2 import backup
+
+    _use_store(monkeypatch, tmp_path)
+    archive = tmp_path / "evil.tar"
+    record = {
+        "id": "x",
+        "document": {"id": "x", "paths": {"x": 1.0}},
+        "files": {"../../escaped.txt": "aGk="},
+    }
+    shard = gzip.compress(json.dumps(record).encode() + b"\n")
+    manifest = {"format": 2, "documents": 1, "shards": ["shards/0.jsonl.gz"]}
+    with tarfile.open(archive, "w") as tar:
+        for name, data in [
+            ("shards/0.jsonl.gz", shard),
+            ("manifest.json", json.dumps(manifest).encode()),
+        ]:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+
+    with pytest.raises(ValueError, match="unsafe path"):
+        asyncio.run(backup.import_metadata(archive, update_search_index=False))
+    assert not (tmp_path / "escaped.txt").exists()
@@ -0,0 +1,82 @@
+from pathlib import Path
+
+
+def _setup(monkeypatch, tmp_path: Path):
+    from features.f2 import blob_store
+
+    monkeypatch.setenv("BLOBS_DIRECTORY", str(tmp_path / "blobs"))
+    monkeypatch.setattr(blob_store, "MODULE_BLOB_MIN_BYTES", 4)
+    return blob_store
+
+
+def _module_dir(tmp_path: Path, file_id: str, text: str) -> Path:
+    path = tmp_path / "by-id" / file_id / "read"
+    path.mkdir(parents=True)
+    (path / "transcript.txt").write_text(text)
+    (path / "log.txt").write_text(text)
+    return path
+
+
+def test_dedupe_shares_identical_artifacts(monkeypatch, tmp_path):
+    bs = _setup(monkeypatch, tmp_path)
+    a = _module_dir(tmp_path, "a", "same words")
+    b = _module_dir(tmp_path, "b", "same words")
+
+    assert bs.dedupe_directory(a) == 0
+    assert bs.dedupe_directory(b) == len("same words")
+    assert bs.dedupe_directory(b) == 0
+    assert (a / "transcript.txt").stat().st_ino == (b / "transcript.txt").stat().st_ino
+    assert (a / "log.txt").stat().st_nlink == 1
+    assert (b / "transcript.txt").read_text() == "same words"
+
+    report = bs.report()
+    assert report["blobs"] == 1
+    assert report["references"] == 2
+    assert report["saved_bytes"] == len("same words")
+
+
+def test_unshare_breaks_links(monkeypatch, tmp_path):
+    bs = _setup(monkeypatch, tmp_path)
+    a = _module_dir(tmp_path, "a", "same words")
+    b = _module_dir(tmp_path, "b", "same words")
+    bs.dedupe_directory(a)
+    bs.dedupe_directory(b)
+
+    bs.unshare_directory(b)
+    (b / "transcript.txt").write_text("rewritten")
+    assert (a / "transcript.txt").read_text() == "same words"
+    assert (b / "transcript.txt").stat().st_nlink == 1
+
+
+def test_rerun_releases_blobs_of_replaced_output(monkeypatch, tmp_path):
+    bs = _setup(monkeypatch, tmp_path)
+    a = _module_dir(tmp_path, "a", "first words")
+    bs.dedupe_directory(a)
+
+    released = bs.unshare_directory(a)
+    (a / "transcript.txt").write_text("other words")
+    bs.dedupe_directory(a)
+
+    assert bs.released_digests(a) == released
+    assert bs.collect_garbage(released) == (1, len("first words"))
+    assert bs.released_digests(a) == set()
+    assert bs.report()["blobs"] == 1
+
+
+def test_collect_garbage_after_removal(monkeypatch, tmp_path):
+    import shutil
+
+    bs = _setup(monkeypatch, tmp_path)
+    a = _module_dir(tmp_path, "a", "same words")
+    b = _module_dir(tmp_path, "b", "same words")
+    bs.dedupe_directory(a)
+    bs.dedupe_directory(b)
+
+    digests = bs.referenced_digests(a.parent)
+    shutil.rmtree(a.parent)
+    assert bs.collect_garbage(digests) == (0, 0)
+
+    digests = bs.referenced_digests(b.parent)
+    shutil.rmtree(b.parent)
+    assert bs.collect_garbage(digests) == (1, len("same words"))
+    assert bs.report()["blobs"] == 0
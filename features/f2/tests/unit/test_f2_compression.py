@@ -0,0 +1,52 @@
+import gzip
+import json
+from pathlib import Path
+
+
+def test_plain_by_default(monkeypatch, tmp_path: Path):
+    from features.f2 import compression
+
+    monkeypatch.setattr(compression, "METADATA_COMPRESSION", "")
+    written = compression.write_json(tmp_path / "content.json", {"a": 1})
+    assert written == tmp_path / "content.json"
+    assert json.loads(written.read_text()) == {"a": 1}
+    assert compression.read_json(tmp_path / "content.json") == {"a": 1}
+
+
+def test_gzip_round_trip_replaces_plain(monkeypatch, tmp_path: Path):
+    from features.f2 import compression
+
+    path = tmp_path / "chunks.json"
+    path.write_text("[]")
+    monkeypatch.setattr(compression, "METADATA_COMPRESSION", "gzip")
+    monkeypatch.setattr(compression, "METADATA_COMPRESSION_MIN_BYTES", 0)
+    data = [{"text": "hello " * 100}]
+    written = compression.write_json(path, data)
+
+    assert written == tmp_path / "chunks.json.gz"
+    assert not path.exists()
+    assert json.loads(gzip.decompress(written.read_bytes())) == data
+    assert compression.exists(path)
+    assert compression.read_json(path) == data
+
+    compression.unlink(path)
+    assert not compression.exists(path)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_small_payloads_stay_plain(monkeypatch, tmp_path: Path):
+    from features.f2 import compression
+
+    monkeypatch.setattr(compression, "METADATA_COMPRESSION", "gzip")
+    monkeypatch.setattr(compression, "METADATA_COMPRESSION_MIN_BYTES", 1024)
+    written = compression.write_json(tmp_path / "version.json", {"version": 1})
+    assert written == tmp_path / "version.json"
+
+
+def test_read_missing_raises(tmp_path: Path):
+    import pytest
+
+    from features.f2 import compression
+
+    with pytest.raises(FileNotFoundError):
+        compression.read_json(tmp_path / "missing.json")
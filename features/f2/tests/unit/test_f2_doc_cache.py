@@ -0,0 +1,67 @@
+import json
+from pathlib import Path
+
+
+def _setup(monkeypatch, tmp_path: Path):
+    import features.f2.doc_cache as dc
+    import features.f2.metadata_store as ms
+    import features.f2.path_links as pl
+
+    monkeypatch.setenv("METADATA_DIRECTORY", str(tmp_path))
+    monkeypatch.setenv("BY_ID_DIRECTORY", str(tmp_path / "by-id"))
+    monkeypatch.setenv("BY_PATH_DIRECTORY", str(tmp_path / "by-path"))
+    dc.clear()
+    return dc, ms, pl
+
+
+def test_lru_cache_evicts_and_counts():
+    from features.f2.doc_cache import LRUCache
+
+    cache: LRUCache[str, int] = LRUCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    stats = cache.stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 1
+    assert stats["evictions"] == 1
+    assert stats["hit_rate"] == 2 / 3
+
+
+def test_read_doc_json_is_cached_and_invalidated_by_write(monkeypatch, tmp_path):
+    dc, ms, _ = _setup(monkeypatch, tmp_path)
+    doc_dir = tmp_path / "by-id" / "x"
+    doc_dir.mkdir(parents=True)
+    (doc_dir / "document.json").write_text(json.dumps({"id": "x", "v": 1}))
+
+    assert ms.read_doc_json("x")["v"] == 1
+    (doc_dir / "document.json").write_text(json.dumps({"id": "x", "v": 2}))
+    cached = ms.read_doc_json("x")
+    assert cached["v"] == 1
+    cached["v"] = 99
+    assert ms.read_doc_json("x")["v"] == 1
+    assert dc.stats()["docs_by_id"]["hits"] == 2
+
+    ms.write_doc_json({"id": "x", "v": 3})
+    assert ms.read_doc_json("x")["v"] == 3
+
+    ms.remove_doc("x")
+    assert ms.read_doc_json("x") is None
+    assert not doc_dir.exists()
+
+
+def test_resolve_id_follows_link_updates(monkeypatch, tmp_path):
+    dc, _, pl = _setup(monkeypatch, tmp_path)
+    assert pl.resolve_id("a.txt") is None
+    pl.link_path("a.txt", "1")
+    dc.clear()
+    assert pl.resolve_id("a.txt") == "1"
+    assert pl.resolve_id("a.txt") == "1"
+    assert dc.stats()["ids_by_path"]["hits"] == 1
+    pl.link_path("a.txt", "2")
+    assert pl.resolve_id("a.txt") == "2"
+    pl.unlink_path("a.txt")
+    assert pl.resolve_id("a.txt") is None
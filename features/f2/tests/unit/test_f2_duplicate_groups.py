@@ -0,0 +1,21 @@
+def test_incremental_updates(monkeypatch, tmp_path):
+    from features.f2 import duplicate_groups as dg
+
+    monkeypatch.setenv("METADATA_DIRECTORY", str(tmp_path))
+    assert not dg.is_built()
+    dg.rebuild([{"id": "a", "size": 5, "paths": {"x": 1, "y": 1}}])
+    assert dg.is_built()
+    assert dg.summary() == {"groups": 1, "redundant_copies": 1, "wasted_bytes": 5}
+
+    dg.update(
+        [
+            {"id": "a", "size": 5, "paths": {"x": 1}},
+            {"id": "b", "size": 7, "paths": {"p": 1, "q": 1, "r": 1}},
+        ]
+    )
+    groups = dg.list_groups()
+    assert [(g["id"], g["copies"], g["wasted"]) for g in groups] == [("b", 3, 14)]
+    assert dg.list_groups(min_wasted=15) == []
+
+    dg.remove(["b"])
+    assert dg.summary()["groups"] == 0
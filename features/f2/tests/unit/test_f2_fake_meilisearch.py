@@ -0,0 +1,184 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+
+from shared.fake_meilisearch import FakeMeilisearch, FakeMeilisearchError, parse_filter
+
+
+def _setup(monkeypatch, tmp_path: Path, shards: int = 1):
+    import importlib
+
+    from features.f2 import doc_cache, metadata_store, search_index
+
+    monkeypatch.setenv("METADATA_DIRECTORY", str(tmp_path))
+    monkeypatch.setenv("BY_ID_DIRECTORY", str(tmp_path / "by-id"))
+    doc_cache.clear()
+    metadata_store.ensure_directories()
+    importlib.reload(search_index)
+    fake = FakeMeilisearch()
+    monkeypatch.setattr(search_index, "AsyncClient", lambda *a, **k: fake)
+    monkeypatch.setattr(search_index, "MEILISEARCH_TASK_POLL_SECONDS", 0)
+    monkeypatch.setattr(search_index, "MEILISEARCH_SHARDS", shards)
+    asyncio.run(search_index.init_meili())
+    fake.reset_calls()
+    return search_index, fake
+
+
+@pytest.mark.parametrize(
+    "query, expected",
+    [
+        ('next = "m1"', ["a"]),
+        ("next = m1", ["a"]),
+        ("next != m1", ["b", "c"]),
+        ('file_id IN ["a", "c"]', ["a", "c"]),
+        ('file_id NOT IN ["a"]', ["b", "c"]),
+        ("size >= 2 AND size < 3", ["b"]),
+        ('(next = m1 OR next = m2) AND NOT file_id = "b"', ["a"]),
+        ('paths.path = "x/c.txt"', ["c"]),
+        ("next EXISTS", ["a", "b"]),
+    ],
+)
+def test_filters(query, expected):
+    docs = [
+        {"file_id": "a", "next": "m1", "size": 1},
+        {"file_id": "b", "next": "m2", "size": 2},
+        {"file_id": "c", "size": 3, "paths": [{"path": "x/c.txt"}]},
+    ]
+    predicate = parse_filter(query, ["file_id", "next", "size", "paths"])
+    assert [d["file_id"] for d in docs if predicate(d)] == expected
+
+
+def test_filter_on_non_filterable_attribute_is_rejected():
+    with pytest.raises(FakeMeilisearchError) as info:
+        parse_filter('module = "text"', ["file_id"])
+    assert info.value.code == "invalid_search_filter"
+
+
+def test_init_meili_configures_indexes(monkeypatch, tmp_path):
+    si, fake = _setup(monkeypatch, tmp_path)
+
+    settings = asyncio.run(fake.index("file_chunks").get_settings())
+    assert settings.filterable_attributes == ["file_id", "module"]
+    assert "e5-small" in settings.embedders
+    with pytest.raises(FakeMeilisearchError):
+        asyncio.run(fake.get_index("missing"))
+
+    # settings already match, so a second start only reads them
+    asyncio.run(si.init_meili())
+    assert not [name for name, _, _ in fake.calls if name.startswith("update_")]
+
+
+def test_search_index_round_trip(monkeypatch, tmp_path):
+    si, fake = _setup(monkeypatch, tmp_path)
+
+    docs = [
+        {"id": "a", "paths": {"a.txt": 1.0}, "next": "m1"},
+        {"id": "b", "paths": {"b.txt": 2.0}, "next": ""},
+    ]
+    asyncio.run(si.wait_for_tasks(asyncio.run(si.add_or_update_documents(docs))))
+    asyncio.run(
+        si.add_or_update_documents([{"id": "b", "next": "m1"}])
+    )  # partial update merges
+
+    pending = asyncio.run(si.get_all_pending_jobs("m1"))
+    assert sorted(d["id"] for d in pending) == ["a", "b"]
+    assert fake.documents("files")["b"]["paths"] == [{"path": "b.txt", "mtime": 2.0}]
+
+    chunks = [
+        {"id": "a-text-0", "file_id": "a", "module": "text"},
+        {"id": "b-text-0", "file_id": "b", "module": "text"},
+    ]
+    asyncio.run(si.add_or_update_chunk_documents(chunks))
+    asyncio.run(si.delete_chunk_docs_by_file_modules([("a", "text")]))
+    assert list(fake.documents("file_chunks")) == ["b-text-0"]
+
+    async def ids():
+        return [doc_id async for doc_id in si.iter_document_ids(batch_size=2)]
+
+    fake.reset_calls()
+    assert asyncio.run(ids()) == ["a", "b"]
+    assert fake.count("get_documents", "files") == 3
+
+
+def test_sharded_index_routes_by_id_and_searches_every_shard(monkeypatch, tmp_path):
+    si, fake = _setup(monkeypatch, tmp_path, shards=3)
+
+    assert si.file_index_uids() == ["files_0_of_3", "files_1_of_3", "files_2_of_3"]
+    assert "files" not in fake._indexes
+    docs = [
+        {"id": f"h{i}", "paths": {f"notes/{i}.txt": 1.0}, "next": "m1"}
+        for i in range(12)
+    ]
+    asyncio.run(si.add_or_update_documents(docs))
+
+    stored = {uid: set(fake.documents(uid)) for uid in si.file_index_uids()}
+    assert all(stored.values())
+    for uid, ids in stored.items():
+        assert all(si.shard_uid(doc_id) == uid for doc_id in ids)
+    assert asyncio.run(si.get_document_count()) == 12
+    assert asyncio.run(si.get_document("h5"))["paths"] == {"notes/5.txt": 1.0}
+    assert len(asyncio.run(si.get_all_pending_jobs("m1"))) == 12
+
+    asyncio.run(si.delete_docs_by_id(["h0", "h1"]))
+
+    fake.reset_calls()
+    result = asyncio.run(si.search("notes", limit=5, offset=5))
+    assert fake.count("multi_search") == 1
+    assert result["estimated_total_hits"] == 10
+    assert len(result["hits"]) == 5
+    assert "notes/" in next(iter(result["hits"][0]["paths"]))
+
+
+def test_get_indexed_fields_reads_only_requested_ids(monkeypatch, tmp_path):
+    si, fake = _setup(monkeypatch, tmp_path, shards=2)
+    docs = [{"id": f"h{i}", "version": 1, "size": i} for i in range(4)]
+    asyncio.run(si.add_or_update_documents(docs))
+    fake.reset_calls()
+
+    found = asyncio.run(si.get_indexed_fields(["h1", "h2", "missing"], ["version"]))
+
+    assert found == {"h1": {"id": "h1", "version": 1}, "h2": {"id": "h2", "version": 1}}
+    assert fake.count("get_documents") <= 2
+
+
+def test_failed_tasks_surface_through_wait_for_tasks(monkeypatch, tmp_path):
+    si, fake = _setup(monkeypatch, tmp_path)
+
+    task = asyncio.run(fake.index("files").delete_documents_by_filter("module = x"))
+
+    with pytest.raises(si.MeilisearchTaskError):
+        asyncio.run(si.wait_for_tasks([task.task_uid]))
+
+
+def test_sync_update_request_counts(monkeypatch, tmp_path):
+    si, fake = _setup(monkeypatch, tmp_path)
+    from features.f1 import sync
+
+    monkeypatch.setattr(sync, "search_index", si)
+    files = {f"h{i}": {"id": f"h{i}", "paths": {f"{i}.txt": 1.0}} for i in range(5)}
+    asyncio.run(si.add_or_update_documents([{"id": "gone"}]))
+    fake.reset_calls()
+
+    asyncio.run(sync.update_meilisearch({}, files))
+
+    assert set(fake.documents("files")) == set(files)
+    assert fake.count("update_documents", "files") == 1
+    assert fake.count("delete_documents", "files") == 1
+    assert fake.count("delete_documents_by_filter", "file_chunks") == 1
+    assert fake.count("get_task") == 3
+
+
+def test_swap_exchanges_index_contents():
+    fake = FakeMeilisearch()
+
+    async def run():
+        await fake.create_index("live", primary_key="id")
+        await fake.index("live").update_documents([{"id": "old"}])
+        await fake.index("live__next").update_documents([{"id": "new"}])
+        await fake.swap_indexes([("live", "live__next")])
+
+    asyncio.run(run())
+
+    assert list(fake.documents("live")) == ["new"]
+    assert list(fake.documents("live__next")) == ["old"]
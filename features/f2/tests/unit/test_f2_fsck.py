@@ -0,0 +1,85 @@
+import asyncio
+import os
+from pathlib import Path
+
+
+def _use_store(monkeypatch, root: Path):
+    from features.f2 import doc_cache, metadata_store, path_links
+
+    monkeypatch.setenv("METADATA_DIRECTORY", str(root))
+    monkeypatch.setenv("BY_ID_DIRECTORY", str(root / "by-id"))
+    monkeypatch.setenv("BY_PATH_DIRECTORY", str(root / "by-path"))
+    monkeypatch.setenv("BLOBS_DIRECTORY", str(root / "blobs"))
+    doc_cache.clear()
+    metadata_store.ensure_directories()
+    path_links.ensure_directories()
+    return metadata_store, path_links
+
+
+def _broken_store(monkeypatch, tmp_path: Path):
+    ms, pl = _use_store(monkeypatch, tmp_path)
+    ms.write_doc_json({"id": "a", "paths": {"a.txt": 1.0, "copy/a.txt": 1.0}})
+    (ms.by_id_directory() / "a" / "read").mkdir()
+    (ms.by_id_directory() / "a" / "gone").mkdir()
+    pl.link_path("a.txt", "a")
+    pl.link_path("old/a.txt", "a")
+    pl.link_path("deleted.txt", "b")
+    (ms.by_id_directory() / "b").mkdir()
+    return ms, pl
+
+
+def test_check_store_reports_issues(monkeypatch, tmp_path):
+    from features.f2 import fsck
+
+    _broken_store(monkeypatch, tmp_path)
+    docs, issues = fsck.check_store(module_names=["read"], workers=2)
+
+    assert set(docs) == {"a"}
+    assert issues["missing_document"] == ["b"]
+    assert issues["orphan_module_dir"] == ["a/gone"]
+    assert issues["dangling_link"] == ["deleted.txt"]
+    assert issues["stale_link"] == [os.path.join("old", "a.txt")]
+    assert issues["missing_link"] == ["copy/a.txt"]
+
+
+def test_repair_store_fixes_issues(monkeypatch, tmp_path):
+    from features.f2 import fsck
+
+    ms, pl = _broken_store(monkeypatch, tmp_path)
+    issues = asyncio.run(
+        fsck.run_fsck(repair=True, module_names=["read"], include_index=False)
+    )
+    assert issues["missing_document"] == ["b"]
+
+    _, after = fsck.check_store(module_names=["read"])
+    assert not any(after.values())
+    assert not (ms.by_id_directory() / "b").exists()
+    assert (ms.by_id_directory() / "a" / "read").exists()
+    assert not (pl.by_path_directory() / "old").exists()
+    assert pl.resolve_id("copy/a.txt") == "a"
+
+
+def test_check_index_compares_ids(monkeypatch, tmp_path):
+    from features.f2 import fsck, search_index
+
+    async def fake_ids():
+        for doc_id in ["a", "z"]:
+            yield doc_id
+
+    monkeypatch.setattr(search_index, "iter_document_ids", fake_ids)
+    issues = fsck._empty_issues()
+    asyncio.run(fsck.check_index({"a": {}, "b": {}}, issues))
+    assert issues["index_only"] == ["z"]
+    assert issues["store_only"] == ["b"]
+
+
+def test_no_loaded_modules_skips_orphan_module_check(monkeypatch, tmp_path):
+    from features.f2 import fsck
+
+    ms, _ = _broken_store(monkeypatch, tmp_path)
+    issues = asyncio.run(
+        fsck.run_fsck(repair=True, module_names=[], include_index=False)
+    )
+
+    assert issues["orphan_module_dir"] == []
+    assert (ms.by_id_directory() / "a" / "gone").exists()
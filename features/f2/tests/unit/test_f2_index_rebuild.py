@@ -0,0 +1,236 @@
+import asyncio
+from pathlib import Path
+
+
+class DummyIndex:
+    def __init__(self, uid):
+        self.uid = uid
+        self.updated = []
+        self.deleted = []
+        self.dropped = False
+
+    async def update_documents(self, docs, compress=False):
+        self.updated.extend(docs)
+        return type("TaskInfo", (), {"task_uid": 1})()
+
+    async def delete_documents(self, ids=None):
+        self.deleted.extend(ids)
+        return type("TaskInfo", (), {"task_uid": 2})()
+
+    async def delete(self):
+        self.dropped = True
+        return type("TaskInfo", (), {"task_uid": 3})()
+
+
+class DummyClient:
+    def __init__(self):
+        self.indexes = {}
+        self.swapped = []
+
+    def index(self, uid):
+        return self.indexes.setdefault(uid, DummyIndex(uid))
+
+    async def swap_indexes(self, pairs):
+        self.swapped.extend(pairs)
+        return type("TaskInfo", (), {"task_uid": 4})()
+
+
+def _setup(monkeypatch, tmp_path: Path):
+    from features.f2 import doc_cache, metadata_store, search_index
+
+    monkeypatch.setenv("METADATA_DIRECTORY", str(tmp_path))
+    monkeypatch.setenv("BY_ID_DIRECTORY", str(tmp_path / "by-id"))
+    doc_cache.clear()
+    metadata_store.ensure_directories()
+    cli = DummyClient()
+    monkeypatch.setattr(search_index, "client", cli)
+    monkeypatch.setattr(search_index, "index", cli.index("files"))
+    monkeypatch.setattr(search_index, "MEILISEARCH_INDEX_NAME", "files")
+    monkeypatch.setattr(search_index, "MEILISEARCH_PATHS_SCHEMA", "list")
+
+    async def no_wait(task_uids):
+        pass
+
+    monkeypatch.setattr(search_index, "wait_for_tasks", no_wait)
+    return search_index, metadata_store, cli
+
+
+def test_writes_are_mirrored_into_shadow_while_rebuilding(monkeypatch, tmp_path):
+    si, _, cli = _setup(monkeypatch, tmp_path)
+
+    asyncio.run(si.add_or_update_documents([{"id": "a"}]))
+    assert "files__next" not in cli.indexes
+
+    si.save_rebuild_state({"files": {"last_id": "", "scanned": 0}})
+    asyncio.run(si.add_or_update_documents([{"id": "b", "paths": {"b": 1.0}}]))
+    asyncio.run(si.delete_docs_by_id(["a"]))
+
+    shadow = cli.indexes["files__next"]
+    assert shadow.updated == [{"id": "b", "paths": [{"path": "b", "mtime": 1.0}]}]
+    assert shadow.deleted == ["a"]
+    assert [d["id"] for d in cli.indexes["files"].updated] == ["a", "b"]
+
+
+def test_rebuild_index_streams_store_and_swaps(monkeypatch, tmp_path):
+    si, ms, cli = _setup(monkeypatch, tmp_path)
+    from features.f2 import index_rebuild
+
+    for file_id in ["a", "b", "c"]:
+        ms.write_doc_json({"id": file_id, "paths": {f"{file_id}.txt": 1.0}})
+    si.save_rebuild_state({"files": {"last_id": "a", "scanned": 1}})
+
+    asyncio.run(index_rebuild.rebuild_index("files", batch_size=1))
+
+    assert [d["id"] for d in cli.indexes["files__next"].updated] == ["b", "c"]
+    assert cli.swapped == [("files", "files__next")]
+    assert cli.indexes["files__next"].dropped
+    assert si.load_rebuild_state() == {}
+
+
+def _setup_restore(monkeypatch, tmp_path: Path):
+    import importlib
+
+    from features.f2 import doc_cache, index_rebuild, metadata_store, search_index
+    from features.f5 import chunk_utils
+    from shared.fake_meilisearch import FakeMeilisearch
+
+    monkeypatch.setenv("METADATA_DIRECTORY", str(tmp_path))
+    monkeypatch.setenv("BY_ID_DIRECTORY", str(tmp_path / "by-id"))
+    doc_cache.clear()
+    metadata_store.ensure_directories()
+    importlib.reload(search_index)
+    fake = FakeMeilisearch()
+    monkeypatch.setattr(search_index, "AsyncClient", lambda *a, **k: fake)
+    monkeypatch.setattr(search_index, "MEILISEARCH_TASK_POLL_SECONDS", 0)
+    asyncio.run(search_index.init_meili())
+    for file_id in ["a", "b", "c"]:
+        metadata_store.write_doc_json({"id": file_id, "paths": {file_id: 1.0}})
+        module_dir = metadata_store.by_id_directory() / file_id / "text"
+        module_dir.mkdir()
+        chunk_utils.write_chunk_docs(
+            module_dir, [{"id": f"{file_id}-0", "file_id": file_id, "module": "text"}]
+        )
+    monkeypatch.setattr(
+        index_rebuild, "_rechunk", lambda doc: (_ for _ in ()).throw(AssertionError)
+    )
+    fake.reset_calls()
+    return index_rebuild, search_index, fake
+
+
+def test_restore_indexes_refills_from_store_without_rechunking(monkeypatch, tmp_path):
+    index_rebuild, search_index, fake = _setup_restore(monkeypatch, tmp_path)
+
+    sent = asyncio.run(index_rebuild.restore_indexes(batch_size=2, concurrency=2))
+
+    assert sent == {"documents": 3, "chunks": 3}
+    assert sorted(fake.documents("files")) == ["a", "b", "c"]
+    assert sorted(fake.documents("file_chunks")) == ["a-0", "b-0", "c-0"]
+    assert fake.count("swap_indexes") == 2
+    assert fake.count("update_documents", "files__next") == 2
+    assert search_index.load_rebuild_state() == {}
+
+
+def test_restore_and_background_rebuild_keep_to_their_own_shadows(
+    monkeypatch, tmp_path
+):
+    index_rebuild, search_index, fake = _setup_restore(monkeypatch, tmp_path)
+
+    # an interrupted restore is finished from stored chunks, not rechunked
+    asyncio.run(search_index.start_rebuild("file_chunks", owner="restore"))
+    asyncio.run(index_rebuild.rebuild_index("file_chunks"))
+    assert sorted(fake.documents("file_chunks")) == ["a-0", "b-0", "c-0"]
+
+    # a settings rebuild of the chunks is left to the background rebuild
+    asyncio.run(search_index.start_rebuild("file_chunks"))
+    sent = asyncio.run(index_rebuild.restore_indexes())
+    assert sent == {"documents": 3, "chunks": 0}
+    assert sorted(fake.documents("files")) == ["a", "b", "c"]
+    state = search_index.load_rebuild_state()
+    assert list(state) == ["file_chunks"]
+    assert state["file_chunks"]["owner"] == "rebuild"
+
+
+def test_service_keeps_off_shadows_of_a_running_restore(monkeypatch, tmp_path):
+    import pytest
+
+    index_rebuild, search_index, fake = _setup_restore(monkeypatch, tmp_path)
+
+    asyncio.run(search_index.start_rebuild("file_chunks", owner="restore"))
+    with index_rebuild.restore_lease() as held:
+        assert held
+        asyncio.run(index_rebuild.rebuild_index("file_chunks"))
+        with pytest.raises(RuntimeError):
+            asyncio.run(index_rebuild.restore_indexes())
+        asyncio.run(search_index.swap_rebuild("file_chunks"))
+    assert fake.count("update_documents", "file_chunks__next") == 0
+    assert fake.count("swap_indexes") == 0
+    assert search_index.load_rebuild_state()["file_chunks"]["owner"] == "restore"
+
+
+def test_reshard_fills_new_layout_then_switches_reads(monkeypatch, tmp_path):
+    import importlib
+
+    from features.f2 import doc_cache, index_rebuild, metadata_store, search_index
+    from shared.fake_meilisearch import FakeMeilisearch
+
+    monkeypatch.setenv("METADATA_DIRECTORY", str(tmp_path))
+    monkeypatch.setenv("BY_ID_DIRECTORY", str(tmp_path / "by-id"))
+    doc_cache.clear()
+    metadata_store.ensure_directories()
+    importlib.reload(search_index)
+    fake = FakeMeilisearch()
+    monkeypatch.setattr(search_index, "AsyncClient", lambda *a, **k: fake)
+    monkeypatch.setattr(search_index, "MEILISEARCH_TASK_POLL_SECONDS", 0)
+    monkeypatch.setattr(search_index, "MEILISEARCH_SHARDS", 1)
+    asyncio.run(search_index.init_meili())
+    docs = [{"id": f"h{i}", "paths": {f"{i}.txt": 1.0}} for i in range(6)]
+    for doc in docs:
+        metadata_store.write_doc_json(doc)
+    asyncio.run(search_index.add_or_update_documents(docs))
+
+    monkeypatch.setattr(search_index, "MEILISEARCH_SHARDS", 2)
+    asyncio.run(search_index.init_meili())
+    new = search_index.shard_uids(2)
+    assert search_index.file_index_uids() == ["files"]
+    assert all(fake.documents(uid) == {} for uid in new)
+
+    # writes reach both layouts while the new one fills
+    late = {"id": "late", "paths": {"late.txt": 1.0}}
+    metadata_store.write_doc_json(late)
+    asyncio.run(search_index.add_or_update_documents([late]))
+    assert "late" in fake.documents(search_index.shard_uid("late", 2))
+
+    asyncio.run(index_rebuild.reshard(batch_size=4))
+
+    assert search_index.file_index_uids() == new
+    assert "files" not in fake._indexes
+    assert sorted(id for uid in new for id in fake.documents(uid)) == sorted(
+        [d["id"] for d in docs] + ["late"]
+    )
+    assert "reshard" not in search_index.load_index_schema_state()
+    assert asyncio.run(search_index.get_document("h3"))["paths"] == {"3.txt": 1.0}
+
+
+def test_rebuild_in_background_only_survives_retryable_errors(monkeypatch, tmp_path):
+    import pytest
+
+    si, _, _ = _setup(monkeypatch, tmp_path)
+    from features.f2 import index_rebuild
+
+    si.save_rebuild_state({"files": {"last_id": "", "scanned": 0}})
+    failures = iter([OSError("meili volume"), RuntimeError("bug")])
+
+    async def failing_rebuild(uid):
+        raise next(failures)
+
+    async def no_reshard():
+        pass
+
+    async def no_sleep(seconds):
+        pass
+
+    monkeypatch.setattr(index_rebuild, "rebuild_index", failing_rebuild)
+    monkeypatch.setattr(index_rebuild, "reshard", no_reshard)
+    monkeypatch.setattr(index_rebuild.asyncio, "sleep", no_sleep)
+    with pytest.raises(RuntimeError, match="bug"):
+        asyncio.run(index_rebuild.rebuild_in_background())
@@ -0,0 +1,150 @@
+import asyncio
+
+import httpx
+import pytest
+
+
+def _client(monkeypatch, statuses):
+    from features.f2 import meili_http
+
+    calls = []
+    replies = iter(statuses)
+
+    def handler(request):
+        calls.append((request.method, request.url.path))
+        return httpx.Response(next(replies), json={"ok": True})
+
+    async def no_sleep(delay):
+        pass
+
+    monkeypatch.setattr(meili_http.asyncio, "sleep", no_sleep)
+    monkeypatch.setattr(meili_http, "_stats", {})
+    transport = meili_http.RetryTransport(httpx.MockTransport(handler))
+    client = httpx.AsyncClient(base_url="http://meili", transport=transport)
+    return meili_http, client, calls
+
+
+def test_endpoint_templates_uids_and_ids():
+    from features.f2.meili_http import endpoint
+
+    assert endpoint("GET", "/indexes/files/documents/abc") == (
+        "GET /indexes/{uid}/documents/{id}"
+    )
+    assert endpoint("POST", "/indexes/files/documents") == (
+        "POST /indexes/{uid}/documents"
+    )
+    assert endpoint("GET", "/tasks/42") == "GET /tasks/{uid}"
+
+
+def test_retries_unavailable_then_succeeds(monkeypatch):
+    mh, client, calls = _client(monkeypatch, [503, 429, 200])
+
+    response = asyncio.run(client.post("/indexes/files/documents", json=[{"id": 1}]))
+
+    assert response.status_code == 200
+    assert len(calls) == 3
+    stats = mh.snapshot()["POST /indexes/{uid}/documents"]
+    assert stats["requests"] == 3
+    assert stats["retries"] == 2
+    assert stats["sent_bytes"] > 0
+
+
+def test_bad_gateway_is_only_retried_for_idempotent_methods(monkeypatch):
+    _, client, calls = _client(monkeypatch, [502, 200])
+    assert asyncio.run(client.post("/indexes/files/search")).status_code == 502
+    assert len(calls) == 1
+
+    _, client, calls = _client(monkeypatch, [502, 200])
+    assert asyncio.run(client.get("/tasks/1")).status_code == 200
+    assert len(calls) == 2
+
+
+def test_gives_up_after_configured_retries(monkeypatch):
+    mh, client, calls = _client(monkeypatch, [503] * 10)
+    monkeypatch.setattr(mh, "MEILISEARCH_RETRIES", 2)
+
+    assert asyncio.run(client.get("/health")).status_code == 503
+    assert len(calls) == 3
+
+
+def test_connect_errors_are_retried(monkeypatch):
+    from features.f2 import meili_http
+
+    attempts = []
+
+    def handler(request):
+        attempts.append(request)
+        if len(attempts) == 1:
+            raise httpx.ConnectError("refused", request=request)
+        return httpx.Response(200)
+
+    async def no_sleep(delay):
+        pass
+
+    monkeypatch.setattr(meili_http.asyncio, "sleep", no_sleep)
+    monkeypatch.setattr(meili_http, "_stats", {})
+    transport = meili_http.RetryTransport(httpx.MockTransport(handler))
+    client = httpx.AsyncClient(base_url="http://meili", transport=transport)
+
+    assert asyncio.run(client.post("/indexes/files/documents")).status_code == 200
+    assert meili_http.snapshot()["POST /indexes/{uid}/documents"]["errors"] == 1
+
+
+def test_stats_since_reports_only_new_requests(monkeypatch):
+    mh, client, _ = _client(monkeypatch, [200, 200])
+    asyncio.run(client.get("/tasks/1"))
+    before = mh.snapshot()
+    asyncio.run(client.get("/indexes/files/stats"))
+
+    delta = mh.stats_since(before)
+
+    assert list(delta) == ["GET /indexes/{uid}/stats"]
+    assert mh.format_stats(delta).startswith("1 requests: GET /indexes/{uid}/stats")
+
+
+@pytest.mark.parametrize("attempt", [0, 3, 20])
+def test_backoff_is_capped(attempt):
+    from features.f2 import meili_http
+
+    assert 0 <= meili_http._backoff(attempt) <= meili_http.MEILISEARCH_RETRY_MAX_SECONDS
+
+
+def _sdk_client(json_handler="json"):
+    from meilisearch_python_sdk._http_requests import AsyncHttpRequests
+
+    sdk = type("AsyncClient", (), {})()
+    sdk.http_client = httpx.AsyncClient(base_url="http://meili")
+    sdk.json_handler = json_handler
+    sdk._http_requests = AsyncHttpRequests(sdk.http_client, json_handler=json_handler)
+    return sdk
+
+
+def test_install_replaces_and_closes_the_sdk_client():
+    from features.f2 import meili_http
+
+    sdk = _sdk_client()
+    old = sdk.http_client
+
+    async def run():
+        meili_http.install(sdk, "http://meili")
+        await asyncio.gather(*meili_http._closing)
+
+    asyncio.run(run())
+    assert old.is_closed
+    assert isinstance(sdk.http_client._transport, meili_http.RetryTransport)
+    assert sdk._http_requests.http_client is sdk.http_client
+    assert sdk._http_requests.json_handler == "json"
+
+    sdk = _sdk_client()
+    old = sdk.http_client
+    meili_http.install(sdk, "http://meili")
+    assert old.is_closed
+
+
+def test_install_fails_loudly_on_unknown_sdk_layout():
+    from features.f2 import meili_http
+
+    sdk = _sdk_client()
+    sdk._http_requests = object()
+    with pytest.raises(RuntimeError, match="update meili_http.install"):
+        meili_http.install(sdk, "http://meili")
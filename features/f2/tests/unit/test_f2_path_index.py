@@ -0,0 +1,158 @@
+def _docs():
+    return [
+        {"id": "a", "size": 5, "type": "image/jpeg", "paths": {"Photos/2019/a.jpg": 1}},
+        {
+            "id": "b",
+            "size": 7,
+            "type": "image/jpeg",
+            "paths": {"Photos/2019/trip/b.jpg": 2, "Photos/2019-old/b.jpg": 2},
+        },
+        {"id": "c", "size": 11, "type": "text/plain", "paths": {"notes.txt": 3}},
+    ]
+
+
+def test_directory_listing_and_summary(monkeypatch, tmp_path):
+    from features.f2 import path_index as pi
+
+    monkeypatch.setenv("METADATA_DIRECTORY", str(tmp_path))
+    assert not pi.is_built()
+    pi.rebuild(_docs())
+    assert pi.is_built()
+
+    root = pi.list_directory()
+    assert [(e["kind"], e["name"]) for e in root["results"]] == [
+        ("directory", "Photos"),
+        ("file", "notes.txt"),
+    ]
+    assert root["next"] is None
+    photos = pi.list_directory("Photos/")["results"]
+    assert [e["name"] for e in photos] == ["2019-old", "2019"]
+    listing = pi.list_directory("Photos/2019")["results"]
+    assert [(e["kind"], e["name"]) for e in listing] == [
+        ("file", "a.jpg"),
+        ("directory", "trip"),
+    ]
+    assert listing[0]["id"] == "a" and listing[0]["size"] == 5
+
+    # "2019-old" sorts between "2019" and "2019/", so it is outside the range
+    assert pi.summary("Photos/2019")["files"] == 2
+    assert pi.summary("Photos/2019")["bytes"] == 12
+    assert listing[1]["files"] == 1 and listing[1]["bytes"] == 7
+    assert [f["path"] for f in pi.list_files("Photos")] == [
+        "Photos/2019-old/b.jpg",
+        "Photos/2019/a.jpg",
+        "Photos/2019/trip/b.jpg",
+    ]
+    assert [f["path"] for f in pi.list_files("Photos", after="Photos/2019/a.jpg")] == [
+        "Photos/2019/trip/b.jpg"
+    ]
+
+
+def test_paging_skips_listed_subdirectories(monkeypatch, tmp_path):
+    from features.f2 import path_index as pi
+
+    monkeypatch.setenv("METADATA_DIRECTORY", str(tmp_path))
+    pi.rebuild(_docs())
+
+    first = pi.list_directory("Photos/2019", limit=1)
+    assert [e["name"] for e in first["results"]] == ["a.jpg"]
+    second = pi.list_directory("Photos/2019", limit=1, after=first["next"])
+    assert [e["name"] for e in second["results"]] == ["trip"]
+    assert second["next"] is None
+    page = pi.list_directory("Photos", limit=1, after="2019-old/")
+    assert [e["name"] for e in page["results"]] == ["2019"]
+
+
+def test_incremental_updates_move_paths_between_ids(monkeypatch, tmp_path):
+    from features.f2 import path_index as pi
+
+    monkeypatch.setenv("METADATA_DIRECTORY", str(tmp_path))
+    pi.rebuild(_docs())
+
+    # notes.txt changed content: it now belongs to "d" and "c" is gone
+    pi.update([{"id": "d", "size": 2, "type": "text/plain", "paths": {"notes.txt": 4}}])
+    pi.remove(["c"])
+    pi.update(
+        [{"id": "b", "size": 7, "type": "", "paths": {"Photos/2019-old/b.jpg": 2}}]
+    )
+
+    assert [f["id"] for f in pi.list_files()] == ["b", "a", "d"]
+    assert pi.summary()["bytes"] == 14
+
+
+def test_rollups(monkeypatch, tmp_path):
+    from features.f2 import path_index as pi
+
+    monkeypatch.setenv("METADATA_DIRECTORY", str(tmp_path))
+    docs = _docs()
+    docs[0]["next"] = "text"
+    pi.rebuild(docs)
+
+    assert pi.summary() == {
+        "files": 4,
+        "bytes": 30,
+        "unique_bytes": 23,
+        "pending": 1,
+        "types": {"image/jpeg": 3, "text/plain": 1},
+        "pending_modules": {"text": 1},
+    }
+    assert pi.summary("Photos")["unique_bytes"] == 12
+    assert pi.summary("missing")["files"] == 0
+    assert [d["path"] for d in pi.subdirectories("Photos")] == [
+        "Photos/2019",
+        "Photos/2019-old",
+    ]
+    assert pi.subdirectories("Photos", order="files")[0]["files"] == 2
+
+
+def test_incremental_rollups_match_a_rebuild(monkeypatch, tmp_path):
+    from features.f2 import local_db
+    from features.f2 import path_index as pi
+
+    def tables():
+        with local_db.connect(pi.DB_NAME, pi.SCHEMA) as conn:
+            return {
+                table: sorted(tuple(r) for r in conn.execute(f"SELECT * FROM {table}"))
+                for table in ("directories", "directory_counts", "directory_ids")
+            }
+
+    monkeypatch.setenv("METADATA_DIRECTORY", str(tmp_path))
+    pi.rebuild(_docs())
+    final = [
+        {
+            "id": "a",
+            "size": 5,
+            "type": "image/jpeg",
+            "next": "text",
+            "paths": {"Photos/2019/a.jpg": 1, "Photos/2019/trip/a.jpg": 1},
+        },
+        {"id": "d", "size": 2, "type": "text/plain", "paths": {"notes.txt": 4}},
+    ]
+    pi.update(final)
+    pi.remove(["b", "c"])
+    incremental = tables()
+
+    pi.rebuild(final)
+    assert incremental == tables()
+    assert pi.summary("Photos/2019")["unique_bytes"] == 5
+
+
+def test_rebuild_streams_docs_and_keeps_the_last_copy_of_a_path(monkeypatch, tmp_path):
+    from features.f2 import path_index as pi
+
+    monkeypatch.setenv("METADATA_DIRECTORY", str(tmp_path))
+    docs = [
+        {"id": "a", "size": 5, "type": "image/jpeg", "paths": {"x/a.jpg": 1}},
+        {"id": "b", "size": 7, "type": "image/png", "paths": {"x/a.jpg": 2}},
+    ]
+    pi.rebuild(doc for doc in docs)
+
+    assert [f["id"] for f in pi.list_files()] == ["b"]
+    assert pi.summary("x") == {
+        "files": 1,
+        "bytes": 7,
+        "unique_bytes": 7,
+        "pending": 0,
+        "types": {"image/png": 1},
+        "pending_modules": {},
+    }
@@ -22,3 +22,47 @@ def test_link_and_unlink(monkeypatch, tmp_path: Path):
     pl.unlink_path("sub/file.txt")
     assert not link.exists()
     assert not (by_path / "sub").exists()
+
+
+def test_link_path_skips_correct_link(monkeypatch, tmp_path: Path):
+    import features.f2.path_links as pl
+
+    by_id = tmp_path / "by-id"
+    by_path = tmp_path / "by-path"
+    monkeypatch.setenv("BY_ID_DIRECTORY", str(by_id))
+    monkeypatch.setenv("BY_PATH_DIRECTORY", str(by_path))
+
+    assert pl.link_path("sub/file.txt", "123")
+    link = by_path / "sub" / "file.txt"
+    before = os.lstat(link).st_ino
+    assert not pl.link_path("sub/file.txt", "123")
+    assert os.lstat(link).st_ino == before
+
+    assert pl.link_path("sub/file.txt", "456")
+    assert os.readlink(link) == os.path.relpath(by_id / "456", link.parent)
+
+
+def test_unlink_without_prune_defers_cleanup(monkeypatch, tmp_path: Path):
+    import features.f2.path_links as pl
+
+    by_path = tmp_path / "by-path"
+    monkeypatch.setenv("BY_ID_DIRECTORY", str(tmp_path / "by-id"))
+    monkeypatch.setenv("BY_PATH_DIRECTORY", str(by_path))
+
+    pl.link_path("a/b/one.txt", "1")
+    pl.link_path("a/b/two.txt", "2")
+    pl.link_path("a/keep.txt", "3")
+
+    parents = {
+        pl.unlink_path("a/b/one.txt", prune=False),
+        pl.unlink_path("a/b/two.txt", prune=False),
+    }
+    assert (by_path / "a" / "b").is_dir()
+
+    assert pl.prune_empty_directories(parents) == 1
+    assert not (by_path / "a" / "b").exists()
+    assert (by_path / "a" / "keep.txt").is_symlink()
+
+    pl.unlink_path("a/keep.txt", prune=False)
+    assert pl.prune_empty_directories([by_path / "a"]) == 1
+    assert by_path.is_dir()
@@ -1,19 +1,35 @@
 import asyncio
+import json
+import os
+
 import pytest
 
 
+def _task(uid):
+    return type("TaskInfo", (), {"task_uid": uid})()
+
+
 class DummyIndex:
     def __init__(self):
         self.updated = []
         self.deleted = []
+        self.filters: list[str] = []
         self.documents: list[dict] = []
+        self.compress: list[bool] = []
         self.stats = type("Stats", (), {"number_of_documents": 3})()
 
-    async def update_documents(self, docs):
+    async def update_documents(self, docs, compress=False):
         self.updated.append(list(docs))
+        self.compress.append(compress)
+        return _task(len(self.updated))
 
     async def delete_documents(self, ids=None):
         self.deleted.append(list(ids))
+        return _task(100 + len(self.deleted))
+
+    async def delete_documents_by_filter(self, filter):
+        self.filters.append(filter)
+        return _task(200 + len(self.filters))
 
     async def get_stats(self):
         return self.stats
@@ -35,14 +51,14 @@ class DummyChunkIndex(DummyIndex):
 
 class DummyClient:
     def __init__(self):
-        self.calls = 0
+        self.task_statuses: dict[int, list[str]] = {}
 
-    async def get_tasks(self):
-        if self.calls == 0:
-            self.calls += 1
-            task = type("Task", (), {"status": "processing"})()
-            return type("Resp", (), {"results": [task]})()
-        return type("Resp", (), {"results": []})()
+    async def get_task(self, uid):
+        statuses = self.task_statuses[uid]
+        status = statuses.pop(0) if len(statuses) > 1 else statuses[0]
+        return type(
+            "Task", (), {"status": status, "type": "x", "error": {"code": "bad"}}
+        )()
 
 
 def setup(monkeypatch):
@@ -55,14 +71,16 @@ def setup(monkeypatch):
     monkeypatch.setattr(si, "chunk_index", cidx)
     monkeypatch.setattr(si, "client", cli)
     monkeypatch.setattr(si, "MEILISEARCH_BATCH_SIZE", 2)
+    monkeypatch.setattr(si, "_flushed", [])
     return si, idx, cidx, cli
 
 
 def test_add_and_delete_documents(monkeypatch):
     si, idx, _, _ = setup(monkeypatch)
-    asyncio.run(si.add_or_update_documents([{"id": 1}, {"id": 2}, {"id": 3}]))
+    uids = asyncio.run(si.add_or_update_documents([{"id": 1}, {"id": 2}, {"id": 3}]))
     assert idx.updated == [[{"id": 1}, {"id": 2}], [{"id": 3}]]
-    asyncio.run(si.delete_docs_by_id(["a", "b", "c"]))
+    assert uids == [1, 2]
+    assert asyncio.run(si.delete_docs_by_id(["a", "b", "c"])) == [101, 102]
     assert idx.deleted == [["a", "b"], ["c"]]
 
 
@@ -74,25 +92,259 @@ def test_chunk_document_operations(monkeypatch):
     assert cidx.deleted == [["x", "y"], ["z"]]
 
 
-def test_delete_chunk_docs_by_file_id(monkeypatch):
+def test_upserts_are_batched_by_serialized_size(monkeypatch):
     si, _, cidx, _ = setup(monkeypatch)
-    cidx.documents = [
-        {"id": "1", "file_id": "f1"},
-        {"id": "2", "file_id": "f2"},
-        {"id": "3", "file_id": "f1"},
+    monkeypatch.setattr(si, "MEILISEARCH_BATCH_SIZE", 100)
+    monkeypatch.setattr(si, "MEILISEARCH_BATCH_BYTES", 100)
+    monkeypatch.setattr(si, "MEILISEARCH_COMPRESS", True)
+    docs = [{"id": i, "text": "x" * 20} for i in range(4)] + [
+        {"id": 9, "text": "y" * 200}
     ]
-    asyncio.run(si.delete_chunk_docs_by_file_ids(["f1"]))
-    assert cidx.deleted == [["1", "3"]]
+    uids = asyncio.run(si.add_or_update_chunk_documents(docs))
+    assert [[d["id"] for d in b] for b in cidx.updated] == [[0, 1], [2, 3], [9]]
+    assert sorted(uids) == [1, 2, 3]
+    assert cidx.compress == [True, True, True]
+
+
+def test_upserts_limit_batches_in_flight(monkeypatch):
+    si, idx, _, _ = setup(monkeypatch)
+    monkeypatch.setattr(si, "MEILISEARCH_BATCH_SIZE", 1)
+    monkeypatch.setattr(si, "MEILISEARCH_MAX_CONCURRENT_BATCHES", 2)
+    state = {"active": 0, "peak": 0}
+
+    async def update_documents(docs, compress=False):
+        state["active"] += 1
+        state["peak"] = max(state["peak"], state["active"])
+        await asyncio.sleep(0)
+        state["active"] -= 1
+        return type("TaskInfo", (), {"task_uid": docs[0]["id"]})()
+
+    monkeypatch.setattr(idx, "update_documents", update_documents)
+    uids = asyncio.run(si.add_or_update_documents([{"id": i} for i in range(6)]))
+    assert uids == list(range(6))
+    assert state["peak"] == 2
+
+
+def test_delete_chunk_docs_by_file_id(monkeypatch):
+    si, _, cidx, _ = setup(monkeypatch)
+    monkeypatch.setattr(si, "MEILISEARCH_FILTER_BATCH_SIZE", 2)
+    asyncio.run(si.delete_chunk_docs_by_file_ids(["f1", "f3", "f2", "f1"]))
+    assert cidx.filters == ['file_id IN ["f1", "f2"]', 'file_id IN ["f3"]']
+    assert cidx.deleted == []
 
 
 def test_delete_chunk_docs_by_file_id_and_module(monkeypatch):
     si, _, cidx, _ = setup(monkeypatch)
-    cidx.documents = [
-        {"id": "1", "file_id": "f1", "module": "m1"},
-        {"id": "2", "file_id": "f1", "module": "m2"},
-    ]
     asyncio.run(si.delete_chunk_docs_by_file_id_and_module("f1", "m1"))
-    assert cidx.deleted == [["1"]]
+    assert cidx.filters == ['(module = "m1" AND file_id IN ["f1"])']
+
+
+def test_delete_chunk_docs_by_file_modules_batches_jobs(monkeypatch):
+    si, _, cidx, _ = setup(monkeypatch)
+    asyncio.run(
+        si.delete_chunk_docs_by_file_modules([("f1", "m1"), ("f2", "m1"), ("f1", "m2")])
+    )
+    assert cidx.filters == [
+        (
+            '(module = "m1" AND file_id IN ["f1", "f2"]) OR '
+            '(module = "m2" AND file_id IN ["f1"])'
+        )
+    ]
+
+
+def test_paths_are_indexed_as_a_list(monkeypatch):
+    si, idx, _, _ = setup(monkeypatch)
+    monkeypatch.setattr(si, "MEILISEARCH_PATHS_SCHEMA", "list")
+    doc = {"id": "1", "paths": {"b/c.txt": 2.0, "a.txt": 1.0}}
+    asyncio.run(si.add_or_update_documents([doc]))
+    indexed = idx.updated[0][0]
+    assert indexed["paths"] == [
+        {"path": "a.txt", "mtime": 1.0},
+        {"path": "b/c.txt", "mtime": 2.0},
+    ]
+    assert doc["paths"] == {"b/c.txt": 2.0, "a.txt": 1.0}
+    assert si.from_index_document(indexed) == doc
+
+    from features.f4 import modules as modules_f4
+
+    monkeypatch.setattr(
+        modules_f4,
+        "module_configs",
+        [{"name": "ocr", "searchable_attributes": ["ocr.text"]}],
+    )
+    settings = si.file_index_settings()
+    assert settings["searchable_attributes"] == ["paths.path", "type", "ocr.text"]
+    assert "paths" not in settings["sortable_attributes"]
+    modules_f4.module_configs.append({"name": "exif"})
+    assert si.file_index_settings()["searchable_attributes"] == ["*"]
+
+    monkeypatch.setattr(si, "MEILISEARCH_PATHS_SCHEMA", "object")
+    assert si.to_index_document(doc) is doc
+    settings = si.file_index_settings()
+    assert "paths" in settings["sortable_attributes"]
+    assert settings["searchable_attributes"] == ["*"]
+
+
+def test_reconcile_settings_sends_only_changes(monkeypatch):
+    si, idx, _, _ = setup(monkeypatch)
+    idx.uid = "files"
+    sent = []
+
+    def updater(key):
+        async def update(value):
+            sent.append((key, value))
+            return type("TaskInfo", (), {"task_uid": len(sent)})()
+
+        return update
+
+    for key in ("filterable", "sortable", "searchable"):
+        setattr(idx, f"update_{key}_attributes", updater(key))
+    current = type(
+        "Settings",
+        (),
+        {
+            "filterable_attributes": ["size", "id"],
+            "sortable_attributes": ["mtime"],
+            "searchable_attributes": ["type", "paths.path"],
+        },
+    )()
+    desired = {
+        "filterable_attributes": ["id", "size"],
+        "sortable_attributes": ["mtime"],
+        "searchable_attributes": ["paths.path", "type"],
+    }
+    uids = asyncio.run(si.reconcile_settings(idx, current, desired))
+    assert sent == [("searchable", ["paths.path", "type"])]
+    assert uids == [1]
+
+    current.searchable_attributes = ["paths.path", "type"]
+    assert asyncio.run(si.reconcile_settings(idx, current, desired)) == []
+
+
+def test_embedder_changed(monkeypatch):
+    import features.f2.search_index as si
+
+    embedder = type(
+        "Embedder",
+        (),
+        {
+            "model": si.chunk_utils.EMBED_MODEL_NAME,
+            "document_template": si.CHUNK_DOCUMENT_TEMPLATE,
+        },
+    )()
+    settings = type("Settings", (), {"embedders": {"e5-small": embedder}})()
+    assert not si._embedder_changed(settings)
+    embedder.model = "other"
+    assert si._embedder_changed(settings)
+    assert si._embedder_changed(type("Settings", (), {"embedders": None})())
+
+
+def test_buffer_coalesces_by_id_and_flushes_when_full(monkeypatch):
+    si, idx, _, _ = setup(monkeypatch)
+    monkeypatch.setattr(si, "_buffer", {})
+    monkeypatch.setattr(si, "MEILISEARCH_BUFFER_MAX_DOCS", 3)
+    monkeypatch.setattr(si, "MEILISEARCH_BATCH_SIZE", 100)
+
+    async def run():
+        assert await si.buffer_documents([{"id": "a", "next": "m1"}]) == []
+        await si.buffer_documents([{"id": "a", "next": "m2"}, {"id": "b"}])
+        assert idx.updated == []
+        assert await si.get_document("a") == {"id": "a", "next": "m2"}
+        await si.delete_docs_by_id(["b"])
+        await si.buffer_documents([{"id": "c"}])
+        uids = await si.buffer_documents([{"id": "d"}])
+        assert uids == [1]
+        assert await si.flush_documents() == []
+
+    asyncio.run(run())
+    assert idx.updated == [[{"id": "a", "next": "m2"}, {"id": "c"}, {"id": "d"}]]
+
+
+def test_changed_fields_and_partial_buffering(monkeypatch):
+    si, idx, _, _ = setup(monkeypatch)
+    monkeypatch.setattr(si, "_buffer", {})
+    previous = {"id": "a", "paths": {"x": 1.0}, "next": "m1", "old": 1}
+    current = {"id": "a", "paths": {"x": 1.0}, "next": "m2", "m1.text": "t"}
+    assert si.changed_fields(previous, current) == {
+        "id": "a",
+        "next": "m2",
+        "m1.text": "t",
+        "old": None,
+    }
+    assert si.changed_fields(None, current) == current
+
+    async def run():
+        await si.buffer_documents([{"id": "a", "next": "m2", "m1.text": "t"}])
+        await si.buffer_documents([{"id": "a", "next": "", "m2.text": "u"}])
+        # a direct write replaces only the fields it carries
+        await si.add_or_update_documents([{"id": "a", "next": "m3"}])
+        await si.flush_documents()
+
+    asyncio.run(run())
+    assert idx.updated == [
+        [{"id": "a", "next": "m3"}],
+        [{"id": "a", "m1.text": "t", "m2.text": "u"}],
+    ]
+
+
+def test_buffer_flushes_on_timer(monkeypatch):
+    si, idx, _, _ = setup(monkeypatch)
+    monkeypatch.setattr(si, "_buffer", {})
+    monkeypatch.setattr(si, "_buffer_timer", None)
+    monkeypatch.setattr(si, "MEILISEARCH_BUFFER_MAX_SECONDS", 0)
+
+    async def run():
+        await si.buffer_documents([{"id": "a"}])
+        await si.buffer_documents([{"id": "a", "size": 1}])
+        for _ in range(3):
+            await asyncio.sleep(0)
+
+    asyncio.run(run())
+    assert idx.updated == [[{"id": "a", "size": 1}]]
+
+
+def test_forked_child_starts_with_an_empty_buffer(monkeypatch):
+    si, _, _, _ = setup(monkeypatch)
+    monkeypatch.setattr(si, "_buffer", {"a": {"id": "a", "next": "m1"}})
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.write(write_fd, json.dumps(si._buffer).encode())
+        os._exit(0)
+    os.close(write_fd)
+    child_buffer = json.loads(os.read(read_fd, 1024))
+    os.close(read_fd)
+    os.waitpid(pid, 0)
+    assert child_buffer == {}
+    assert si._buffer == {"a": {"id": "a", "next": "m1"}}
+
+
+def test_pending_jobs_overlay_the_buffer(monkeypatch):
+    si, idx, _, _ = setup(monkeypatch)
+    idx.documents = [{"id": "1", "next": "m1"}, {"id": "2", "next": "m1"}]
+    monkeypatch.setattr(
+        si, "_buffer", {"1": {"id": "1", "next": "m2"}, "3": {"id": "3", "next": "m1"}}
+    )
+    jobs = asyncio.run(si.get_all_pending_jobs("m1"))
+    assert jobs == [{"id": "2", "next": "m1"}, {"id": "3", "next": "m1"}]
+
+
+def test_flushed_documents_stay_overlaid_until_indexed(monkeypatch):
+    si, idx, _, cli = setup(monkeypatch)
+    idx.documents = [{"id": "1", "next": "m1"}]
+    monkeypatch.setattr(si, "_buffer", {"1": {"id": "1", "next": "m2"}})
+    cli.task_statuses[1] = ["processing", "processing", "succeeded"]
+
+    async def run():
+        assert await si.flush_documents() == [1]
+        # the index still has the old ``next`` until task 1 is applied
+        assert await si.get_all_pending_jobs("m1") == []
+        assert await si.get_all_pending_jobs("m2") == [{"id": "1", "next": "m2"}]
+        idx.documents = [{"id": "1", "next": "m2"}]
+        assert await si.get_all_pending_jobs("m2") == [{"id": "1", "next": "m2"}]
+        assert si._flushed == []
+
+    asyncio.run(run())
 
 
 def test_getters(monkeypatch):
@@ -104,16 +356,64 @@ def test_getters(monkeypatch):
     assert asyncio.run(si.get_all_pending_jobs("run")) == [{"id": "1", "next": "run"}]
 
 
-def test_wait_for_meili_idle(monkeypatch):
+def test_iter_document_ids_splits_full_ranges(monkeypatch):
+    si, idx, _, _ = setup(monkeypatch)
+    ids = [f"{i:04x}" for i in range(37)]
+    requests = []
+
+    async def get_documents(offset=0, limit=10, fields=None, filter=None):
+        requests.append(filter)
+        assert fields == ["id"] and offset == 0
+        matches = list(reversed(ids))
+        for clause in (filter or "").split(" AND "):
+            if clause.startswith("id >= "):
+                matches = [i for i in matches if i >= clause[7:-1]]
+            elif clause.startswith("id < "):
+                matches = [i for i in matches if i < clause[6:-1]]
+        return type("Resp", (), {"results": [{"id": i} for i in matches[:limit]]})()
+
+    monkeypatch.setattr(idx, "get_documents", get_documents)
+
+    async def collect():
+        return [i async for i in si.iter_document_ids(batch_size=8)]
+
+    assert asyncio.run(collect()) == ids
+    assert requests[0] is None
+    assert len(requests) > 37 // 8
+
+
+def test_wait_for_tasks_polls_only_given_tasks(monkeypatch):
+    si, _, _, cli = setup(monkeypatch)
+    cli.task_statuses = {
+        1: ["enqueued", "processing", "succeeded"],
+        2: ["succeeded"],
+    }
+    delays = []
+
+    async def fake_sleep(seconds):
+        delays.append(seconds)
+
+    monkeypatch.setattr(si.asyncio, "sleep", fake_sleep)
+    asyncio.run(si.wait_for_tasks([1, 2, 1]))
+    assert delays == [si.MEILISEARCH_TASK_POLL_SECONDS] + [
+        min(si.MEILISEARCH_TASK_POLL_SECONDS * 2, si.MEILISEARCH_TASK_MAX_POLL_SECONDS)
+    ]
+    monkeypatch.setattr(si, "client", None)
+    asyncio.run(si.wait_for_tasks([]))
+
+
+def test_wait_for_tasks_raises_for_failed_and_slow_tasks(monkeypatch):
     si, _, _, cli = setup(monkeypatch)
-    sleep_calls = []
+    cli.task_statuses = {1: ["failed"], 2: ["processing"]}
 
     async def fake_sleep(_):
-        sleep_calls.append(1)
+        pass
 
     monkeypatch.setattr(si.asyncio, "sleep", fake_sleep)
-    asyncio.run(si.wait_for_meili_idle())
-    assert sleep_calls
+    with pytest.raises(si.MeilisearchTaskError):
+        asyncio.run(si.wait_for_tasks([1]))
+    with pytest.raises(TimeoutError):
+        asyncio.run(si.wait_for_tasks([2], timeout=0))
 
 
 def test_errors_when_not_initialised(monkeypatch):
@@ -127,4 +427,26 @@ def test_errors_when_not_initialised(monkeypatch):
         asyncio.run(si.add_or_update_chunk_documents([]))
     monkeypatch.setattr(si, "client", None)
     with pytest.raises(RuntimeError):
-        asyncio.run(si.wait_for_meili_idle())
+        asyncio.run(si.wait_for_tasks([1]))
+
+
+def test_index_schema_state_is_read_once_per_change(monkeypatch, tmp_path):
+    import features.f2.search_index as si
+
+    monkeypatch.setenv("METADATA_DIRECTORY", str(tmp_path))
+    assert si.load_index_schema_state() == {"paths_schema": "object"}
+    si._write_json(si.index_schema_path(), {"paths_schema": "list", "shards": 2})
+
+    loads = []
+    real_load = si.json.load
+    monkeypatch.setattr(si.json, "load", lambda f: loads.append(1) or real_load(f))
+    for _ in range(3):
+        assert si.serving_shard_count() == 2
+    assert len(loads) == 1
+
+    state = si.load_index_schema_state()
+    state["shards"] = 5
+    assert si.serving_shard_count() == 2
+    si._write_json(si.index_schema_path(), state)
+    assert si.serving_shard_count() == 5
+    assert len(loads) == 2
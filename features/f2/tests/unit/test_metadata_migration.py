@@ -18,3 +18,98 @@ def test_migrate_doc_adds_paths_list():
         "version": migrations.CURRENT_VERSION,
     }
     assert not migrations.migrate_doc(doc2)
+
+
+def _write_doc(by_id, doc):
+    import json
+
+    (by_id / doc["id"]).mkdir(parents=True)
+    (by_id / doc["id"] / "document.json").write_text(json.dumps(doc))
+
+
+def test_read_doc_json_migrates_in_memory(monkeypatch, tmp_path):
+    import json
+
+    from features.f2 import doc_cache, metadata_store, migrations
+
+    by_id = tmp_path / "by-id"
+    monkeypatch.setenv("BY_ID_DIRECTORY", str(by_id))
+    doc_cache.clear()
+    _write_doc(by_id, {"id": "1", "paths": {"a.txt": 1.0}})
+
+    doc = metadata_store.read_doc_json("1")
+    assert doc["version"] == migrations.CURRENT_VERSION
+    stored = json.loads((by_id / "1" / "document.json").read_text())
+    assert "version" not in stored
+
+
+def test_migrate_in_background_persists_and_resumes(monkeypatch, tmp_path):
+    import asyncio
+    import json
+
+    from features.f2 import doc_cache, migrations
+
+    by_id = tmp_path / "by-id"
+    monkeypatch.setenv("METADATA_DIRECTORY", str(tmp_path))
+    monkeypatch.setenv("BY_ID_DIRECTORY", str(by_id))
+    doc_cache.clear()
+    for file_id in ["a", "b", "c"]:
+        _write_doc(by_id, {"id": file_id, "paths": {f"{file_id}.txt": 1.0}})
+    migrations.save_migration_state(
+        {
+            "version": migrations.CURRENT_VERSION,
+            "last_id": "a",
+            "scanned": 1,
+            "migrated": 1,
+            "complete": False,
+        }
+    )
+
+    asyncio.run(migrations.migrate_in_background(batch_size=1, sleep_seconds=0))
+
+    def stored(file_id):
+        return json.loads((by_id / file_id / "document.json").read_text())
+
+    assert "version" not in stored("a")
+    assert stored("b")["version"] == migrations.CURRENT_VERSION
+    assert stored("c")["paths_list"] == ["c.txt"]
+    state = migrations.load_migration_state()
+    assert state["complete"]
+    assert state["scanned"] == 3
+    assert state["migrated"] == 3
+
+
+def test_migrate_stored_doc_keeps_concurrent_rewrite(monkeypatch, tmp_path):
+    import json
+    import threading
+
+    from features.f2 import doc_cache, metadata_store, migrations
+
+    by_id = tmp_path / "by-id"
+    monkeypatch.setenv("BY_ID_DIRECTORY", str(by_id))
+    doc_cache.clear()
+    _write_doc(by_id, {"id": "a", "paths": {"a.txt": 1.0}})
+    doc_path = by_id / "a" / "document.json"
+    newer = {
+        "id": "a",
+        "paths": {"b.txt": 2.0},
+        "paths_list": ["b.txt"],
+        "version": migrations.CURRENT_VERSION,
+    }
+    results = []
+    migrating = threading.Thread(
+        target=lambda: results.append(migrations.migrate_stored_doc("a"))
+    )
+
+    # a writer holding the lock is not overwritten by the older migrated copy
+    with metadata_store.doc_lock("a"):
+        migrating.start()
+        migrating.join(0.2)
+        assert migrating.is_alive()
+        doc_path.write_text(json.dumps(newer))
+    migrating.join()
+
+    assert results == [False]
+    assert json.loads(doc_path.read_text()) == newer
+    assert [p.name for p in (by_id / "a").iterdir()] == ["document.json"]
+    assert not migrations.migrate_stored_doc("missing")
@@ -1,5 +1,8 @@
-from .run_server import run_server
+from .run_server import json_exists, read_json, run_server, write_json
 
 __all__ = [
+    "json_exists",
+    "read_json",
     "run_server",
+    "write_json",
 ]
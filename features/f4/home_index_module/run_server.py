@@ -10,6 +10,8 @@ from pathlib import Path
 from typing import Any, Callable, Iterator, Mapping, Sequence, cast
 from urllib.parse import urlparse
 
+from features.f2 import blob_store, compression
+
 try:
     import redis
 except Exception:  # pragma: no cover - optional for tests
@@ -176,21 +178,23 @@ def metadata_dir_path_from_doc(document: Mapping[str, Any]) -> Path:
 
 
 def read_json(path: str | Path) -> Any:
-    path = Path(path)
-    with open(path, "r") as file:
-        return json.load(file)
+    """Load JSON from ``path`` whether it is stored plain or compressed."""
+    return compression.read_json(path)
 
 
 def write_json(path: str | Path, data: Any) -> None:
-    path = Path(path)
-    path.parent.mkdir(parents=True, exist_ok=True)
-    with open(path, "w") as file:
-        json.dump(data, file, indent=4)
+    """Write JSON to ``path``, compressed when ``METADATA_COMPRESSION`` is set."""
+    compression.write_json(path, data, indent=4)
+
+
+def json_exists(path: str | Path) -> bool:
+    """Return ``True`` if ``path`` exists plain or compressed."""
+    return compression.exists(path)
 
 
 def load_version(metadata_dir_path: str | Path) -> Any | None:
     version_path = Path(metadata_dir_path) / "version.json"
-    if version_path.exists():
+    if json_exists(version_path):
         return read_json(version_path)
     return None
 
@@ -433,6 +437,8 @@ def run_server(
             return True
         file_path = file_path_from_meili_doc(document)
         metadata_dir_path = metadata_dir_path_from_doc(document)
+        # artifacts may be hard links into the shared blob store
+        blob_store.unshare_directory(metadata_dir_path)
         with log_to_file_and_stdout(metadata_dir_path / "log.txt"):
             result = run_fn(file_path, document, metadata_dir_path)
         expiration = client.zscore(TIMEOUT_SET, key)
@@ -10,7 +10,13 @@ from pathlib import Path
 from typing import Any, Callable, Iterable, Mapping, MutableMapping, TypeVar, cast
 from urllib.parse import urlparse
 
-from features.f2 import search_index
+from features.f2 import (
+    blob_store,
+    meili_http,
+    metadata_store,
+    path_index,
+    search_index,
+)
 from features.f3.archive import doc_is_online, update_archive_flags
 from features.f5 import chunking
 
@@ -41,11 +47,7 @@ def ensure_directories() -> None:
 
 
 def write_doc_json(doc: MutableMapping[str, Any]) -> None:
-    ensure_directories()
-    target_dir = by_id_directory() / str(doc["id"])
-    target_dir.mkdir(parents=True, exist_ok=True)
-    with (target_dir / "document.json").open("w") as f:
-        json.dump(doc, f, indent=4, separators=(", ", ": "))
+    metadata_store.write_doc_json(doc)
 
 
 __all__ = [
@@ -177,7 +179,13 @@ def metadata_dir_relpath_from_doc(name: str, document: Mapping[str, Any]) -> Pat
     return path.relative_to(metadata_directory())
 
 
-async def update_doc_from_module(document: dict[str, Any]) -> dict[str, Any]:
+async def update_doc_from_module(
+    document: dict[str, Any], *, task_uids: list[int] | None = None
+) -> dict[str, Any]:
+    """Advance ``next`` and buffer an upsert of ``document``.
+
+    Task uids of a flush triggered by this call are added to ``task_uids``.
+    """
 
     next_name = ""
     current = document.get("next", "")
@@ -187,8 +195,15 @@ async def update_doc_from_module(document: dict[str, Any]) -> dict[str, Any]:
             next_name = module_values[idx + 1]["name"]
     document["next"] = next_name
     update_archive_flags(document)
+    previous = metadata_store.read_doc_json(document["id"])
     write_doc_json(document)
-    await search_index.add_or_update_documents([document])
+    # only the module's output and ``next`` travel, not the whole document
+    change = search_index.changed_fields(previous, document)
+    if len(change) == 1:
+        return document
+    uids = await search_index.buffer_documents([change])
+    if task_uids is not None:
+        task_uids.extend(uids)
     return document
 
 
@@ -205,26 +220,53 @@ def set_next_modules(
 
 
 async def process_done_queue(client: redis.Redis) -> bool:
-    processed = False
+    jobs: list[tuple[dict[str, Any], str, Any | None]] = []
     while True:
         result_json = client.lpop(DONE_QUEUE)
         if not result_json:
             break
-        processed = True
         result = json.loads(result_json)
         name = result.get("module", "")
         if isinstance(result, dict) and "document" in result:
-            content = result.get("content")
-            document = result["document"]
+            jobs.append((result["document"], name, result.get("content")))
         else:
-            document = result
-            content = None
-        if content is not None:
-            await chunking.add_content_chunks(document, name, content=content)
-        else:
-            await chunking.add_content_chunks(document, name)
-        await update_doc_from_module(document)
-    return processed
+            jobs.append((result, name, None))
+    if not jobs:
+        return False
+    requests_before = meili_http.snapshot()
+    # one filtered chunk delete for every job drained in this pass
+    task_uids = await chunking.add_content_chunks_batch(jobs)
+    for document, name, _ in jobs:
+        await update_doc_from_module(document, task_uids=task_uids)
+        if blob_store.MODULE_BLOB_STORE and name:
+            module_dir = by_id_directory() / document["id"] / name
+            if module_dir.is_dir():
+                saved = await asyncio.to_thread(blob_store.dedupe_directory, module_dir)
+                if saved:
+                    modules_logger.debug("blob store saved %d bytes", saved)
+                # blobs of the previous output are garbage unless the rerun
+                # produced them again or another document shares them
+                released = await asyncio.to_thread(
+                    blob_store.released_digests, module_dir
+                )
+                removed, freed = await asyncio.to_thread(
+                    blob_store.collect_garbage, released
+                )
+                if removed:
+                    modules_logger.debug(
+                        "blob store freed %d blobs, %d bytes", removed, freed
+                    )
+    # pending-module rollups follow the advanced ``next`` of each document
+    await asyncio.to_thread(path_index.update, [document for document, _, _ in jobs])
+    # chunk writes and any flush this pass triggered are indexed before the
+    # next pass; buffered ``next`` changes are overlaid on queue scans anyway
+    await search_index.wait_for_tasks(task_uids)
+    modules_logger.debug(
+        "done queue: %d jobs, meili %s",
+        len(jobs),
+        meili_http.format_stats(meili_http.stats_since(requests_before)),
+    )
+    return True
 
 
 def process_timeouts(client: redis.Redis) -> bool:
@@ -300,9 +342,6 @@ async def service_module_queue(
                 client.rpush(f"{name}:check", doc_json)
                 processed = True
 
-        if processed:
-            await search_index.wait_for_meili_idle()
-
         return processed
     except Exception as e:  # pragma: no cover - unexpected
         modules_logger.warning(f"failed: {str(e)}")
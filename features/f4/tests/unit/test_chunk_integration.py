@@ -23,15 +23,19 @@ def test_service_module_queue_processes_segment_content(monkeypatch):
 
     async def fake_add_chunks(docs):
         recorded["chunks"] = docs
+        return [7]
 
-    async def fake_update_doc(d):
+    async def fake_update_doc(d, task_uids):
         recorded["updated"] = d
+        # the update filled the write-behind buffer and flushed it
+        task_uids.append(8)
 
-    async def fake_delete(fid, mod):
-        recorded["deleted"] = (fid, mod)
+    async def fake_delete(pairs):
+        [recorded["deleted"]] = pairs
+        return [6]
 
-    async def fake_wait():
-        recorded["wait"] = True
+    async def fake_wait(task_uids):
+        recorded["wait"] = list(task_uids)
 
     class DummyRedis:
         def __init__(self):
@@ -113,10 +117,10 @@ def test_service_module_queue_processes_segment_content(monkeypatch):
     monkeypatch.setattr(modules_f4, "update_doc_from_module", fake_update_doc)
     monkeypatch.setattr(
         search_index,
-        "delete_chunk_docs_by_file_id_and_module",
+        "delete_chunk_docs_by_file_modules",
         fake_delete,
     )
-    monkeypatch.setattr(search_index, "wait_for_meili_idle", fake_wait)
+    monkeypatch.setattr(search_index, "wait_for_tasks", fake_wait)
     modules_f4.module_values = []
 
     result = asyncio.run(modules_f4.service_module_queue("mod", dummy, [doc]))
@@ -127,6 +131,7 @@ def test_service_module_queue_processes_segment_content(monkeypatch):
     assert recorded["lpop"]
     assert recorded["chunks"][0]["module"] == "mod"
     assert recorded["updated"]["id"] == doc["id"]
+    assert sorted(recorded["wait"]) == [6, 7, 8]
 
 
 def test_service_module_queue_handles_update_only(monkeypatch):
@@ -145,7 +150,7 @@ def test_service_module_queue_handles_update_only(monkeypatch):
 
     recorded = {}
 
-    async def fake_update_doc(d):
+    async def fake_update_doc(d, **_):
         recorded["updated"] = d
 
     class DummyRedis:
@@ -194,10 +199,10 @@ def test_service_module_queue_handles_update_only(monkeypatch):
         lambda docs: recorded.setdefault("chunks", docs),
     )
 
-    async def dummy_wait():
-        recorded["waited"] = True
+    async def dummy_wait(task_uids):
+        recorded["waited"] = task_uids
 
-    monkeypatch.setattr(search_index, "wait_for_meili_idle", dummy_wait)
+    monkeypatch.setattr(search_index, "wait_for_tasks", dummy_wait)
     modules_f4.module_values = []
 
     result = asyncio.run(modules_f4.service_module_queue("mod", dummy, [doc]))
@@ -232,14 +237,16 @@ def test_service_module_queue_processes_content(monkeypatch):
 
     recorded = {}
 
-    async def fake_update_doc(d):
+    async def fake_update_doc(d, **_):
         recorded["updated"] = d
 
     async def fake_chunks(docs):
         recorded["chunks"] = docs
+        return []
 
-    async def fake_delete(fid, mod):
-        recorded["deleted"] = (fid, mod)
+    async def fake_delete(pairs):
+        [recorded["deleted"]] = pairs
+        return []
 
     class DummyRedis:
         def __init__(self):
@@ -285,10 +292,14 @@ def test_service_module_queue_processes_content(monkeypatch):
     monkeypatch.setattr(search_index, "add_or_update_chunk_documents", fake_chunks)
     monkeypatch.setattr(
         search_index,
-        "delete_chunk_docs_by_file_id_and_module",
+        "delete_chunk_docs_by_file_modules",
         fake_delete,
     )
-    monkeypatch.setattr(search_index, "wait_for_meili_idle", lambda: None)
+
+    async def fake_wait(task_uids):
+        recorded["waited"] = task_uids
+
+    monkeypatch.setattr(search_index, "wait_for_tasks", fake_wait)
     modules_f4.module_values = []
 
     result = asyncio.run(modules_f4.service_module_queue("mod", dummy, [doc]))
@@ -326,8 +337,9 @@ def test_sync_content_files_generates_chunks(monkeypatch, tmp_path):
 
     async def fake_add_content_chunks(document, module):
         recorded["chunks"] = True
+        return []
 
-    async def fake_update(docu):
+    async def fake_update(docu, **_):
         recorded["updated"] = docu
 
     monkeypatch.setattr(chunking, "add_content_chunks", fake_add_content_chunks)
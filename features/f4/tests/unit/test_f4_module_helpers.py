@@ -110,9 +110,18 @@ def test_update_doc_from_module_updates_and_saves(
     asyncio.run(modules.update_doc_from_module(doc))
 
     assert doc["next"] == "m2"
+    assert "added" not in recorded
+    asyncio.run(search_index.flush_documents())
     assert recorded["added"]["id"] == "1"
+    assert recorded["added"]["next"] == "m2"
     assert recorded.get("flags") and recorded.get("written")
 
+    # nothing changed since the stored copy, so nothing is buffered
+    done = {"id": "2", "paths": {"b.txt": 1.0}, "next": ""}
+    monkeypatch.setattr(modules.metadata_store, "read_doc_json", lambda _id: done)
+    asyncio.run(modules.update_doc_from_module(dict(done)))
+    assert search_index._buffer == {}
+
 
 def test_modules_state_round_trip(
     monkeypatch: pytest.MonkeyPatch, tmp_path: Path
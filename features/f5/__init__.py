@@ -3,5 +3,6 @@
 from . import chunk_module
 from . import chunk_utils
 from . import chunking
+from . import near_duplicates
 
-__all__ = ["chunk_module", "chunk_utils", "chunking"]
+__all__ = ["chunk_module", "chunk_utils", "chunking", "near_duplicates"]
@@ -1,10 +1,9 @@
-import json
 import logging
 import os
 from pathlib import Path
 from typing import Any, Mapping
 
-from features.f4.home_index_module import run_server
+from features.f4.home_index_module import json_exists, read_json, run_server
 
 VERSION = 1
 # default the module name to QUEUE_NAME so returned metadata matches the
@@ -18,10 +17,9 @@ def check(
     """Return ``True`` if ``file_path`` should be processed."""
 
     content_path = metadata_dir_path / "content.json"
-    if content_path.exists():
+    if json_exists(content_path):
         try:
-            with content_path.open() as fh:
-                data = json.load(fh)
+            data = read_json(content_path)
             if data == file_path.read_text():
                 return False
         except Exception:
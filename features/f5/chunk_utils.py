@@ -5,6 +5,7 @@ import os
 from pathlib import Path
 from typing import Any, Iterable, Mapping, cast
 
+from features.f2 import compression
 
 EMBED_MODEL_NAME = os.environ.get("EMBED_MODEL_NAME", "intfloat/e5-small-v2")
 
@@ -13,6 +14,7 @@ __all__ = [
     "split_chunk_docs",
     "content_to_chunk_docs",
     "write_chunk_docs",
+    "read_chunk_docs",
     "CHUNK_FILENAME",
     "CONTENT_FILENAME",
 ]
@@ -158,12 +160,24 @@ def write_chunk_docs(
     chunk_docs: Iterable[Mapping[str, Any]],
     filename: str = CHUNK_FILENAME,
 ) -> Path:
-    """Write ``chunk_docs`` to ``filename`` and return the path."""
-    path = Path(metadata_dir_path) / filename
-    path.parent.mkdir(parents=True, exist_ok=True)
-    with path.open("w") as fh:
-        json.dump(list(chunk_docs), fh, indent=4)
-    return path
+    """Write ``chunk_docs`` to ``filename`` and return the path written.
+
+    The file is compressed when ``METADATA_COMPRESSION`` is enabled, in which
+    case the returned path carries the compression suffix.
+    """
+    return compression.write_json(
+        Path(metadata_dir_path) / filename, list(chunk_docs), indent=4
+    )
+
+
+def read_chunk_docs(
+    metadata_dir_path: Path, filename: str = CHUNK_FILENAME
+) -> list[dict[str, Any]]:
+    """Return chunk documents stored by :func:`write_chunk_docs`."""
+    return cast(
+        list[dict[str, Any]],
+        compression.read_json(Path(metadata_dir_path) / filename),
+    )
 
 
 # chunk settings persistence
@@ -1,10 +1,21 @@
 from __future__ import annotations
 
+import asyncio
 import json
-from typing import Any, Iterable, Mapping, cast
+import os
+from pathlib import Path
+from typing import Any, Iterable, Mapping, MutableMapping, cast
 
-from features.f2 import metadata_store
-from features.f5 import chunk_utils
+from features.f2 import compression, metadata_store
+from features.f5 import chunk_utils, near_duplicates
+from shared.logging_config import files_logger
+
+SIGNATURE_BACKFILL_BATCH_SIZE = int(
+    os.environ.get("SIGNATURE_BACKFILL_BATCH_SIZE", "500")
+)
+SIGNATURE_BACKFILL_SLEEP_SECONDS = float(
+    os.environ.get("SIGNATURE_BACKFILL_SLEEP_SECONDS", "1")
+)
 
 
 def build_chunk_docs_from_content(
@@ -25,41 +36,63 @@ def build_chunk_docs_from_content(
 
 async def add_content_chunks(
     document: Mapping[str, Any], module_name: str, content: Any | None = None
-) -> None:
-    """Generate and index chunk documents from ``content``."""
+) -> list[int]:
+    """Generate and index chunk documents from ``content``; return task uids."""
+    return await add_content_chunks_batch([(document, module_name, content)])
+
+
+async def add_content_chunks_batch(
+    jobs: Iterable[tuple[Mapping[str, Any], str, Any | None]],
+) -> list[int]:
+    """Rebuild chunks for several ``(document, module, content)`` jobs.
+
+    Stale chunks of every job are removed with one filtered delete, so the
+    cost does not depend on the size of the chunk index.
+    """
     from features.f2 import search_index
 
-    dir_path = metadata_store.by_id_directory() / document["id"] / module_name
-    dir_path.mkdir(parents=True, exist_ok=True)
-    content_path = dir_path / chunk_utils.CONTENT_FILENAME
-    if content is None:
-        if not content_path.exists():
-            return
-        with content_path.open() as fh:
-            content = json.load(fh)
-    else:
-        with content_path.open("w") as fh:
-            json.dump(content, fh)
-    chunk_path = dir_path / chunk_utils.CHUNK_FILENAME
-    if chunk_path.exists():
-        chunk_path.unlink()
-    await search_index.delete_chunk_docs_by_file_id_and_module(
-        document["id"], module_name
-    )
-    chunks = build_chunk_docs_from_content(
-        content,
-        document["id"],
-        module_name,
-        file_mtime=document.get("mtime"),
+    pending = []
+    for document, module_name, content in jobs:
+        dir_path = metadata_store.by_id_directory() / document["id"] / module_name
+        dir_path.mkdir(parents=True, exist_ok=True)
+        content_path = dir_path / chunk_utils.CONTENT_FILENAME
+        if content is None:
+            if not compression.exists(content_path):
+                continue
+            content = compression.read_json(content_path)
+        else:
+            compression.write_json(content_path, content)
+        compression.unlink(dir_path / chunk_utils.CHUNK_FILENAME)
+        pending.append((document, module_name, dir_path, content))
+    if not pending:
+        return []
+
+    task_uids = await search_index.delete_chunk_docs_by_file_modules(
+        [(document["id"], module_name) for document, module_name, _, _ in pending]
     )
-    chunk_utils.write_chunk_docs(dir_path, chunks)
-    await search_index.add_or_update_chunk_documents(chunks)
+    all_chunks: list[dict[str, Any]] = []
+    for document, module_name, dir_path, content in pending:
+        chunks = build_chunk_docs_from_content(
+            content,
+            document["id"],
+            module_name,
+            file_mtime=document.get("mtime"),
+        )
+        chunk_utils.write_chunk_docs(dir_path, chunks)
+        await asyncio.to_thread(
+            near_duplicates.update, document["id"], module_name, chunks
+        )
+        all_chunks.extend(chunks)
+    task_uids += await search_index.add_or_update_chunk_documents(all_chunks)
+    return task_uids
 
 
 async def sync_content_files(docs_by_hash: Mapping[str, Mapping[str, Any]]) -> None:
     """Chunk any stored content files and index the resulting docs."""
+    from features.f2 import search_index
     from features.f4 import modules as modules_f4
 
+    task_uids: list[int] = []
     for doc in docs_by_hash.values():
         mod_dir = metadata_store.by_id_directory() / doc["id"]
         if not mod_dir.exists():
@@ -69,6 +102,97 @@ async def sync_content_files(docs_by_hash: Mapping[str, Mapping[str, Any]]) -> N
                 continue
             content_path = module_dir / chunk_utils.CONTENT_FILENAME
             chunk_path = module_dir / chunk_utils.CHUNK_FILENAME
-            if content_path.exists() and not chunk_path.exists():
-                await add_content_chunks(doc, module_dir.name)
-        await modules_f4.update_doc_from_module(cast(dict[str, Any], doc))
+            if compression.exists(content_path) and not compression.exists(chunk_path):
+                task_uids += await add_content_chunks(doc, module_dir.name)
+        await modules_f4.update_doc_from_module(
+            cast(dict[str, Any], doc), task_uids=task_uids
+        )
+    # sync runs in its own process; nothing may stay buffered when it exits
+    task_uids += await search_index.flush_documents()
+    await search_index.wait_for_tasks(task_uids)
+
+
+# --- signature backfill -------------------------------------------------------
+#
+# Chunk files stored before near-duplicate detection existed have no
+# signature. ``backfill_signatures_in_background`` signs them in id order, in
+# throttled batches, and checkpoints its position like the migrator.
+
+
+def backfill_state_path() -> Path:
+    return metadata_store.metadata_directory() / "signature_backfill.json"
+
+
+def load_backfill_state() -> dict[str, Any]:
+    """Return the saved backfill checkpoint."""
+    try:
+        with backfill_state_path().open("r") as f:
+            return cast(dict[str, Any], json.load(f))
+    except (OSError, ValueError):
+        return {"last_id": "", "scanned": 0, "signed": 0, "complete": False}
+
+
+def save_backfill_state(state: MutableMapping[str, Any]) -> None:
+    path = backfill_state_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with tmp.open("w") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+def backfill_batch(file_ids: list[str]) -> int:
+    """Sign the stored chunk files of ``file_ids``; return how many were signed."""
+    signed = near_duplicates.signed(file_ids)
+    count = 0
+    for file_id in file_ids:
+        try:
+            entries = list(os.scandir(metadata_store.by_id_directory() / file_id))
+        except FileNotFoundError:
+            continue
+        for entry in entries:
+            module_dir = Path(entry.path)
+            if not entry.is_dir() or (file_id, entry.name) in signed:
+                continue
+            try:
+                chunks = chunk_utils.read_chunk_docs(module_dir)
+            except FileNotFoundError:
+                continue
+            # a module that rechunked meanwhile has signed its newer chunks
+            near_duplicates.update(file_id, entry.name, chunks, if_unsigned=True)
+            count += 1
+    return count
+
+
+async def backfill_signatures_in_background(
+    batch_size: int = SIGNATURE_BACKFILL_BATCH_SIZE,
+    sleep_seconds: float = SIGNATURE_BACKFILL_SLEEP_SECONDS,
+) -> None:
+    """Sign stored chunk files without blocking sync or indexing."""
+    state = load_backfill_state()
+    if state.get("complete"):
+        return
+    by_id = metadata_store.by_id_directory()
+    if not by_id.exists():
+        return
+    file_ids = sorted(
+        entry.name
+        for entry in os.scandir(by_id)
+        if entry.is_dir() and entry.name > state["last_id"]
+    )
+    total = state["scanned"] + len(file_ids)
+    for i in range(0, len(file_ids), batch_size):
+        batch = file_ids[i : i + batch_size]
+        state["signed"] += await asyncio.to_thread(backfill_batch, batch)
+        state["scanned"] += len(batch)
+        state["last_id"] = batch[-1]
+        save_backfill_state(state)
+        files_logger.info(
+            "signature backfill: %d/%d scanned, %d signed",
+            state["scanned"],
+            total,
+            state["signed"],
+        )
+        await asyncio.sleep(sleep_seconds)
+    state["complete"] = True
+    save_backfill_state(state)
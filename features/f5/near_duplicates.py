@@ -0,0 +1,275 @@
+"""Near-duplicate detection over chunk text with MinHash and LSH.
+
+Each ``(file_id, module)`` pair gets a MinHash signature of the word
+shingles in its chunks. Signatures are split into bands and every band is
+stored as a bucket in ``metadata/near_duplicates.sqlite3``; two texts are
+candidates only if they share a bucket, so lookups touch a handful of rows
+instead of every stored signature. Texts without words store an empty
+signature, so :func:`signed` can tell them apart from unsigned pairs.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import random
+import re
+import struct
+from collections.abc import Iterable, Mapping
+from typing import Any
+
+from features.f2 import local_db
+
+__all__ = [
+    "clusters",
+    "remove",
+    "signature",
+    "signed",
+    "similar",
+    "similarity",
+    "update",
+]
+
+NEAR_DUPLICATE_BANDS = int(os.environ.get("NEAR_DUPLICATE_BANDS", "16"))
+NEAR_DUPLICATE_ROWS = int(os.environ.get("NEAR_DUPLICATE_ROWS", "8"))
+NEAR_DUPLICATE_SHINGLE_WORDS = int(os.environ.get("NEAR_DUPLICATE_SHINGLE_WORDS", "5"))
+NEAR_DUPLICATE_THRESHOLD = float(os.environ.get("NEAR_DUPLICATE_THRESHOLD", "0.8"))
+
+# members of one bucket are compared with at most this many representatives
+NEAR_DUPLICATE_MAX_REPRESENTATIVES = int(
+    os.environ.get("NEAR_DUPLICATE_MAX_REPRESENTATIVES", "8")
+)
+
+NUM_PERM = NEAR_DUPLICATE_BANDS * NEAR_DUPLICATE_ROWS
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+# fixed seed: stored signatures must stay comparable across restarts
+_rng = random.Random(0x5EED)
+_PERMUTATIONS = [
+    (_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)
+]
+_WORD = re.compile(r"\w+")
+
+DB_NAME = "near_duplicates"
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS signatures (
+    file_id TEXT NOT NULL,
+    module TEXT NOT NULL,
+    signature BLOB NOT NULL,
+    PRIMARY KEY (file_id, module)
+);
+CREATE TABLE IF NOT EXISTS buckets (
+    band INTEGER NOT NULL,
+    bucket BLOB NOT NULL,
+    file_id TEXT NOT NULL,
+    module TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS buckets_by_bucket ON buckets (band, bucket);
+CREATE INDEX IF NOT EXISTS buckets_by_file ON buckets (file_id, module);
+"""
+
+
+def _shingles(text: str) -> set[int]:
+    words = _WORD.findall(text.lower())
+    n = NEAR_DUPLICATE_SHINGLE_WORDS
+    grams = [" ".join(words[i : i + n]) for i in range(max(len(words) - n + 1, 1))]
+    return {
+        int.from_bytes(hashlib.blake2b(g.encode(), digest_size=4).digest(), "big")
+        for g in grams
+        if g
+    }
+
+
+def signature(text: str) -> list[int] | None:
+    """Return the MinHash signature of ``text`` or ``None`` if it has no words."""
+    shingles = _shingles(text)
+    if not shingles:
+        return None
+    return [
+        min((a * h + b) % _PRIME for h in shingles) & _MAX_HASH
+        for a, b in _PERMUTATIONS
+    ]
+
+
+def similarity(sig_a: list[int], sig_b: list[int]) -> float:
+    """Estimate the Jaccard similarity of two signatures."""
+    return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / len(sig_a)
+
+
+def _pack(sig: list[int]) -> bytes:
+    return struct.pack(f">{len(sig)}I", *sig)
+
+
+def _unpack(blob: bytes) -> list[int]:
+    return list(struct.unpack(f">{len(blob) // 4}I", blob))
+
+
+def _bands(sig: list[int]) -> list[tuple[int, bytes]]:
+    r = NEAR_DUPLICATE_ROWS
+    return [
+        (band, hashlib.blake2b(_pack(sig[band * r : (band + 1) * r])).digest()[:8])
+        for band in range(NEAR_DUPLICATE_BANDS)
+    ]
+
+
+def _chunk_text(chunks: Iterable[Mapping[str, Any]]) -> str:
+    ordered = sorted(chunks, key=lambda c: c.get("index", 0))
+    return " ".join(str(c.get("text", "")) for c in ordered)
+
+
+def update(
+    file_id: str,
+    module: str,
+    chunks: Iterable[Mapping[str, Any]],
+    *,
+    if_unsigned: bool = False,
+) -> None:
+    """Replace the signature for ``file_id``/``module`` from its chunk docs.
+
+    With ``if_unsigned`` an existing signature is kept, because it may come
+    from chunks newer than ``chunks``.
+    """
+    sig = signature(_chunk_text(chunks))
+    with local_db.connect(DB_NAME, SCHEMA) as conn:
+        if (
+            if_unsigned
+            and conn.execute(
+                "SELECT 1 FROM signatures WHERE file_id = ? AND module = ?",
+                (file_id, module),
+            ).fetchone()
+        ):
+            return
+        conn.execute(
+            "DELETE FROM buckets WHERE file_id = ? AND module = ?", (file_id, module)
+        )
+        conn.execute(
+            "DELETE FROM signatures WHERE file_id = ? AND module = ?",
+            (file_id, module),
+        )
+        conn.execute(
+            "INSERT INTO signatures VALUES (?, ?, ?)",
+            (file_id, module, _pack(sig or [])),
+        )
+        if sig is None:
+            return
+        conn.executemany(
+            "INSERT INTO buckets VALUES (?, ?, ?, ?)",
+            [(band, bucket, file_id, module) for band, bucket in _bands(sig)],
+        )
+
+
+def signed(file_ids: Iterable[str] | None = None) -> set[tuple[str, str]]:
+    """Return every ``(file_id, module)`` pair that :func:`update` has seen.
+
+    With ``file_ids`` only the pairs of those files are returned.
+    """
+    with local_db.connect(DB_NAME, SCHEMA) as conn:
+        if file_ids is None:
+            rows = conn.execute("SELECT file_id, module FROM signatures").fetchall()
+        else:
+            rows = [
+                row
+                for file_id in file_ids
+                for row in conn.execute(
+                    "SELECT file_id, module FROM signatures WHERE file_id = ?",
+                    (file_id,),
+                )
+            ]
+    return {(row["file_id"], row["module"]) for row in rows}
+
+
+def remove(file_ids: Iterable[str]) -> None:
+    """Forget every signature of ``file_ids``."""
+    rows = [(file_id,) for file_id in file_ids]
+    with local_db.connect(DB_NAME, SCHEMA) as conn:
+        conn.executemany("DELETE FROM buckets WHERE file_id = ?", rows)
+        conn.executemany("DELETE FROM signatures WHERE file_id = ?", rows)
+
+
+def similar(
+    file_id: str, threshold: float = NEAR_DUPLICATE_THRESHOLD
+) -> list[dict[str, Any]]:
+    """Return other files whose text resembles any module text of ``file_id``."""
+    best: dict[str, dict[str, Any]] = {}
+    with local_db.connect(DB_NAME, SCHEMA) as conn:
+        own = conn.execute(
+            "SELECT module, signature FROM signatures WHERE file_id = ?", (file_id,)
+        ).fetchall()
+        for row in own:
+            sig = _unpack(row["signature"])
+            candidates = conn.execute(
+                "SELECT DISTINCT s.file_id, s.module, s.signature "
+                "FROM buckets b JOIN buckets c "
+                "ON c.band = b.band AND c.bucket = b.bucket "
+                "JOIN signatures s ON s.file_id = c.file_id AND s.module = c.module "
+                "WHERE b.file_id = ? AND b.module = ? AND c.file_id != ?",
+                (file_id, row["module"], file_id),
+            ).fetchall()
+            for cand in candidates:
+                score = similarity(sig, _unpack(cand["signature"]))
+                if score < threshold:
+                    continue
+                previous = best.get(cand["file_id"])
+                if previous is None or score > previous["similarity"]:
+                    best[cand["file_id"]] = {
+                        "file_id": cand["file_id"],
+                        "module": cand["module"],
+                        "similarity": score,
+                    }
+    return sorted(best.values(), key=lambda m: (-m["similarity"], m["file_id"]))
+
+
+def clusters(
+    threshold: float = NEAR_DUPLICATE_THRESHOLD, limit: int = 100
+) -> list[list[str]]:
+    """Group file ids whose texts resemble each other, largest groups first.
+
+    Only texts that collide in at least one band are compared, and each
+    member of a bucket only against the bucket's first few distinct groups,
+    so a bucket shared by many texts costs linear rather than quadratic work.
+    """
+    parent: dict[str, str] = {}
+
+    def find(x: str) -> str:
+        while parent.setdefault(x, x) != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    signatures: dict[tuple[str, str], list[int]] = {}
+    with local_db.connect(DB_NAME, SCHEMA) as conn:
+        rows = conn.execute(
+            "SELECT band, bucket, group_concat(file_id || char(31) || module, "
+            "char(30)) AS members FROM buckets GROUP BY band, bucket "
+            "HAVING COUNT(DISTINCT file_id) > 1"
+        ).fetchall()
+        for row in rows:
+            members: list[tuple[str, str]] = []
+            for member in row["members"].split("\x1e"):
+                file_id, module = member.split("\x1f")
+                members.append((file_id, module))
+                if (file_id, module) not in signatures:
+                    found = conn.execute(
+                        "SELECT signature FROM signatures "
+                        "WHERE file_id = ? AND module = ?",
+                        (file_id, module),
+                    ).fetchone()
+                    signatures[(file_id, module)] = _unpack(found["signature"])
+            representatives: list[tuple[str, str]] = []
+            for member in members:
+                for rep in representatives:
+                    if find(rep[0]) == find(member[0]):
+                        break
+                    if similarity(signatures[rep], signatures[member]) >= threshold:
+                        parent[find(member[0])] = find(rep[0])
+                        break
+                else:
+                    if len(representatives) < NEAR_DUPLICATE_MAX_REPRESENTATIVES:
+                        representatives.append(member)
+
+    groups: dict[str, list[str]] = {}
+    for file_id in parent:
+        groups.setdefault(find(file_id), []).append(file_id)
+    result = [sorted(g) for g in groups.values() if len(g) > 1]
+    result.sort(key=lambda g: (-len(g), g[0]))
+    return result[:limit]
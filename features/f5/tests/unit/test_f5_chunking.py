@@ -3,6 +3,7 @@ import asyncio
 
 def _setup(monkeypatch, tmp_path):
     monkeypatch.setenv("BY_ID_DIRECTORY", str(tmp_path))
+    monkeypatch.setenv("METADATA_DIRECTORY", str(tmp_path))
     import features.f5.chunking as chunking
     import features.f2.search_index as search_index
     import importlib
@@ -18,15 +19,15 @@ def test_add_content_chunks_writes_and_indexes(monkeypatch, tmp_path):
 
     recorded = {}
 
-    async def fake_delete(file_id, module):
-        recorded["delete"] = (file_id, module)
+    async def fake_delete(pairs):
+        [recorded["delete"]] = pairs
+        return [1]
 
     async def fake_add(docs):
         recorded["add"] = docs
+        return [2]
 
-    monkeypatch.setattr(
-        search_index, "delete_chunk_docs_by_file_id_and_module", fake_delete
-    )
+    monkeypatch.setattr(search_index, "delete_chunk_docs_by_file_modules", fake_delete)
     monkeypatch.setattr(search_index, "add_or_update_chunk_documents", fake_add)
     monkeypatch.setattr(
         chunking, "build_chunk_docs_from_content", lambda *a, **k: [{"id": "x"}]
@@ -37,10 +38,11 @@ def test_add_content_chunks_writes_and_indexes(monkeypatch, tmp_path):
         lambda p, d: recorded.setdefault("write", p),
     )
 
-    asyncio.run(
+    uids = asyncio.run(
         chunking.add_content_chunks({"id": "f", "mtime": 1.0}, "mod", content="hi")
     )
 
+    assert uids == [1, 2]
     assert recorded["delete"] == ("f", "mod")
     assert recorded["add"] == [{"id": "x"}]
     assert recorded["write"] == tmp_path / "f" / "mod"
@@ -59,9 +61,7 @@ def test_add_content_chunks_no_content_skips(monkeypatch, tmp_path):
     async def fake_add(*_args):
         recorded["add"] = True
 
-    monkeypatch.setattr(
-        search_index, "delete_chunk_docs_by_file_id_and_module", fake_delete
-    )
+    monkeypatch.setattr(search_index, "delete_chunk_docs_by_file_modules", fake_delete)
     monkeypatch.setattr(search_index, "add_or_update_chunk_documents", fake_add)
 
     asyncio.run(chunking.add_content_chunks({"id": "f"}, "mod"))
@@ -79,15 +79,15 @@ def test_add_content_chunks_reads_existing_content(monkeypatch, tmp_path):
 
     recorded = {}
 
-    async def fake_delete(file_id, module):
-        recorded["delete"] = (file_id, module)
+    async def fake_delete(pairs):
+        [recorded["delete"]] = pairs
+        return [1]
 
     async def fake_add(docs):
         recorded["add"] = docs
+        return [2]
 
-    monkeypatch.setattr(
-        search_index, "delete_chunk_docs_by_file_id_and_module", fake_delete
-    )
+    monkeypatch.setattr(search_index, "delete_chunk_docs_by_file_modules", fake_delete)
     monkeypatch.setattr(search_index, "add_or_update_chunk_documents", fake_add)
     monkeypatch.setattr(
         chunking, "build_chunk_docs_from_content", lambda *a, **k: [{"id": "y"}]
@@ -103,3 +103,70 @@ def test_add_content_chunks_reads_existing_content(monkeypatch, tmp_path):
     assert recorded["delete"] == ("f", "mod")
     assert recorded["add"] == [{"id": "y"}]
     assert recorded["write"] == tmp_path / "f" / "mod"
+
+
+def test_add_content_chunks_reads_compressed_content(monkeypatch, tmp_path):
+    import gzip
+
+    chunking, search_index = _setup(monkeypatch, tmp_path)
+    monkeypatch.setattr(chunking.metadata_store, "by_id_directory", lambda: tmp_path)
+
+    (tmp_path / "f" / "mod").mkdir(parents=True)
+    (tmp_path / "f" / "mod" / "content.json.gz").write_bytes(gzip.compress(b'"hi"'))
+    (tmp_path / "f" / "mod" / "chunks.json.gz").write_bytes(gzip.compress(b"[]"))
+
+    recorded = {}
+
+    async def fake_delete(pairs):
+        return [1]
+
+    async def fake_add(docs):
+        recorded["add"] = docs
+        return [2]
+
+    monkeypatch.setattr(search_index, "delete_chunk_docs_by_file_modules", fake_delete)
+    monkeypatch.setattr(search_index, "add_or_update_chunk_documents", fake_add)
+    monkeypatch.setattr(
+        chunking,
+        "build_chunk_docs_from_content",
+        lambda content, *a, **k: [{"id": "z", "text": content}],
+    )
+
+    asyncio.run(chunking.add_content_chunks({"id": "f"}, "mod"))
+
+    assert recorded["add"] == [{"id": "z", "text": "hi"}]
+    assert not (tmp_path / "f" / "mod" / "chunks.json.gz").exists()
+    assert chunking.chunk_utils.read_chunk_docs(tmp_path / "f" / "mod") == [
+        {"id": "z", "text": "hi"}
+    ]
+
+
+def test_signature_backfill_runs_in_checkpointed_batches(monkeypatch, tmp_path):
+    chunking, _ = _setup(monkeypatch, tmp_path)
+    monkeypatch.setenv("BY_ID_DIRECTORY", str(tmp_path / "by-id"))
+    text = "some words worth signing here"
+    for file_id in ["a", "b", "c"]:
+        mod_dir = tmp_path / "by-id" / file_id / "mod"
+        mod_dir.mkdir(parents=True)
+        chunking.chunk_utils.write_chunk_docs(
+            mod_dir, [{"id": f"{file_id}_0", "index": 0, "text": text}]
+        )
+    # "b" was rechunked after its chunk file was listed
+    chunking.near_duplicates.update("b", "mod", [{"text": "newer text"}])
+    chunking.save_backfill_state(
+        {"last_id": "a", "scanned": 1, "signed": 0, "complete": False}
+    )
+
+    asyncio.run(
+        chunking.backfill_signatures_in_background(batch_size=1, sleep_seconds=0)
+    )
+
+    assert chunking.near_duplicates.signed() == {("b", "mod"), ("c", "mod")}
+    assert chunking.near_duplicates.similar("c") == []
+    chunking.near_duplicates.update("b", "mod", [{"text": text}], if_unsigned=True)
+    assert chunking.near_duplicates.similar("c") == []
+    state = chunking.load_backfill_state()
+    assert state == {"last_id": "c", "scanned": 3, "signed": 1, "complete": True}
+
+    monkeypatch.setattr(chunking, "backfill_batch", lambda ids: 1 / 0)
+    asyncio.run(chunking.backfill_signatures_in_background(sleep_seconds=0))
@@ -0,0 +1,55 @@
+def _chunks(text: str):
+    words = text.split()
+    return [
+        {"index": i, "text": " ".join(words[j : j + 20])}
+        for i, j in enumerate(range(0, len(words), 20))
+    ]
+
+
+BASE = " ".join(f"word{i}" for i in range(200))
+
+
+def test_similar_finds_near_copies(monkeypatch, tmp_path):
+    from features.f5 import near_duplicates as nd
+
+    monkeypatch.setenv("METADATA_DIRECTORY", str(tmp_path))
+    edited = BASE.replace("word100", "changed")
+    other = " ".join(f"other{i}" for i in range(200))
+
+    nd.update("a", "ocr", _chunks(BASE))
+    nd.update("b", "transcript", _chunks(edited))
+    nd.update("c", "ocr", _chunks(other))
+
+    matches = nd.similar("a")
+    assert [m["file_id"] for m in matches] == ["b"]
+    assert matches[0]["module"] == "transcript"
+    assert matches[0]["similarity"] > 0.8
+    assert nd.clusters() == [["a", "b"]]
+
+    nd.remove(["b"])
+    assert nd.similar("a") == []
+    assert nd.clusters() == []
+
+
+def test_signature_similarity_tracks_overlap():
+    from features.f5 import near_duplicates as nd
+
+    half = " ".join(BASE.split()[:100] + [f"x{i}" for i in range(100)])
+    sig_a = nd.signature(BASE)
+    assert nd.similarity(sig_a, nd.signature(BASE)) == 1.0
+    assert 0.15 < nd.similarity(sig_a, nd.signature(half)) < 0.55
+    assert nd.signature("") is None
+
+
+def test_clusters_join_copies_through_representatives(monkeypatch, tmp_path):
+    from features.f5 import near_duplicates as nd
+
+    monkeypatch.setenv("METADATA_DIRECTORY", str(tmp_path))
+    monkeypatch.setattr(nd, "NEAR_DUPLICATE_MAX_REPRESENTATIVES", 1)
+    for name in "abcd":
+        nd.update(name, "ocr", _chunks(BASE.replace("word100", name)))
+    nd.update("empty", "ocr", [{"index": 0, "text": ""}])
+
+    assert nd.clusters() == [["a", "b", "c", "d"]]
+    assert ("empty", "ocr") in nd.signed()
+    assert nd.similar("empty") == []
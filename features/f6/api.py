@@ -19,14 +19,24 @@ Mount (Linux):
 from __future__ import annotations
 
 import asyncio
-import json
+import fcntl
+import filecmp
 import os
 import shutil
 import tempfile
 from pathlib import Path
-from typing import Any, AsyncIterable, Awaitable, Callable, Dict, List, cast
-
-from fastapi import FastAPI, Request, status
+from typing import (
+    Any,
+    AsyncIterable,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Literal,
+    cast,
+)
+
+from fastapi import FastAPI, HTTPException, Request, status
 from pydantic import BaseModel
 
 try:
@@ -58,6 +68,9 @@ INDEX_DIRECTORY.mkdir(parents=True, exist_ok=True)
 # How long to wait after the **last** mutating op before kicking heavy work
 DEBOUNCE_SECONDS = 2.0
 
+# linux/fs.h: share extents of one file with another (btrfs, xfs, ...)
+FICLONE = 0x40049409
+
 app = FastAPI(title="Home‑Share API")
 
 
@@ -80,6 +93,12 @@ class FileOps(BaseModel):  # type: ignore[misc]
     delete: List[str] = []
 
 
+class DedupeRequest(BaseModel):  # type: ignore[misc]
+    mode: Literal["auto", "reflink", "hardlink"] = "auto"
+    keep: str | None = None
+    dry_run: bool = False
+
+
 # ------------------------------------------------------------------------
 # Heavy lifting – lifted verbatim from your old /fileops route,
 # with tiny tweaks for streamed uploads
@@ -93,17 +112,23 @@ async def apply_ops(ops: FileOps) -> None:
     # Lazy import to avoid cycles and keep mypy happy
     from features.f1 import sync
     from features.f2 import (
+        blob_store,
         duplicate_finder,
+        duplicate_groups,
         metadata_store,
         migrations,
+        path_index,
         path_links,
         search_index,
     )
     from features.f3 import archive
     from features.f4 import modules as modules_f4
+    from features.f5 import near_duplicates
 
     docs_to_upsert: Dict[str, Dict[str, Any]] = {}
     ids_to_delete: List[str] = []
+    unlinked_parents: set[Path] = set()
+    released_blobs: set[str] = set()
 
     # ---------- ADD -----------------------------------------------------
     for item in ops.add:
@@ -141,17 +166,14 @@ async def apply_ops(ops: FileOps) -> None:
             continue
         dest.parent.mkdir(parents=True, exist_ok=True)
         src.rename(dest)
-        link = path_links.by_path_directory() / item.src
-        if not link.is_symlink():
+        doc_id = path_links.resolve_id(item.src)
+        if doc_id is None:
             continue
-        doc_id = link.resolve().name
-        path_links.unlink_path(item.src)
+        unlinked_parents.add(path_links.unlink_path(item.src, prune=False))
         path_links.link_path(item.dest, doc_id)
-        doc_file = metadata_store.by_id_directory() / doc_id / "document.json"
-        if not doc_file.exists():
+        doc_data = metadata_store.read_doc_json(doc_id)
+        if doc_data is None:
             continue
-        with open(doc_file) as fh:
-            doc_data: Dict[str, Any] = json.load(fh)
         mtime = duplicate_finder.truncate_mtime(dest.stat().st_mtime)
         doc_data["paths"].pop(item.src, None)
         doc_data["paths"][item.dest] = mtime
@@ -175,19 +197,22 @@ async def apply_ops(ops: FileOps) -> None:
                 shutil.rmtree(path)
             else:
                 path.unlink()
-        link = path_links.by_path_directory() / rel
-        if not link.is_symlink():
+        doc_id = path_links.resolve_id(rel)
+        if doc_id is None:
             continue
-        doc_id = link.resolve().name
-        path_links.unlink_path(rel)
-        doc_file = metadata_store.by_id_directory() / doc_id / "document.json"
-        if not doc_file.exists():
+        unlinked_parents.add(path_links.unlink_path(rel, prune=False))
+        doc_data_del = metadata_store.read_doc_json(doc_id)
+        if doc_data_del is None:
             continue
-        with open(doc_file) as fh:
-            doc_data_del: Dict[str, Any] = json.load(fh)
         doc_data_del["paths"].pop(rel, None)
         if not doc_data_del["paths"]:
-            shutil.rmtree(doc_file.parent)
+            if blob_store.MODULE_BLOB_STORE:
+                released_blobs.update(
+                    blob_store.referenced_digests(
+                        metadata_store.by_id_directory() / doc_id
+                    )
+                )
+            metadata_store.remove_doc(doc_id)
             ids_to_delete.append(doc_id)
         else:
             doc_data_del["paths_list"] = sorted(doc_data_del["paths"].keys())
@@ -200,14 +225,26 @@ async def apply_ops(ops: FileOps) -> None:
             metadata_store.write_doc_json(doc_data_del)
             docs_to_upsert[doc_id] = doc_data_del
 
+    path_links.prune_empty_directories(unlinked_parents)
+    if released_blobs:
+        blob_store.collect_garbage(released_blobs)
+    duplicate_groups.update(docs_to_upsert.values())
+    duplicate_groups.remove(ids_to_delete)
+    path_index.update(docs_to_upsert.values())
+    path_index.remove(ids_to_delete)
+
     # ---------- SEARCH INDEX -------------------------------------------
+    task_uids: list[int] = []
     if docs_to_upsert:
-        await search_index.add_or_update_documents(list(docs_to_upsert.values()))
+        task_uids += await search_index.add_or_update_documents(
+            list(docs_to_upsert.values())
+        )
     if ids_to_delete:
-        await search_index.delete_docs_by_id(ids_to_delete)
-        await search_index.delete_chunk_docs_by_file_ids(ids_to_delete)
+        task_uids += await search_index.delete_docs_by_id(ids_to_delete)
+        task_uids += await search_index.delete_chunk_docs_by_file_ids(ids_to_delete)
+        await asyncio.to_thread(near_duplicates.remove, ids_to_delete)
     if docs_to_upsert or ids_to_delete:
-        await search_index.wait_for_meili_idle()
+        await search_index.wait_for_tasks(task_uids)
         if modules_f4.module_values and docs_to_upsert:
             await asyncio.gather(
                 *[
@@ -219,6 +256,178 @@ async def apply_ops(ops: FileOps) -> None:
             )
 
 
+@app.get("/near-duplicates")  # type: ignore[untyped-decorator]
+async def near_duplicate_clusters_endpoint(
+    threshold: float | None = None, limit: int = 100
+) -> dict[str, Any]:
+    """List groups of files whose extracted text is nearly identical."""
+    from features.f5 import near_duplicates
+
+    clusters = await asyncio.to_thread(
+        near_duplicates.clusters,
+        near_duplicates.NEAR_DUPLICATE_THRESHOLD if threshold is None else threshold,
+        limit,
+    )
+    return {"results": clusters}
+
+
+@app.get("/near-duplicates/{file_id}")  # type: ignore[untyped-decorator]
+async def near_duplicates_endpoint(
+    file_id: str, threshold: float | None = None
+) -> dict[str, Any]:
+    """List files whose extracted text resembles that of ``file_id``."""
+    from features.f5 import near_duplicates
+
+    matches = await asyncio.to_thread(
+        near_duplicates.similar,
+        file_id,
+        near_duplicates.NEAR_DUPLICATE_THRESHOLD if threshold is None else threshold,
+    )
+    return {"id": file_id, "results": matches}
+
+
+# ------------------------------------------------------------------------
+# In-place deduplication – replace identical copies with shared storage
+# ------------------------------------------------------------------------
+def _reflink(src: Path, dst: Path) -> None:
+    with src.open("rb") as src_fh, dst.open("wb") as dst_fh:
+        fcntl.ioctl(dst_fh.fileno(), FICLONE, src_fh.fileno())
+
+
+def _probe_method(keep: Path, directory: Path, mode: str) -> str | None:
+    """Return the method :func:`_replace_with_copy_of` would use in ``directory``.
+
+    ``None`` means ``mode`` is ``reflink`` and the filesystem cannot clone.
+    """
+    if mode == "hardlink":
+        return "hardlink"
+    fd, tmp = tempfile.mkstemp(dir=str(directory), prefix=".dedupe-probe.")
+    os.close(fd)
+    tmp_path = Path(tmp)
+    try:
+        _reflink(keep, tmp_path)
+        return "reflink"
+    except OSError:
+        return None if mode == "reflink" else "hardlink"
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+
+def _replace_with_copy_of(keep: Path, target: Path, mode: str) -> str:
+    """Atomically replace ``target`` with a reflink or hardlink of ``keep``."""
+    fd, tmp = tempfile.mkstemp(dir=str(target.parent), prefix=f".{target.name}.")
+    os.close(fd)
+    tmp_path = Path(tmp)
+    try:
+        method = "hardlink"
+        if mode in ("auto", "reflink"):
+            try:
+                _reflink(keep, tmp_path)
+                shutil.copystat(target, tmp_path)
+                method = "reflink"
+            except OSError:
+                if mode == "reflink":
+                    raise
+        if method == "hardlink":
+            tmp_path.unlink()
+            os.link(keep, tmp_path)
+        os.replace(tmp_path, target)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return method
+
+
+def dedupe_doc(doc: dict[str, Any], req: DedupeRequest) -> dict[str, Any]:
+    """Share storage between the copies of ``doc`` and update its ``paths``.
+
+    Every copy is compared byte for byte with ``keep`` first. Mtimes in
+    ``paths`` are refreshed from disk so the next sync does not rehash.
+    """
+    from features.f2 import duplicate_finder
+
+    existing = [p for p in sorted(doc["paths"]) if (INDEX_DIRECTORY / p).is_file()]
+    keep = req.keep or (existing[0] if existing else None)
+    if keep is None or keep not in existing:
+        raise HTTPException(status_code=400, detail=f"cannot keep {keep!r}")
+    keep_path = INDEX_DIRECTORY / keep
+    keep_stat = keep_path.stat()
+
+    linked: list[dict[str, str]] = []
+    skipped: list[dict[str, str]] = [
+        {"path": p, "reason": "missing"} for p in doc["paths"] if p not in existing
+    ]
+    shared = 0
+    probed: dict[Path, str | None] = {}
+    for rel in existing:
+        if rel == keep:
+            continue
+        target = INDEX_DIRECTORY / rel
+        stat = target.stat()
+        if (stat.st_dev, stat.st_ino) == (keep_stat.st_dev, keep_stat.st_ino):
+            shared += 1
+            skipped.append({"path": rel, "reason": "already linked"})
+            continue
+        if stat.st_dev != keep_stat.st_dev:
+            skipped.append({"path": rel, "reason": "different filesystem"})
+            continue
+        if not filecmp.cmp(keep_path, target, shallow=False):
+            skipped.append({"path": rel, "reason": "content differs"})
+            continue
+        if req.dry_run:
+            if target.parent not in probed:
+                probed[target.parent] = _probe_method(
+                    keep_path, target.parent, req.mode
+                )
+            dry_method = probed[target.parent]
+            if dry_method is None:
+                skipped.append({"path": rel, "reason": "reflink unsupported"})
+            else:
+                linked.append({"path": rel, "method": dry_method})
+            continue
+        method = _replace_with_copy_of(keep_path, target, req.mode)
+        linked.append({"path": rel, "method": method})
+        doc["paths"][rel] = duplicate_finder.truncate_mtime(target.stat().st_mtime)
+    size = int(doc.get("size", keep_stat.st_size))
+    return {
+        "id": doc["id"],
+        "keep": keep,
+        "dry_run": req.dry_run,
+        "linked": linked,
+        "skipped": skipped,
+        # with ``dry_run`` these are the bytes that would be reclaimed
+        "reclaimed_bytes": size * len(linked),
+        "shared_bytes": size * (shared + len(linked)),
+    }
+
+
+@app.post("/duplicates/{file_id}/dedupe")  # type: ignore[untyped-decorator]
+async def dedupe_endpoint(file_id: str, req: DedupeRequest) -> dict[str, Any]:
+    """Replace duplicate copies of ``file_id`` with reflinks or hardlinks."""
+    from features.f2 import (
+        duplicate_groups,
+        metadata_store,
+        path_index,
+        search_index,
+    )
+
+    doc = metadata_store.read_doc_json(file_id)
+    if doc is None:
+        raise HTTPException(status_code=404, detail=f"unknown id {file_id!r}")
+    result = await asyncio.to_thread(dedupe_doc, doc, req)
+    if not req.dry_run and result["linked"]:
+        doc["mtime"] = max(doc["paths"].values())
+        metadata_store.write_doc_json(doc)
+        await asyncio.to_thread(
+            duplicate_groups.mark_reclaimed, file_id, result["shared_bytes"]
+        )
+        await asyncio.to_thread(path_index.update, [doc])
+        await search_index.wait_for_tasks(
+            await search_index.add_or_update_documents([doc])
+        )
+    return result
+
+
 # ------------------------------------------------------------------------
 # Debounce helper – one task shared by all requests
 # ------------------------------------------------------------------------
@@ -249,13 +458,79 @@ def debounce(
 # ------------------------------------------------------------------------
 # FastAPI JSON endpoint – useful for tests / scripting
 # ------------------------------------------------------------------------
-@app.post("/fileops", status_code=status.HTTP_202_ACCEPTED)  # type: ignore[misc]
+@app.post("/fileops", status_code=status.HTTP_202_ACCEPTED)  # type: ignore[untyped-decorator]
 async def file_ops_endpoint(ops: FileOps, request: Request) -> Dict[str, str]:
     loop = asyncio.get_running_loop()
     debounce(lambda: apply_ops(ops), loop)
     return {"status": "accepted"}
 
 
+@app.get("/duplicates")  # type: ignore[untyped-decorator]
+async def duplicates_endpoint(
+    limit: int = 100, offset: int = 0, min_wasted: int = 0
+) -> dict[str, Any]:
+    """List duplicate groups with the most wasted bytes first."""
+    from features.f2 import duplicate_groups
+
+    summary, groups = await asyncio.gather(
+        asyncio.to_thread(duplicate_groups.summary),
+        asyncio.to_thread(duplicate_groups.list_groups, limit, offset, min_wasted),
+    )
+    return {**summary, "results": groups}
+
+
+@app.get("/tree")  # type: ignore[untyped-decorator]
+async def tree_endpoint(
+    path: str = "", limit: int = 1000, after: str = ""
+) -> dict[str, Any]:
+    """List one directory with the file and byte totals of its subtree."""
+    from features.f2 import path_index
+
+    summary, listing = await asyncio.gather(
+        asyncio.to_thread(path_index.summary, path),
+        asyncio.to_thread(path_index.list_directory, path, limit, after),
+    )
+    return {"path": path.strip("/"), **summary, **listing}
+
+
+@app.get("/tree/directories")  # type: ignore[untyped-decorator]
+async def tree_directories_endpoint(
+    path: str = "", order: str = "bytes", limit: int = 100
+) -> dict[str, Any]:
+    """List the subdirectories of ``path`` by their rollups, largest first."""
+    from features.f2 import path_index
+
+    if order not in path_index.ROLLUP_ORDERS:
+        raise HTTPException(status_code=400, detail="invalid order")
+    directories = await asyncio.to_thread(path_index.subdirectories, path, order, limit)
+    return {"path": path.strip("/"), "results": directories}
+
+
+@app.get("/tree/files")  # type: ignore[untyped-decorator]
+async def tree_files_endpoint(
+    path: str = "", limit: int = 1000, after: str = ""
+) -> dict[str, Any]:
+    """List every file under ``path`` in path order, paged by ``after``."""
+    from features.f2 import path_index
+
+    files = await asyncio.to_thread(path_index.list_files, path, limit, after)
+    return {
+        "path": path.strip("/"),
+        "results": files,
+        "next": files[-1]["path"] if len(files) == limit else None,
+    }
+
+
+@app.get("/search")  # type: ignore[untyped-decorator]
+async def search_endpoint(
+    q: str = "", filter: str | None = None, limit: int = 20, offset: int = 0
+) -> dict[str, Any]:
+    """Search the file index, merging the hits of every shard."""
+    from features.f2 import search_index
+
+    return await search_index.search(q, filter=filter, limit=limit, offset=offset)
+
+
 # ------------------------------------------------------------------------
 # WebDAV provider – translate DAV verbs → FileOps objects  --------------
 # ------------------------------------------------------------------------
@@ -135,6 +135,7 @@ def test_apply_ops_add_move_delete(monkeypatch, tmp_path: Path):
     import features.f4.modules as modules_f4
 
     monkeypatch.setattr(api, "INDEX_DIRECTORY", index_dir)
+    monkeypatch.setenv("METADATA_DIRECTORY", str(meta_dir))
     monkeypatch.setattr(df, "compute_hash", lambda p: "id1")
     monkeypatch.setattr(df, "truncate_mtime", lambda m: 1.0)
     monkeypatch.setattr(metadata_store, "by_id_directory", lambda: by_id)
@@ -148,20 +149,23 @@ def test_apply_ops_add_move_delete(monkeypatch, tmp_path: Path):
 
     async def add_docs(docs):
         added["docs"] = docs
+        return [1]
 
     async def del_docs(ids):
         deleted["ids"] = ids
+        return [2]
 
     async def del_chunks(ids):
         deleted["chunks"] = ids
+        return [3]
 
-    async def waited():
-        deleted["waited"] = True
+    async def waited(task_uids):
+        deleted["waited"] = task_uids
 
     monkeypatch.setattr(search_index, "add_or_update_documents", add_docs)
     monkeypatch.setattr(search_index, "delete_docs_by_id", del_docs)
     monkeypatch.setattr(search_index, "delete_chunk_docs_by_file_ids", del_chunks)
-    monkeypatch.setattr(search_index, "wait_for_meili_idle", waited)
+    monkeypatch.setattr(search_index, "wait_for_tasks", waited)
     monkeypatch.setattr(sync, "get_mime_type", lambda p: "text/plain")
     monkeypatch.setattr(sync.migrations, "CURRENT_VERSION", 1)
 
@@ -188,4 +192,136 @@ def test_apply_ops_add_move_delete(monkeypatch, tmp_path: Path):
     asyncio.set_event_loop(None)
     assert deleted["ids"] == ["id1"]
     assert deleted["chunks"] == ["id1"]
-    assert deleted["waited"]
+    assert deleted["waited"] == [2, 3]
+
+
+def test_duplicates_endpoint_sorts_by_wasted(monkeypatch, tmp_path: Path):
+    from features.f2 import duplicate_groups
+
+    monkeypatch.setenv("METADATA_DIRECTORY", str(tmp_path))
+    duplicate_groups.rebuild(
+        [
+            {"id": "small", "size": 10, "paths": {"a": 1, "b": 1}},
+            {"id": "big", "size": 100, "paths": {"c": 1, "d": 1, "e": 1}},
+            {"id": "single", "size": 1000, "paths": {"f": 1}},
+        ]
+    )
+
+    with TestClient(api.app) as client:
+        res = client.get("/duplicates")
+    body = res.json()
+    assert body["groups"] == 2
+    assert body["wasted_bytes"] == 210
+    assert [g["id"] for g in body["results"]] == ["big", "small"]
+    assert body["results"][0]["paths"] == ["c", "d", "e"]
+
+
+def test_dedupe_endpoint_links_identical_copies(monkeypatch, tmp_path: Path):
+    from features.f2 import (
+        doc_cache,
+        duplicate_groups,
+        metadata_store,
+        path_index,
+        search_index,
+    )
+
+    index_dir = tmp_path / "index"
+    index_dir.mkdir()
+    for name, data in [("a", b"same"), ("b", b"same"), ("c", b"diff")]:
+        (index_dir / name).write_bytes(data)
+    monkeypatch.setattr(api, "INDEX_DIRECTORY", index_dir)
+    monkeypatch.setenv("METADATA_DIRECTORY", str(tmp_path / "meta"))
+    doc_cache.clear()
+    metadata_store.ensure_directories()
+    doc = {"id": "x", "size": 4, "paths": {"a": 1.0, "b": 1.0, "c": 1.0, "d": 1.0}}
+    metadata_store.write_doc_json(doc)
+    duplicate_groups.rebuild([doc])
+    path_index.rebuild([doc])
+
+    def no_reflink(src: Path, dst: Path) -> None:
+        raise OSError("no clone")
+
+    monkeypatch.setattr(api, "_reflink", no_reflink)
+
+    upserted: list[Any] = []
+
+    async def add_docs(docs):
+        upserted.extend(docs)
+        return []
+
+    monkeypatch.setattr(search_index, "add_or_update_documents", add_docs)
+
+    with TestClient(api.app) as client:
+        dry = client.post("/duplicates/x/dedupe", json={"dry_run": True}).json()
+        assert dry["reclaimed_bytes"] == 4
+        assert dry["linked"] == [{"path": "b", "method": "hardlink"}]
+        assert (index_dir / "b").stat().st_nlink == 1
+        assert not list(index_dir.glob(".dedupe-probe.*"))
+        dry = client.post(
+            "/duplicates/x/dedupe", json={"dry_run": True, "mode": "reflink"}
+        ).json()
+        assert dry["linked"] == []
+        assert {"path": "b", "reason": "reflink unsupported"} in dry["skipped"]
+
+        res = client.post("/duplicates/x/dedupe", json={"mode": "hardlink"}).json()
+        assert res["keep"] == "a"
+        assert res["linked"] == [{"path": "b", "method": "hardlink"}]
+        reasons = {s["path"]: s["reason"] for s in res["skipped"]}
+        assert reasons == {"c": "content differs", "d": "missing"}
+        assert client.post("/duplicates/missing/dedupe", json={}).status_code == 404
+
+    assert (index_dir / "a").stat().st_ino == (index_dir / "b").stat().st_ino
+    assert upserted[0]["id"] == "x"
+    assert duplicate_groups.list_groups()[0]["wasted"] == 3 * 4 - 4
+    mtimes = {f["path"]: f["mtime"] for f in path_index.list_files()}
+    assert mtimes["b"] == upserted[0]["paths"]["b"] != 1.0
+
+
+def test_tree_endpoints_list_directories(monkeypatch, tmp_path: Path):
+    from features.f2 import path_index
+
+    monkeypatch.setenv("METADATA_DIRECTORY", str(tmp_path))
+    path_index.rebuild(
+        [
+            {
+                "id": "a",
+                "size": 3,
+                "type": "text/plain",
+                "paths": {"d/a": 1, "d/e/b": 1},
+            },
+            {"id": "c", "size": 4, "type": "text/plain", "paths": {"c": 1}},
+        ]
+    )
+
+    with TestClient(api.app) as client:
+        body = client.get("/tree", params={"path": "d"}).json()
+        files = client.get("/tree/files", params={"limit": 2}).json()
+        dirs = client.get("/tree/directories", params={"path": "d"}).json()
+        bad = client.get("/tree/directories", params={"order": "name"})
+
+    assert body["files"] == 2 and body["bytes"] == 6
+    assert [e["name"] for e in body["results"]] == ["a", "e"]
+    assert [f["path"] for f in files["results"]] == ["c", "d/a"]
+    assert files["next"] == "d/a"
+    assert [d["path"] for d in dirs["results"]] == ["d/e"]
+    assert bad.status_code == 400
+
+
+def test_search_endpoint_passes_query_to_federated_search(monkeypatch):
+    from features.f2 import search_index
+
+    calls = []
+
+    async def fake_search(query, filter=None, limit=20, offset=0):
+        calls.append((query, filter, limit, offset))
+        return {"hits": [], "estimated_total_hits": 0, "processing_time_ms": 0}
+
+    monkeypatch.setattr(search_index, "search", fake_search)
+
+    with TestClient(api.app) as client:
+        body = client.get(
+            "/search", params={"q": "notes", "filter": "next = m1", "limit": 5}
+        ).json()
+
+    assert body["estimated_total_hits"] == 0
+    assert calls == [("notes", "next = m1", 5, 0)]
@@ -1,5 +1,7 @@
+import argparse
 import asyncio
 import os
+from pathlib import Path
 
 # Configure logging before importing modules that may emit logs at import time
 # ruff: noqa: E402
@@ -9,9 +11,17 @@ from shared.logging_config import files_logger, setup_logging
 setup_logging()  # noqa: E402
 
 from features.f1 import sync as f1_sync
-from features.f2 import migrations, duplicate_finder
+from features.f2 import (
+    backup,
+    duplicate_finder,
+    fsck,
+    index_rebuild,
+    migrations,
+    search_index,
+)
 from features.f3 import archive
 from features.f4 import modules as modules_f4
+from features.f5 import chunking
 from features.f6 import server as f6_server
 
 COMMIT_SHA = os.environ.get("COMMIT_SHA", "unknown")
@@ -29,7 +39,11 @@ duplicate_finder = duplicate_finder
 
 async def main() -> None:
     files_logger.info("running commit %s", COMMIT_SHA)
-    await f1_sync.init_meili_and_sync()
+    if backup.consume_import_marker():
+        files_logger.info("*** skip bootstrap sync after metadata import")
+        await search_index.init_meili()
+    else:
+        await f1_sync.init_meili_and_sync()
     if modules_f4.is_modules_changed:
         modules_f4.modules_logger.info("*** perform sync on MODULES changed")
         await f1_sync.init_meili_and_sync()
@@ -37,8 +51,65 @@ async def main() -> None:
     await asyncio.gather(
         f1_sync.schedule_and_run(f6_server.serve_api),
         modules_f4.service_module_queues(),
+        migrations.migrate_in_background(),
+        index_rebuild.rebuild_in_background(),
+        chunking.backfill_signatures_in_background(),
+    )
+
+
+async def rebuild_search_index() -> None:
+    await search_index.init_meili()
+    await index_rebuild.restore_indexes()
+
+
+def cli(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="home-index")
+    commands = parser.add_subparsers(dest="command")
+    export_cmd = commands.add_parser("export", help="export the metadata store")
+    export_cmd.add_argument("archive", type=Path)
+    import_cmd = commands.add_parser("import", help="restore an exported archive")
+    import_cmd.add_argument("archive", type=Path)
+    import_cmd.add_argument(
+        "--skip-meilisearch",
+        action="store_true",
+        help="only restore metadata; the next start runs a full sync",
+    )
+    fsck_cmd = commands.add_parser("fsck", help="check metadata consistency")
+    fsck_cmd.add_argument("--repair", action="store_true")
+    fsck_cmd.add_argument(
+        "--skip-meilisearch",
+        action="store_true",
+        help="do not compare ids with the search index",
+    )
+    commands.add_parser(
+        "rebuild",
+        help="refill Meilisearch from the metadata store without a sync",
     )
+    args = parser.parse_args(argv)
+    if args.command == "export":
+        backup.export_metadata(args.archive)
+    elif args.command == "import":
+        asyncio.run(
+            backup.import_metadata(
+                args.archive, update_search_index=not args.skip_meilisearch
+            )
+        )
+    elif args.command == "fsck":
+        issues = asyncio.run(
+            fsck.run_fsck(
+                repair=args.repair,
+                # None skips the orphan module check when none are loaded
+                module_names=list(modules_f4.modules) or None,
+                include_index=not args.skip_meilisearch,
+            )
+        )
+        if any(issues.values()) and not args.repair:
+            raise SystemExit(1)
+    elif args.command == "rebuild":
+        asyncio.run(rebuild_search_index())
+    else:
+        asyncio.run(main())
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    cli()
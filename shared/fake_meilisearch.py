@@ -0,0 +1,624 @@
+"""In-process stand-in for the subset of ``meilisearch_python_sdk.AsyncClient``
+that ``features.f2.search_index`` uses.
+
+Documents, settings, tasks and stats live in memory. Every write enqueues a
+task that has already succeeded (or failed, as Meilisearch would report it),
+so ``wait_for_tasks`` returns after a single ``get_task`` per uid. Every
+method call is recorded in :attr:`FakeMeilisearch.calls`, one entry per HTTP
+request the real client would send, so tests and benchmarks can assert on
+round trips without running Meilisearch::
+
+    fake = FakeMeilisearch()
+    monkeypatch.setattr(search_index, "AsyncClient", lambda *a, **k: fake)
+    await search_index.init_meili()
+    ...
+    assert fake.count("update_documents", "files") == 1
+
+Filters support ``=``, ``!=``, ``>``, ``>=``, ``<``, ``<=``, ``IN [...]``,
+``NOT IN [...]``, ``EXISTS``, ``NOT``, ``AND``, ``OR`` and parentheses, on
+dotted attributes that must be filterable, like the real engine.
+
+``multi_search`` only answers federated requests. A hit is any document
+whose searchable attributes contain every query word; hits are ordered by
+query position and then insertion order rather than by relevance.
+"""
+
+from __future__ import annotations
+
+import copy
+import json
+import re
+from collections.abc import Callable, Iterable, Mapping, Sequence
+from dataclasses import dataclass, field
+from typing import Any
+
+__all__ = ["FakeIndex", "FakeMeilisearch", "FakeMeilisearchError"]
+
+
+class FakeMeilisearchError(Exception):
+    """Raised where the SDK raises ``MeilisearchApiError``."""
+
+    def __init__(self, code: str, message: str) -> None:
+        super().__init__(f"{code}: {message}")
+        self.code = code
+        self.message = message
+
+
+@dataclass
+class TaskInfo:
+    task_uid: int
+    index_uid: str | None
+    status: str
+    type: str
+
+
+@dataclass
+class Task:
+    uid: int
+    index_uid: str | None
+    status: str
+    type: str
+    error: dict[str, str] | None = None
+
+
+@dataclass
+class TaskResults:
+    results: list[Task]
+
+
+@dataclass
+class DocumentsInfo:
+    results: list[dict[str, Any]]
+    offset: int
+    limit: int
+    total: int
+
+
+@dataclass
+class IndexStats:
+    number_of_documents: int
+    is_indexing: bool
+    field_distribution: dict[str, int]
+
+
+@dataclass
+class ClientStats:
+    database_size: int
+    indexes: dict[str, IndexStats]
+
+
+@dataclass
+class Settings:
+    searchable_attributes: list[str] = field(default_factory=lambda: ["*"])
+    filterable_attributes: list[str] = field(default_factory=list)
+    sortable_attributes: list[str] = field(default_factory=list)
+    embedders: dict[str, Any] | None = None
+
+
+@dataclass
+class FederatedSearchResults:
+    hits: list[dict[str, Any]]
+    offset: int
+    limit: int
+    estimated_total_hits: int
+    processing_time_ms: int = 0
+
+
+@dataclass
+class _IndexData:
+    primary_key: str | None
+    documents: dict[str, dict[str, Any]] = field(default_factory=dict)
+    settings: Settings = field(default_factory=Settings)
+
+
+# --- filters ------------------------------------------------------------------
+
+_TOKEN = re.compile(
+    r"""\s*(?:
+        (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+      | (?P<op>>=|<=|!=|=|>|<|\(|\)|\[|\]|,)
+      | (?P<word>[^\s=!<>()\[\],"']+)
+    )""",
+    re.VERBOSE,
+)
+_KEYWORDS = {"AND", "OR", "NOT", "IN", "EXISTS"}
+
+Predicate = Callable[[Mapping[str, Any]], bool]
+
+
+def _tokenize(query: str) -> list[tuple[str, str]]:
+    tokens: list[tuple[str, str]] = []
+    pos = 0
+    query = query.rstrip()
+    while pos < len(query):
+        match = _TOKEN.match(query, pos)
+        if match is None:
+            raise FakeMeilisearchError("invalid_search_filter", query)
+        pos = match.end()
+        if match.group("string") is not None:
+            raw = match.group("string")
+            value = json.loads(raw) if raw[0] == '"' else raw[1:-1]
+            tokens.append(("value", value))
+        elif match.group("op") is not None:
+            tokens.append(("op", match.group("op")))
+        else:
+            word = match.group("word")
+            kind = "keyword" if word.upper() in _KEYWORDS else "value"
+            tokens.append((kind, word.upper() if kind == "keyword" else word))
+    return tokens
+
+
+def _values(doc: Mapping[str, Any], attribute: str) -> list[Any]:
+    """Return every value at dotted ``attribute``, flattening arrays."""
+    current: list[Any] = [doc]
+    for part in attribute.split("."):
+        found: list[Any] = []
+        for value in current:
+            if isinstance(value, Mapping) and part in value:
+                found.append(value[part])
+        current = []
+        for value in found:
+            current.extend(value if isinstance(value, list) else [value])
+    return current
+
+
+def _compare(left: Any, op: str, right: str) -> bool:
+    if isinstance(left, bool):
+        left = str(left).lower()
+    if isinstance(left, (int, float)):
+        try:
+            number = float(right)
+        except ValueError:
+            return op == "!="
+        a: Any = float(left)
+        b: Any = number
+    elif isinstance(left, str):
+        a, b = left, right
+    else:
+        return op == "!="
+    if op == "=":
+        return bool(a == b)
+    if op == "!=":
+        return bool(a != b)
+    if op == ">":
+        return bool(a > b)
+    if op == ">=":
+        return bool(a >= b)
+    if op == "<":
+        return bool(a < b)
+    return bool(a <= b)
+
+
+class _FilterParser:
+    def __init__(self, query: str, filterable: Sequence[str]) -> None:
+        self.query = query
+        self.tokens = _tokenize(query)
+        self.pos = 0
+        self.filterable = filterable
+
+    def parse(self) -> Predicate:
+        predicate = self._or()
+        if self.pos != len(self.tokens):
+            self._fail("unexpected token")
+        return predicate
+
+    def _fail(self, reason: str) -> None:
+        raise FakeMeilisearchError("invalid_search_filter", f"{reason}: {self.query}")
+
+    def _peek(self) -> tuple[str, str] | None:
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def _take(self, kind: str, value: str | None = None) -> str:
+        token = self._peek()
+        if token is None or token[0] != kind or (value and token[1] != value):
+            self._fail(f"expected {value or kind}")
+        assert token is not None
+        self.pos += 1
+        return token[1]
+
+    def _accept(self, kind: str, value: str) -> bool:
+        if self._peek() == (kind, value):
+            self.pos += 1
+            return True
+        return False
+
+    def _or(self) -> Predicate:
+        parts = [self._and()]
+        while self._accept("keyword", "OR"):
+            parts.append(self._and())
+        return parts[0] if len(parts) == 1 else lambda d: any(p(d) for p in parts)
+
+    def _and(self) -> Predicate:
+        parts = [self._not()]
+        while self._accept("keyword", "AND"):
+            parts.append(self._not())
+        return parts[0] if len(parts) == 1 else lambda d: all(p(d) for p in parts)
+
+    def _not(self) -> Predicate:
+        if self._accept("keyword", "NOT"):
+            inner = self._not()
+            return lambda d: not inner(d)
+        if self._accept("op", "("):
+            inner = self._or()
+            self._take("op", ")")
+            return inner
+        return self._condition()
+
+    def _check_filterable(self, attribute: str) -> None:
+        for allowed in self.filterable:
+            if attribute == allowed or attribute.startswith(f"{allowed}."):
+                return
+        raise FakeMeilisearchError(
+            "invalid_search_filter", f"attribute `{attribute}` is not filterable"
+        )
+
+    def _list(self) -> list[str]:
+        self._take("op", "[")
+        values: list[str] = []
+        while not self._accept("op", "]"):
+            if values:
+                self._take("op", ",")
+            values.append(self._take("value"))
+        return values
+
+    def _condition(self) -> Predicate:
+        attribute = self._take("value")
+        self._check_filterable(attribute)
+        if self._accept("keyword", "EXISTS"):
+            return lambda d: bool(_values(d, attribute))
+        negate = self._accept("keyword", "NOT")
+        if negate or self._peek() == ("keyword", "IN"):
+            self._take("keyword", "IN")
+            options = self._list()
+            return lambda d: negate != any(
+                _compare(v, "=", o) for v in _values(d, attribute) for o in options
+            )
+        op = self._take("op")
+        if op not in {"=", "!=", ">", ">=", "<", "<="}:
+            self._fail(f"unexpected {op}")
+        value = self._take("value")
+        if op == "!=":
+            return lambda d: not any(
+                _compare(v, "=", value) for v in _values(d, attribute)
+            )
+        return lambda d: any(_compare(v, op, value) for v in _values(d, attribute))
+
+
+def parse_filter(query: str | None, filterable: Sequence[str]) -> Predicate:
+    """Return a predicate for ``query`` that rejects non-filterable fields."""
+    if not query:
+        return lambda d: True
+    return _FilterParser(query, filterable).parse()
+
+
+# --- client -------------------------------------------------------------------
+
+
+class FakeIndex:
+    """Handle on one index, like the SDK's ``AsyncIndex``."""
+
+    def __init__(self, client: FakeMeilisearch, uid: str) -> None:
+        self.client = client
+        self.uid = uid
+
+    @property
+    def primary_key(self) -> str | None:
+        data = self.client._indexes.get(self.uid)
+        return data.primary_key if data else None
+
+    def _data(self) -> _IndexData:
+        data = self.client._indexes.get(self.uid)
+        if data is None:
+            raise FakeMeilisearchError(
+                "index_not_found", f"Index `{self.uid}` not found."
+            )
+        return data
+
+    def _upsert_target(self, docs: Sequence[Mapping[str, Any]]) -> _IndexData:
+        # adding documents creates a missing index, inferring its key
+        data = self.client._indexes.get(self.uid)
+        if data is None:
+            data = self.client._indexes[self.uid] = _IndexData("id")
+        if data.primary_key is None:
+            data.primary_key = "id"
+        return data
+
+    async def update_documents(
+        self,
+        documents: Sequence[Mapping[str, Any]],
+        primary_key: str | None = None,
+        *,
+        compress: bool = False,
+    ) -> TaskInfo:
+        docs = list(documents)
+        self.client._record("update_documents", self.uid, documents=len(docs))
+
+        def apply() -> None:
+            data = self._upsert_target(docs)
+            key = primary_key or data.primary_key or "id"
+            for doc in docs:
+                if key not in doc:
+                    raise FakeMeilisearchError(
+                        "missing_document_id", f"document has no `{key}`"
+                    )
+                doc_id = str(doc[key])
+                stored = data.documents.setdefault(doc_id, {})
+                stored.update(copy.deepcopy(dict(doc)))
+
+        return self.client._task(self.uid, "documentAdditionOrUpdate", apply)
+
+    async def delete_documents(self, ids: Sequence[str] | None = None) -> TaskInfo:
+        doc_ids = [str(i) for i in ids or []]
+        self.client._record("delete_documents", self.uid, ids=len(doc_ids))
+
+        def apply() -> None:
+            documents = self._data().documents
+            for doc_id in doc_ids:
+                documents.pop(doc_id, None)
+
+        return self.client._task(self.uid, "documentDeletion", apply)
+
+    async def delete_documents_by_filter(self, filter: str) -> TaskInfo:
+        self.client._record("delete_documents_by_filter", self.uid, filter=filter)
+
+        def apply() -> None:
+            data = self._data()
+            predicate = parse_filter(filter, data.settings.filterable_attributes)
+            for doc_id in [k for k, d in data.documents.items() if predicate(d)]:
+                del data.documents[doc_id]
+
+        return self.client._task(self.uid, "documentDeletion", apply)
+
+    async def get_document(
+        self, document_id: str, fields: Sequence[str] | None = None
+    ) -> dict[str, Any]:
+        self.client._record("get_document", self.uid, id=document_id)
+        doc = self._data().documents.get(str(document_id))
+        if doc is None:
+            raise FakeMeilisearchError(
+                "document_not_found", f"Document `{document_id}` not found."
+            )
+        return _project(doc, fields)
+
+    async def get_documents(
+        self,
+        *,
+        offset: int = 0,
+        limit: int = 20,
+        fields: Sequence[str] | None = None,
+        filter: str | None = None,
+    ) -> DocumentsInfo:
+        self.client._record(
+            "get_documents", self.uid, offset=offset, limit=limit, filter=filter
+        )
+        data = self._data()
+        if filter:
+            predicate = parse_filter(filter, data.settings.filterable_attributes)
+            matches = [d for d in data.documents.values() if predicate(d)]
+        else:
+            matches = list(data.documents.values())
+        page = [_project(doc, fields) for doc in matches[offset : offset + limit]]
+        return DocumentsInfo(page, offset, limit, len(matches))
+
+    async def get_stats(self) -> IndexStats:
+        self.client._record("get_stats", self.uid)
+        return self.client._stats(self._data())
+
+    async def get_settings(self) -> Settings:
+        self.client._record("get_settings", self.uid)
+        return copy.deepcopy(self._data().settings)
+
+    def _update_setting(self, name: str, value: Any) -> TaskInfo:
+        self.client._record(f"update_{name}", self.uid)
+
+        def apply() -> None:
+            setattr(self._data().settings, name, copy.deepcopy(value))
+
+        return self.client._task(self.uid, "settingsUpdate", apply)
+
+    async def update_searchable_attributes(self, body: list[str]) -> TaskInfo:
+        return self._update_setting("searchable_attributes", list(body))
+
+    async def update_filterable_attributes(self, body: list[str]) -> TaskInfo:
+        return self._update_setting("filterable_attributes", list(body))
+
+    async def update_sortable_attributes(self, body: list[str]) -> TaskInfo:
+        return self._update_setting("sortable_attributes", list(body))
+
+    async def update_embedders(self, embedders: Any) -> TaskInfo:
+        return self._update_setting(
+            "embedders", dict(getattr(embedders, "embedders", embedders))
+        )
+
+    async def delete(self) -> TaskInfo:
+        self.client._record("delete_index", self.uid)
+
+        def apply() -> None:
+            self._data()
+            del self.client._indexes[self.uid]
+
+        return self.client._task(self.uid, "indexDeletion", apply)
+
+
+def _project(doc: Mapping[str, Any], fields: Sequence[str] | None) -> dict[str, Any]:
+    if fields is None or "*" in fields:
+        return copy.deepcopy(dict(doc))
+    return {k: copy.deepcopy(v) for k, v in doc.items() if k in fields}
+
+
+class FakeMeilisearch:
+    """In-memory ``AsyncClient`` replacement; see the module docstring."""
+
+    def __init__(self, url: str = "http://fake-meilisearch", *_: Any, **__: Any):
+        self.url = url
+        self._indexes: dict[str, _IndexData] = {}
+        self._tasks: dict[int, Task] = {}
+        self.calls: list[tuple[str, str | None, dict[str, Any]]] = []
+
+    # -- recording ---------------------------------------------------------
+
+    def _record(self, method: str, index_uid: str | None, **details: Any) -> None:
+        self.calls.append((method, index_uid, details))
+
+    def count(self, method: str | None = None, index_uid: str | None = None) -> int:
+        """Return how many recorded calls match ``method`` and ``index_uid``."""
+        return sum(
+            1
+            for name, uid, _ in self.calls
+            if (method is None or name == method)
+            and (index_uid is None or uid == index_uid)
+        )
+
+    def reset_calls(self) -> None:
+        self.calls.clear()
+
+    def documents(self, uid: str) -> dict[str, dict[str, Any]]:
+        """Return the stored documents of ``uid`` by id, for assertions."""
+        return self._indexes[uid].documents
+
+    # -- tasks -------------------------------------------------------------
+
+    def _task(
+        self, index_uid: str | None, task_type: str, apply: Callable[[], None]
+    ) -> TaskInfo:
+        uid = len(self._tasks)
+        status, error = "succeeded", None
+        try:
+            apply()
+        except FakeMeilisearchError as e:
+            status, error = "failed", {"code": e.code, "message": e.message}
+        self._tasks[uid] = Task(uid, index_uid, status, task_type, error)
+        return TaskInfo(uid, index_uid, "enqueued", task_type)
+
+    async def get_task(self, task_id: int) -> Task:
+        self._record("get_task", None, uid=task_id)
+        if task_id not in self._tasks:
+            raise FakeMeilisearchError("task_not_found", f"Task `{task_id}` not found.")
+        return copy.deepcopy(self._tasks[task_id])
+
+    async def get_tasks(self) -> TaskResults:
+        self._record("get_tasks", None)
+        return TaskResults(
+            [copy.deepcopy(t) for t in reversed(list(self._tasks.values()))]
+        )
+
+    # -- indexes -----------------------------------------------------------
+
+    def index(self, uid: str) -> FakeIndex:
+        return FakeIndex(self, uid)
+
+    async def get_index(self, uid: str) -> FakeIndex:
+        self._record("get_index", uid)
+        handle = self.index(uid)
+        handle._data()
+        return handle
+
+    async def create_index(self, uid: str, primary_key: str | None = None) -> FakeIndex:
+        """Create ``uid``; like the SDK, this waits for the creation task."""
+        self._record("create_index", uid)
+
+        def apply() -> None:
+            if uid in self._indexes:
+                raise FakeMeilisearchError(
+                    "index_already_exists", f"Index `{uid}` already exists."
+                )
+            self._indexes[uid] = _IndexData(primary_key)
+
+        info = self._task(uid, "indexCreation", apply)
+        task = self._tasks[info.task_uid]
+        if task.error:
+            raise FakeMeilisearchError(task.error["code"], task.error["message"])
+        return self.index(uid)
+
+    async def swap_indexes(self, indexes: Iterable[tuple[str, str]]) -> TaskInfo:
+        pairs = list(indexes)
+        self._record("swap_indexes", None, indexes=pairs)
+
+        def apply() -> None:
+            for a, b in pairs:
+                if a not in self._indexes or b not in self._indexes:
+                    missing = a if a not in self._indexes else b
+                    raise FakeMeilisearchError(
+                        "index_not_found", f"Index `{missing}` not found."
+                    )
+            for a, b in pairs:
+                self._indexes[a], self._indexes[b] = self._indexes[b], self._indexes[a]
+
+        return self._task(None, "indexSwap", apply)
+
+    # -- search ------------------------------------------------------------
+
+    async def multi_search(
+        self, queries: Sequence[Any], federation: Any = None
+    ) -> FederatedSearchResults:
+        self._record("multi_search", None, queries=len(queries))
+        if federation is None:
+            raise NotImplementedError("only federated multi-search is faked")
+        hits = []
+        for position, query in enumerate(queries):
+            data = self.index(query.index_uid)._data()
+            predicate = parse_filter(query.filter, data.settings.filterable_attributes)
+            words = (query.query or "").lower().split()
+            for doc in data.documents.values():
+                text = json.dumps(
+                    _searchable(doc, data.settings.searchable_attributes),
+                    default=str,
+                ).lower()
+                if predicate(doc) and all(word in text for word in words):
+                    hits.append(
+                        {
+                            **copy.deepcopy(doc),
+                            "_federation": {
+                                "indexUid": query.index_uid,
+                                "queriesPosition": position,
+                            },
+                        }
+                    )
+        offset = getattr(federation, "offset", 0) or 0
+        limit = getattr(federation, "limit", 20) or 20
+        return FederatedSearchResults(
+            hits[offset : offset + limit], offset, limit, len(hits)
+        )
+
+    # -- stats -------------------------------------------------------------
+
+    def _stats(self, data: _IndexData) -> IndexStats:
+        distribution: dict[str, int] = {}
+        for doc in data.documents.values():
+            for key in _field_names(doc):
+                distribution[key] = distribution.get(key, 0) + 1
+        return IndexStats(len(data.documents), False, distribution)
+
+    async def get_all_stats(self) -> ClientStats:
+        self._record("get_all_stats", None)
+        size = sum(
+            len(json.dumps(doc, default=str))
+            for data in self._indexes.values()
+            for doc in data.documents.values()
+        )
+        return ClientStats(
+            size, {uid: self._stats(data) for uid, data in self._indexes.items()}
+        )
+
+    async def health(self) -> dict[str, str]:
+        self._record("health", None)
+        return {"status": "available"}
+
+
+def _searchable(doc: Mapping[str, Any], attributes: Sequence[str]) -> Any:
+    if "*" in attributes:
+        return doc
+    return [value for attribute in attributes for value in _values(doc, attribute)]
+
+
+def _field_names(doc: Mapping[str, Any], prefix: str = "") -> set[str]:
+    """Return the dotted field names Meilisearch reports for ``doc``."""
+    names: set[str] = set()
+    for key, value in doc.items():
+        name = f"{prefix}{key}"
+        names.add(name)
+        items = value if isinstance(value, list) else [value]
+        for item in items:
+            if isinstance(item, Mapping):
+                names |= _field_names(item, f"{name}.")
+    return names